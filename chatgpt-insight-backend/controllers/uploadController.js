@@ -4,11 +4,12 @@
 const multer = require('multer');
 const path = require('path');
 const fs = require('fs');
-const { spawn } = require('child_process');
 const AdmZip = require('adm-zip');
 const jwt = require('jsonwebtoken');
 const pool = require('../config/dbConfig');
 const { Server } = require('socket.io');
+const analysisWorkerPool = require('../services/analysisWorkerPool');
+const analysisStore = require('../services/analysisStore');
 
 // Sécurité : on peut utiliser process.env
 const JWT_SECRET = process.env.JWT_SECRET || 'votre_secret_jwt_super_secret';
@@ -88,149 +89,200 @@ async function handleUpload(req, res, ioInstance) {
       });
     }
 
-    // 5) Exécuter le script Python
+    // 5) Exécuter l'analyse Python (worker persistant, voir services/analysisWorkerPool.js)
     const structuredJsonPath = path.join(unzipFolderPath, 'structured.json');
+    // Index du fichier structuré (positions et résumés des conversations), sauf si la conservation
+    // des analyses est désactivée (ANALYSIS_RETENTION_HOURS=0, voir services/analysisStore.js)
+    const structuredIndexPath = path.join(unzipFolderPath, 'structured.index.json');
     const statsOutputPath = path.join(unzipFolderPath, 'rapport_stats.json');
+    // Cube horaire : le client filtre les coûts par plage de dates sans nouvelle analyse
+    const cubeOutputPath = path.join(unzipFolderPath, 'time_series_cube.json');
     const priceFilePath = path.join(__dirname, '..', 'scripts', 'price.json');
 
-    const pythonScriptPath = path.join(__dirname, '..', 'scripts', 'run_script.py');
     const args = [
       conversationFilePath,
       structuredJsonPath,
+      ...(analysisStore.enabled ? [`--index_file=${structuredIndexPath}`] : []),
       `--stats_output_file=${statsOutputPath}`,
+      `--cube_output_file=${cubeOutputPath}`,
       `--price_file=${priceFilePath}`,
-      '--verbosity=progress'
+      '--verbosity=progress',
+      // Processus Python par analyse (répartition des conversations, voir data_processor.process_sharded)
+      `--workers=${parseInt(process.env.ANALYSIS_PROCESSES, 10) || 1}`
     ];
-    console.log('Lancement du script python avec args :', args);
-
-    const pythonProcess = spawn('python', [pythonScriptPath, ...args], {
-      cwd: path.join(__dirname, '..', 'scripts'),
-    });
+    console.log('Lancement de l\'analyse python avec args :', args);
 
     let progressData = { percentage: 0, description: '' };
 
-    pythonProcess.stdout.on('data', (data) => {
-      const output = data.toString();
-      console.log(`[Python STDOUT]: ${output}`);
-      const progressMatch = output.match(/\[PROGRESS\] ([\d.]+)% - (.+)/);
-      if (progressMatch) {
+    // Un bloc de sortie peut contenir plusieurs lignes de progression :
+    // seule la dernière est émise via socket.io
+    const emitLastProgress = (output) => {
+      const progressMatches = [...output.matchAll(/\[PROGRESS\] ([\d.]+)% - (.+)/g)];
+      if (progressMatches.length > 0) {
+        const progressMatch = progressMatches[progressMatches.length - 1];
         progressData = {
           percentage: parseFloat(progressMatch[1]),
           description: progressMatch[2]
         };
-        // Émettre la progression via socket.io
         ioInstance.emit('analysisProgress', progressData);
       }
-    });
+    };
 
-    pythonProcess.stderr.on('data', (data) => {
-      const output = data.toString();
-      console.error(`[Python STDERR]: ${output}`);
-      const progressMatch = output.match(/\[PROGRESS\] ([\d.]+)% - (.+)/);
-      if (progressMatch) {
-        progressData = {
-          percentage: parseFloat(progressMatch[1]),
-          description: progressMatch[2]
-        };
-        ioInstance.emit('analysisProgress', progressData);
-      }
-    });
+    try {
+      await analysisWorkerPool.runAnalysis(args, emitLastProgress);
+      console.log('Analyse Python terminée');
+    } catch (err) {
+      console.error('Analyse Python en échec :', err.message);
+      fs.rmSync(unzipFolderPath, { recursive: true, force: true });
+      return res.status(500).json({ error: 'Le script Python a échoué.' });
+    }
 
-    pythonProcess.on('close', async (code) => {
-      console.log(`Script Python terminé avec code ${code}`);
+    if (!fs.existsSync(structuredJsonPath) || !fs.existsSync(statsOutputPath)
+        || (analysisStore.enabled && !fs.existsSync(structuredIndexPath))) {
+      fs.rmSync(unzipFolderPath, { recursive: true, force: true });
+      return res.status(500).json({ error: 'Le script Python n\'a pas généré les fichiers attendus.' });
+    }
 
-      if (code !== 0) {
-        fs.rmSync(unzipFolderPath, { recursive: true, force: true });
-        return res.status(500).json({ error: 'Le script Python a échoué.' });
-      }
+    try {
+      const statsDataRaw = fs.readFileSync(statsOutputPath, 'utf-8');
+      const statsData = JSON.parse(statsDataRaw);
 
-      if (!fs.existsSync(structuredJsonPath) || !fs.existsSync(statsOutputPath)) {
-        fs.rmSync(unzipFolderPath, { recursive: true, force: true });
-        return res.status(500).json({ error: 'Le script Python n\'a pas généré les fichiers attendus.' });
-      }
+      // Analyse conservée (par défaut) : seuls les résumés des conversations sont envoyés, les
+      // messages sont chargés à la demande (GET /api/upload/analyses/:analysisId/...) et le fichier
+      // complet n'est téléchargé que si l'utilisateur enregistre l'analyse. Sinon (conservation
+      // désactivée, ou analyse plus grande que ANALYSIS_MAX_MB), toutes les conversations sont envoyées.
+      const stored = analysisStore.add(structuredJsonPath, structuredIndexPath);
+      const details = stored
+        ? stored.summaries
+        : JSON.parse(fs.readFileSync(structuredJsonPath, 'utf-8'));
+      const globalStats = statsData.global_stats || {};
+      const costStatsCombined = statsData.cost_stats_combined_over_time || {};
+      const messageStatsOverTime = statsData.message_stats_over_time || null;
+      const timeSeriesCube = fs.existsSync(cubeOutputPath)
+        ? JSON.parse(fs.readFileSync(cubeOutputPath, 'utf-8'))
+        : null;
 
-      try {
-        const structuredDataRaw = fs.readFileSync(structuredJsonPath, 'utf-8');
-        const statsDataRaw = fs.readFileSync(statsOutputPath, 'utf-8');
-
-        const structuredData = JSON.parse(structuredDataRaw);
-        const statsData = JSON.parse(statsDataRaw);
-
-        const details = structuredData; 
-        const globalStats = statsData.global_stats || {};
-        const costStatsCombined = statsData.cost_stats_combined_over_time || {};
-        const messageStatsOverTime = statsData.message_stats_over_time || null;
-
-        const output = {
-          stats: {
-            totalConversations: globalStats.total_conversations || 0,
-            totalWords: globalStats.total_words || 0,
-            totalInputTokens: globalStats.total_tokens_in || 0,
-            totalOutputTokens: globalStats.total_tokens_out || 0,
-            averageWordsPerConversation: globalStats.average_words_per_conversation || 0,
-            totalCost: globalStats.total_cost || 0,
-          },
-          graphsData: {
-            costs_by_model: costStatsCombined.costs_by_model || {},
-            models: Object.keys(costStatsCombined.costs_by_model || {}),
-            costs: Object.keys(costStatsCombined.costs_by_model || {}).map(
-              (m) => costStatsCombined.costs_by_model[m].total_cost
-            ),
-            tokens: Object.keys(costStatsCombined.costs_by_model || {}).map(
-              (m) => (costStatsCombined.costs_by_model[m].input_tokens
-                      + costStatsCombined.costs_by_model[m].output_tokens)
-            ),
-          },
-          messageStatsOverTime: messageStatsOverTime,
-          details: details
-        };
+      const output = {
+        stats: {
+          totalConversations: globalStats.total_conversations || 0,
+          totalWords: globalStats.total_words || 0,
+          totalInputTokens: globalStats.total_tokens_in || 0,
+          totalOutputTokens: globalStats.total_tokens_out || 0,
+          averageWordsPerConversation: globalStats.average_words_per_conversation || 0,
+          totalCost: globalStats.total_cost || 0,
+        },
+        graphsData: {
+          costs_by_model: costStatsCombined.costs_by_model || {},
+          models: Object.keys(costStatsCombined.costs_by_model || {}),
+          costs: Object.keys(costStatsCombined.costs_by_model || {}).map(
+            (m) => costStatsCombined.costs_by_model[m].total_cost
+          ),
+          tokens: Object.keys(costStatsCombined.costs_by_model || {}).map(
+            (m) => (costStatsCombined.costs_by_model[m].input_tokens
+                    + costStatsCombined.costs_by_model[m].output_tokens)
+          ),
+        },
+        messageStatsOverTime: messageStatsOverTime,
+        timeSeriesCube: timeSeriesCube,
+        ...(stored && { analysisId: stored.analysisId, analysisExpiresAt: stored.expiresAt }),
+        details: details
+      };
 
-        // Mise à jour des stats côté BDD si l'utilisateur est authentifié
-        if (userId) {
-          try {
-            const totalMessages = details.reduce((sum, conv) => sum + conv.messages.length, 0);
-            await pool.query(
-              `INSERT INTO user_stats_history (
-                user_id,
-                total_conversations,
-                total_words,
-                total_input_tokens,
-                total_output_tokens,
-                total_messages,
-                average_words_per_conversation,
-                total_cost
-              ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)`,
-              [
-                userId,
-                globalStats.total_conversations || 0,
-                globalStats.total_words || 0,
-                globalStats.total_tokens_in || 0,
-                globalStats.total_tokens_out || 0,
-                totalMessages,
-                globalStats.average_words_per_conversation || 0,
-                globalStats.total_cost || 0
-              ]
-            );
-          } catch (err) {
-            console.error('Erreur lors de la mise à jour des statistiques utilisateur:', err);
-          }
+      // Mise à jour des stats côté BDD si l'utilisateur est authentifié
+      if (userId) {
+        try {
+          const totalMessages = details.reduce((sum, conv) => sum + (conv.message_count ?? conv.messages.length), 0);
+          await pool.query(
+            `INSERT INTO user_stats_history (
+              user_id,
+              total_conversations,
+              total_words,
+              total_input_tokens,
+              total_output_tokens,
+              total_messages,
+              average_words_per_conversation,
+              total_cost
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)`,
+            [
+              userId,
+              globalStats.total_conversations || 0,
+              globalStats.total_words || 0,
+              globalStats.total_tokens_in || 0,
+              globalStats.total_tokens_out || 0,
+              totalMessages,
+              globalStats.average_words_per_conversation || 0,
+              globalStats.total_cost || 0
+            ]
+          );
+        } catch (err) {
+          console.error('Erreur lors de la mise à jour des statistiques utilisateur:', err);
         }
+      }
 
-        fs.rmSync(unzipFolderPath, { recursive: true, force: true });
-        fs.rmSync(zipFilePath, { force: true });
-        return res.json(output);
+      fs.rmSync(unzipFolderPath, { recursive: true, force: true });
+      fs.rmSync(zipFilePath, { force: true });
+      return res.json(output);
 
-      } catch (err) {
-        console.error('Erreur de parsing JSON :', err);
-        return res.status(500).json({ error: 'Erreur interne lors du parsing des fichiers JSON.' });
-      }
-    });
+    } catch (err) {
+      console.error('Erreur de parsing JSON :', err);
+      return res.status(500).json({ error: 'Erreur interne lors du parsing des fichiers JSON.' });
+    }
   } catch (err) {
     console.error('Erreur dans /api/upload :', err);
     return res.status(500).json({ error: 'Erreur interne du serveur.' });
   }
 }
 
+// Page de résumés des conversations d'une analyse conservée
+// (GET /api/upload/analyses/:analysisId/conversations?offset=&limit=)
+async function getConversationSummaries(req, res) {
+  const offset = Math.max(parseInt(req.query.offset, 10) || 0, 0);
+  const limit = req.query.limit !== undefined ? Math.max(parseInt(req.query.limit, 10) || 0, 0) : undefined;
+  try {
+    const summaries = await analysisStore.summaries(req.params.analysisId, offset, limit);
+    if (!summaries) {
+      return res.status(404).json({ error: 'Analyse introuvable ou expirée.' });
+    }
+    return res.json(summaries);
+  } catch (err) {
+    console.error('Erreur lors de la lecture de l\'index des conversations:', err);
+    return res.status(500).json({ error: 'Erreur lors de la lecture des conversations.' });
+  }
+}
+
+// Messages d'une conversation (GET /api/upload/analyses/:analysisId/conversations/:conversationId)
+async function getConversation(req, res) {
+  try {
+    const conversation = await analysisStore.conversation(req.params.analysisId, req.params.conversationId);
+    if (!conversation) {
+      return res.status(404).json({ error: 'Conversation introuvable ou analyse expirée.' });
+    }
+    return res.json(conversation);
+  } catch (err) {
+    console.error('Erreur lors de la lecture de la conversation:', err);
+    return res.status(500).json({ error: 'Erreur lors de la lecture de la conversation.' });
+  }
+}
+
+// Toutes les conversations d'une analyse conservée, enregistrées ensuite par le client
+// (GET /api/upload/analyses/:analysisId/structured)
+function getStructuredFile(req, res) {
+  const structuredPath = analysisStore.structuredFile(req.params.analysisId);
+  if (!structuredPath) {
+    return res.status(404).json({ error: 'Analyse introuvable ou expirée.' });
+  }
+  return res.sendFile(structuredPath, { headers: { 'Content-Type': 'application/json' } });
+}
+
+// Suppression d'une analyse conservée, une fois enregistrée par le client
+// (DELETE /api/upload/analyses/:analysisId)
+function deleteAnalysis(req, res) {
+  if (!analysisStore.remove(req.params.analysisId)) {
+    return res.status(404).json({ error: 'Analyse introuvable ou expirée.' });
+  }
+  return res.status(204).end();
+}
+
 // Route pour récupérer les prix (GET /api/prices)
 function getPrices(req, res) {
   try {
@@ -247,5 +299,9 @@ function getPrices(req, res) {
 module.exports = {
   upload,
   handleUpload,
+  getConversationSummaries,
+  getConversation,
+  getStructuredFile,
+  deleteAnalysis,
   getPrices
 };
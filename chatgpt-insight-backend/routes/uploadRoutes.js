@@ -3,7 +3,15 @@
 /************************************************/
 const express = require('express');
 const router = express.Router();
-const { upload, handleUpload, getPrices } = require('../controllers/uploadController');
+const {
+  upload,
+  handleUpload,
+  getConversationSummaries,
+  getConversation,
+  getStructuredFile,
+  deleteAnalysis,
+  getPrices
+} = require('../controllers/uploadController');
 
 // Route d'upload
 // Note : on passe la fonction upload.single('zipfile') avant notre contrôleur
@@ -13,6 +21,12 @@ router.post('/', upload.single('zipfile'), (req, res) => {
   handleUpload(req, res, ioInstance);
 });
 
+// Analyses conservées sur le serveur (ANALYSIS_RETENTION_HOURS) : conversations chargées à la demande
+router.get('/analyses/:analysisId/conversations', getConversationSummaries);
+router.get('/analyses/:analysisId/conversations/:conversationId', getConversation);
+router.get('/analyses/:analysisId/structured', getStructuredFile);
+router.delete('/analyses/:analysisId', deleteAnalysis);
+
 // Route pour récupérer les prix
 router.get('/prices', getPrices);
 
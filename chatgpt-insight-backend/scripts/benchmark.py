@@ -0,0 +1,281 @@
+"""
+Usage:
+  benchmark.py parse <raw_json_file> [--repeat=<repeat>]
+  benchmark.py text <raw_json_file> [--repeat=<repeat>]
+  benchmark.py startup [--repeat=<repeat>] [--top=<top>]
+  benchmark.py stats <raw_json_file> [--repeat=<repeat>] [--price_file=<price_file>]
+  benchmark.py models [--repeat=<repeat>] [--depth=<depth>] [--branching=<branching>] [--tool_run=<tool_run>]
+  benchmark.py -h | --help
+
+Options:
+  -h --help                  Affiche l'aide.
+  --repeat=<repeat>          Nombre de répétitions de chaque mesure [default: 3].
+  --top=<top>                Nombre de modules les plus coûteux affichés [default: 10].
+  --price_file=<price_file>  Fichier de prix utilisé par les statistiques de coût [default: price.json].
+  --depth=<depth>            Nombre d'échanges de la branche principale [default: 200].
+  --branching=<branching>    Nombre de variantes (éditions, régénérations) par message user [default: 3].
+  --tool_run=<tool_run>      Longueur des chaînes de messages de l'outil a8km123 [default: 20].
+"""
+
+import os
+import subprocess
+import sys
+import time
+from docopt import docopt
+import data_processor
+from extractor_conversation import extract_conversation_details
+from extractor_message import extract_message_details, resolve_model_slug, resolve_model_slugs
+from parser_data import ConversationStream, parse_conversations
+from text_metrics import TEXT_ENGINES, DEFAULT_TEXT_ENGINE, get_text_engine
+from stats_factory import PriceData, StatFactory, StatsEngine
+
+
+def best_of(repeat, func):
+    """Exécute func `repeat` fois et retourne (meilleur temps, dernier résultat)."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_parse(raw_json_file, repeat):
+    """
+    Compare le décodage en deux passes (comptage puis traitement) au décodage unique
+    utilisé par process_conversations, et vérifie le nombre de conversations décodées.
+    """
+    def two_passes():
+        total = sum(1 for _ in parse_conversations(raw_json_file))
+        return total, sum(1 for _ in parse_conversations(raw_json_file))
+
+    def one_pass():
+        return sum(1 for _ in parse_conversations(raw_json_file))
+
+    two_pass_time, (total, _) = best_of(repeat, two_passes)
+    one_pass_time, _ = best_of(repeat, one_pass)
+
+    decoded = [0]
+
+    class CountingStream(ConversationStream):
+        def __iter__(self):
+            for conversation in super().__iter__():
+                decoded[0] += 1
+                yield conversation
+
+    data_processor.ConversationStream = CountingStream
+    try:
+        start = time.perf_counter()
+        all_data = data_processor.process_conversations(raw_json_file)
+        process_time = time.perf_counter() - start
+    finally:
+        data_processor.ConversationStream = ConversationStream
+
+    print(f"Conversations dans le fichier        : {total}")
+    print(f"Décodage en deux passes (ancien)     : {two_pass_time:.3f} s")
+    print(f"Décodage en une passe                : {one_pass_time:.3f} s")
+    print(f"process_conversations                : {process_time:.3f} s, {len(all_data)} conversations")
+    print(f"Conversations décodées par le traitement : {decoded[0]} ({decoded[0] / total if total else 0:.2f} par conversation)")
+
+
+def load_message_texts(raw_json_file):
+    """Retourne les textes de tous les messages d'un export, comme les voit data_processor."""
+    texts = []
+    for conversation in parse_conversations(raw_json_file):
+        for details in extract_conversation_details(conversation, with_messages=True)['messages']:
+            text = details['additional_info'].get('text')
+            if text:
+                texts.append(text)
+    return texts
+
+
+def bench_text(raw_json_file, repeat):
+    """
+    Mesure la vitesse de chaque moteur de text_metrics sur les messages d'un export,
+    et l'écart des comptages du moteur 'fast' par rapport à NLTK.
+    """
+    texts = load_message_texts(raw_json_file)
+    characters = sum(len(text) for text in texts)
+    print(f"Corpus : {len(texts)} messages, {characters / 1_000_000:.1f} M caractères")
+
+    counts = {}
+    for engine in TEXT_ENGINES:
+        count = get_text_engine(engine)
+        try:
+            elapsed, counts[engine] = best_of(repeat, lambda: [count(text) for text in texts])
+        except LookupError as e:
+            # Données Punkt absentes : seul le moteur 'fast' peut être mesuré
+            print(f"{engine:5s} : indisponible ({str(e).strip().splitlines()[0]})")
+            continue
+        print(f"{engine:5s} : {elapsed:.3f} s ({len(texts) / elapsed:,.0f} messages/s)")
+
+    if 'nltk' not in counts:
+        return
+    for index, label in ((0, 'mots'), (1, 'phrases')):
+        fast = [c[index] for c in counts['fast']]
+        reference = [c[index] for c in counts['nltk']]
+        exact = sum(1 for a, b in zip(fast, reference) if a == b)
+        errors = [abs(a - b) / b for a, b in zip(fast, reference) if b]
+        print(f"{label:8s}: total fast/nltk = {sum(fast) / max(sum(reference), 1):.4f}, "
+              f"comptages identiques = {exact / len(texts):.1%}, "
+              f"écart relatif moyen = {sum(errors) / max(len(errors), 1):.2%}")
+
+
+def import_times():
+    """
+    Importe run_script dans un nouvel interpréteur avec `-X importtime` et retourne
+    {module: (temps propre, temps cumulé)} en microsecondes.
+    """
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import run_script'],
+        cwd=scripts_dir, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def bench_startup(repeat, top):
+    """
+    Mesure le coût de démarrage du point d'entrée run_script.py : temps d'import
+    (`python -X importtime`) et durée totale de `run_script.py --help`.
+    """
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    runs = [import_times() for _ in range(repeat)]
+    best = min(runs, key=lambda times: times['run_script'][1])
+    print(f"Import de run_script                 : {best['run_script'][1] / 1000:.1f} ms (meilleur de {repeat})")
+    print("Modules les plus coûteux (temps cumulé) :")
+    heaviest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for module, (self_us, cumulative_us) in heaviest[:top]:
+        print(f"  {module:40s} {cumulative_us / 1000:8.1f} ms (propre {self_us / 1000:.1f} ms)")
+    for module in ('tiktoken', 'nltk', 'dateutil'):
+        print(f"{module:9s} importé au démarrage    : {'oui' if module in best else 'non'}")
+
+    help_time, _ = best_of(repeat, lambda: subprocess.run(
+        [sys.executable, 'run_script.py', '--help'], cwd=scripts_dir, capture_output=True, check=True
+    ))
+    print(f"run_script.py --help                 : {help_time * 1000:.1f} ms")
+
+
+def bench_stats(raw_json_file, repeat, price_file):
+    """
+    Compare le calcul des statistiques de run_script message par message et en colonnes
+    (MessageTable, NumPy), et vérifie que les résultats sont identiques.
+    """
+    data = data_processor.process_conversations(raw_json_file)
+    price_data = PriceData(price_file).prices
+    messages = sum(len(conv['messages']) for conv in data)
+    print(f"Export : {len(data)} conversations, {messages} messages")
+
+    def run(columnar):
+        engine = StatsEngine(data, columnar=columnar)
+        kwargs = {'text_engine': DEFAULT_TEXT_ENGINE}
+        for period in ('hourly', 'weekly', 'monthly', 'quarterly'):
+            for stat_name in ('token_stats_over_time', 'cost_stats_over_time', 'message_stats_over_time'):
+                engine.register((stat_name, period),
+                                StatFactory.get_stat(stat_name, data, price_data=price_data, period=period, **kwargs))
+        for stat_name in ('cost_stats_combined_over_time', 'text_stats', 'global_stats'):
+            engine.register(stat_name, StatFactory.get_stat(stat_name, data, price_data=price_data, **kwargs))
+        return engine.run()
+
+    rows_time, rows = best_of(repeat, lambda: run(False))
+    print(f"Message par message                  : {rows_time:.3f} s")
+    try:
+        columnar_time, columnar = best_of(repeat, lambda: run(True))
+    except ImportError:
+        print("En colonnes                          : indisponible (NumPy absent)")
+        return
+    print(f"En colonnes (MessageTable)           : {columnar_time:.3f} s")
+    print(f"Résultats identiques                 : {'oui' if rows == columnar else 'NON'}")
+
+
+def make_branching_conversation(depth, branching, tool_run):
+    """
+    Construit le mapping d'une conversation profonde et ramifiée : `depth` échanges
+    user -> `tool_run` messages a8km123 -> assistant, chaque message user ayant
+    `branching` variantes dont seule la première est poursuivie.
+    """
+    mapping = {}
+
+    def add(node_id, parent, role, name=None, model_slug=None):
+        author = {'role': role}
+        if name:
+            author['name'] = name
+        metadata = {'model_slug': model_slug} if model_slug else {}
+        mapping[node_id] = {
+            'id': node_id,
+            'parent': parent,
+            'children': [],
+            'message': {
+                'author': author,
+                'metadata': metadata,
+                'content': {'content_type': 'text', 'parts': [f"message {node_id}"]}
+            }
+        }
+        if parent is not None:
+            mapping[parent]['children'].append(node_id)
+
+    add('root', None, 'system')
+    parent = 'root'
+    for level in range(depth):
+        for variant in range(branching):
+            previous = f"user-{level}-{variant}"
+            add(previous, parent, 'user')
+            for step in range(tool_run):
+                tool_id = f"tool-{level}-{variant}-{step}"
+                add(tool_id, previous, 'tool', name='a8km123')
+                previous = tool_id
+            add(f"assistant-{level}-{variant}", previous, 'assistant', model_slug=f"model-{level % 4}")
+        parent = f"assistant-{level}-0"
+    return mapping
+
+
+def bench_models(repeat, depth, branching, tool_run):
+    """
+    Mesure la résolution des model_slug sur une conversation profonde et ramifiée :
+    pré-calcul linéaire (resolve_model_slugs) contre résolution indépendante de chaque
+    nœud, équivalente à l'ancienne ré-extraction récursive des premiers enfants.
+    """
+    mapping = make_branching_conversation(depth, branching, tool_run)
+    print(f"Conversation : {len(mapping)} nœuds, chaînes délégantes de {tool_run + 1} messages")
+
+    def per_node():
+        return {message_id: resolve_model_slug(message_id, mapping, {}) for message_id in mapping}
+
+    def extract_all():
+        model_slugs = resolve_model_slugs(mapping)
+        return [extract_message_details('bench', message_id, info, mapping, model_slugs)
+                for message_id, info in mapping.items()]
+
+    per_node_time, reference = best_of(repeat, per_node)
+    memo_time, model_slugs = best_of(repeat, lambda: resolve_model_slugs(mapping))
+    extract_time, _ = best_of(repeat, extract_all)
+    print(f"Résolution nœud par nœud (ancienne)  : {per_node_time * 1000:.1f} ms")
+    print(f"resolve_model_slugs (mémoïsé)        : {memo_time * 1000:.1f} ms")
+    print(f"Extraction de tous les messages      : {extract_time * 1000:.1f} ms")
+    print(f"Résultats identiques                 : {'oui' if model_slugs == reference else 'NON'}")
+
+
+def main():
+    args = docopt(__doc__)
+    repeat = int(args['--repeat'])
+    if args['parse']:
+        bench_parse(args['<raw_json_file>'], repeat)
+    elif args['text']:
+        bench_text(args['<raw_json_file>'], repeat)
+    elif args['startup']:
+        bench_startup(repeat, int(args['--top']))
+    elif args['stats']:
+        bench_stats(args['<raw_json_file>'], repeat, args['--price_file'])
+    elif args['models']:
+        bench_models(repeat, int(args['--depth']), int(args['--branching']), int(args['--tool_run']))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,21 @@
+import os
+
 SHOW_MESSAGE_TEXT = True
 
+# Encodage tiktoken par lots : nombre de textes par lot et threads utilisés par lot
+TOKENIZER_BATCH_SIZE = 1024
+TOKENIZER_THREADS = min(8, os.cpu_count() or 1)
+
+# Cache des comptes de tokens (voir token_cache). Par défaut il reste en mémoire, le temps du
+# processus (un worker persistant le garde d'une analyse à l'autre). La base sur disque est
+# optionnelle : TOKEN_CACHE_PATH=<fichier .sqlite3> l'active. Elle conserve des empreintes
+# (blake2b) des textes des messages analysés, sans les textes, jusqu'à la suppression du
+# fichier : au plus TOKEN_CACHE_MAX_ENTRIES entrées, les moins récemment utilisées sont
+# supprimées à chaque analyse.
+TOKEN_CACHE_PATH = os.environ.get('TOKEN_CACHE_PATH', '')
+TOKEN_CACHE_MEMORY_ENTRIES = 200_000
+TOKEN_CACHE_MAX_ENTRIES = 5_000_000
+
 MESSAGE_TYPES_TO_ANALYZE = [
     'text',
     'code',
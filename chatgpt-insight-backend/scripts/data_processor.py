@@ -1,156 +1,472 @@
+import os
 import json
-from parser_data import parse_conversations
+from parser_data import ConversationStream, ConversationParseError
 from extractor_conversation import extract_conversation_details
-from extractor_message import extract_message_details
-from config import SHOW_MESSAGE_TEXT, MESSAGE_TYPES_TO_ANALYZE
-from token_analysis import analyze_text
-from collections import defaultdict
+from config import SHOW_MESSAGE_TEXT, MESSAGE_TYPES_TO_ANALYZE, TOKENIZER_BATCH_SIZE, TOKENIZER_THREADS
+from pricing import DEFAULT_PRICE_DATA, load_price_data, get_price_table
+from token_analysis import analyze_text, count_tokens_batch, get_token_cache
+from text_metrics import count_words_and_sentences, DEFAULT_TEXT_ENGINE
+from message_record import MessageRecord
+from structured_io import StructuredFile, split_format, write_structured
+from collections import defaultdict, deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Niveaux de détail du fichier structuré (voir save_structured_data)
+DETAIL_LEVELS = ('full', 'external', 'metadata')
+# Champs de additional_info retirés du fichier structuré hors niveau 'full'
+TEXT_FIELDS = ('text', 'transcription_text')
 
 def calculate_message_cost(message_details, price_data):
     """
-    Calcule le coût d'un message en fonction du modèle et du nombre de tokens.
+    Calcule le coût d'un message en fonction du modèle et du nombre de tokens
+    (voir pricing.PriceTable ; un modèle inconnu est tarifé comme le modèle par défaut).
     """
-    model = message_details.get('model_slug', 'gpt-4o')
+    prices = get_price_table(price_data)
     token_count = message_details.get('additional_info', {}).get('token_count', 0)
-    role = message_details.get('role', 'Not found')
-    
-    model_prices = price_data.get("models", {}).get(model, price_data.get("models", {}).get('gpt-4o', {}))
-    
-    if role == 'user':
-        price_per_token = model_prices.get('input', 2.50)
-    else:
-        price_per_token = model_prices.get('output', 10.00)
-    
-    cost = (token_count / 1_000_000) * price_per_token
-    
+    direction = 'input' if message_details.get('role', 'Not found') == 'user' else 'output'
+
+    cost = prices.token_cost(message_details.get('model_slug'), direction,
+                             message_details.get('content_type'), token_count)
+
     # Ajouter le coût des images si présent
     if message_details.get('contains_images', False):
-        image_count = len(message_details.get('additional_info', {}).get('images', []))
-        image_price = price_data.get("images", {}).get("dalle.text2im", 0.020)
-        cost += image_count * image_price
-    
+        cost += prices.images_cost(len(message_details.get('additional_info', {}).get('images', [])))
+
     return cost
 
-def process_conversations(json_file_path, logger=None, progress_callback=None):
+def conversation_fingerprint(conversation, text_engine=DEFAULT_TEXT_ENGINE):
+    """
+    Empreinte d'une conversation brute pour l'analyse incrémentale : date de mise à jour,
+    taille du mapping et moteur de texte (les comptes de mots et phrases en dépendent).
+    """
+    return f"{conversation.get('update_time')}:{len(conversation.get('mapping') or {})}:{text_engine}"
+
+def load_previous_entries(previous_file_path, detail_level='full', logger=None):
+    """
+    Entrées d'une sortie structurée précédente (tout format de structured_io), par id de
+    conversation. Seules les entrées qui ont une empreinte peuvent être reprises.
+
+    Les entrées écrites sans les textes des messages (champ 'detail_level', voir
+    export_conversations) ne sont pas reprises si le fichier structuré de cette analyse
+    doit contenir les textes (`detail_level` 'full' ou 'external') : leurs conversations
+    sont réanalysées.
+    """
+    entries = {}
+    without_texts = 0
+    for entry in StructuredFile(previous_file_path):
+        if 'fingerprint' not in entry:
+            continue
+        if detail_level != 'metadata' and entry.get('detail_level', 'full') != 'full':
+            without_texts += 1
+            continue
+        entries[entry['id']] = entry
+    if without_texts and logger:
+        logger.warning("Analyse précédente sans textes des messages : %d conversations réanalysées (%s)",
+                       without_texts, previous_file_path)
+    return entries
+
+def find_previous_entry(conversation, previous, price_data, text_engine=DEFAULT_TEXT_ENGINE):
+    """
+    Entrée de `previous` reprise si la conversation n'a pas changé, sinon None. Les coûts
+    de l'entrée reprise sont recalculés avec `price_data` (les prix ont pu changer depuis
+    l'analyse précédente) ; le reste est repris tel quel.
+    """
+    if not previous or 'id' not in conversation:
+        return None
+    entry = previous.get(conversation['id'])
+    if entry is None or entry['fingerprint'] != conversation_fingerprint(conversation, text_engine):
+        return None
+    total_cost = 0.0
+    for message in entry.get('messages', []):
+        message['cost'] = calculate_message_cost(message, price_data)
+        total_cost += message['cost']
+    entry['totalCost'] = round(total_cost, 6)
+    return entry
+
+def extract_conversation_entry(conversation, text_engine=DEFAULT_TEXT_ENGINE):
+    """
+    Extrait l'entrée structurée d'une conversation et ses messages, sans encodage des textes.
+
+    Retourne (conversation_entry, messages) où messages est une liste de
+    (message_details, texte à analyser ou None, modèle).
+    """
+    conversation_id = conversation.get('id', 'id_non_specifie')
+    title = conversation.get('title', 'Sans titre')
+    # Un seul parcours du mapping : compteurs, outils et détails de chaque message
+    details = extract_conversation_details(conversation, with_messages=True)
+
+    conversation_entry = {
+        'id': conversation_id,
+        'title': title,
+        'create_time': details.get('create_time'),
+        'is_archived': details.get('is_archived'),
+        'user_message_count': details.get('user_message_count', 0),
+        'assistant_message_count': details.get('assistant_message_count', 0),
+        'tool_message_count': details.get('tool_message_count', 0),
+        'tools_used': details.get('tools_used', []),
+        'messages': [],
+        'totalCost': 0.0,  # Initialiser le coût total
+        'fingerprint': conversation_fingerprint(conversation, text_engine)
+    }
+
+    messages = []
+    for message_details in details['messages']:
+        text = None
+        if (message_details['content_type'] in MESSAGE_TYPES_TO_ANALYZE and
+            'text' in message_details.get('additional_info', {})):
+            text = message_details['additional_info']['text']
+        messages.append((message_details, text, message_details.get('model_slug', 'gpt-4o')))
+
+    return conversation_entry, messages
+
+def analyze_conversations(pending, price_data, text_engine=DEFAULT_TEXT_ENGINE, logger=None,
+                          tokenizer_threads=TOKENIZER_THREADS):
+    """
+    Analyse un lot de conversations extraites : les textes sont encodés par lots (un par encodage,
+    sur plusieurs threads), puis les comptes sont reportés dans chaque message avec son coût.
+    Les entrées sont complétées en place et retournées dans l'ordre du lot.
+
+    Args:
+        pending: Liste de (conversation_entry, messages) retournés par extract_conversation_entry
+    """
+    texts = [(text, model) for _, messages in pending for _, text, model in messages if text is not None]
+    token_counts = iter(count_tokens_batch([text for text, _ in texts], [model for _, model in texts],
+                                           num_threads=tokenizer_threads))
+
+    entries = []
+    for conversation_entry, messages in pending:
+        conversation_id = conversation_entry['id']
+        # Initialiser le compteur de tokens par modèle
+        model_tokens = {}
+
+        for message_details, text, model in messages:
+            if text is not None:
+                stats = analyze_text(text, model, token_count=next(token_counts))
+                message_details['additional_info'].update(stats)
+
+                # Compter les tokens par modèle
+                model_tokens[model] = model_tokens.get(model, 0) + stats['token_count']
+                if logger:
+                    logger.debug("Message %s - Modèle: %s, Tokens: %s", message_details['message_id'], model, stats['token_count'])
+
+                if message_details['role'] == 'user':
+                    conversation_entry.setdefault('input_tokens', 0)
+                    conversation_entry['input_tokens'] += stats['token_count']
+                else:
+                    conversation_entry.setdefault('output_tokens', 0)
+                    conversation_entry['output_tokens'] += stats['token_count']
+
+            # Mots et phrases comptés une seule fois pour TextStats et GlobalStats
+            message_text = message_details.get('additional_info', {}).get('text')
+            if message_text:
+                message_details['additional_info'].update(count_words_and_sentences(message_text, text_engine))
+
+            # Calculer le coût du message
+            message_cost = calculate_message_cost(message_details, price_data)
+            message_details['cost'] = message_cost
+            conversation_entry['totalCost'] += message_cost
+
+            conversation_entry['messages'].append(message_details)
+
+        # Déterminer le modèle dominant
+        if model_tokens:
+            if logger:
+                logger.info("Distribution des tokens par modèle pour la conversation %s:", conversation_id)
+                for model, tokens in model_tokens.items():
+                    logger.info("  - %s: %s tokens", model, tokens)
+            
+            dominant_model = max(model_tokens.items(), key=lambda x: x[1])[0]
+            conversation_entry['dominant_model'] = dominant_model
+            if logger:
+                logger.info("Modèle dominant pour la conversation %s: %s avec %s tokens", conversation_id, dominant_model, model_tokens[dominant_model])
+        else:
+            if logger:
+                logger.warning("Aucun modèle trouvé pour la conversation %s", conversation_id)
+
+        # Arrondir le coût total à 6 décimales
+        conversation_entry['totalCost'] = round(conversation_entry['totalCost'], 6)
+        entries.append(conversation_entry)
+    return entries
+
+def analyze_shard(conversations, price_data, text_engine=DEFAULT_TEXT_ENGINE):
+    """
+    Tâche exécutée par un processus du pool (voir process_conversations, `workers`) :
+    extrait et analyse un lot de conversations brutes.
+
+    Retourne les entrées structurées, dans l'ordre du lot, et l'évolution des compteurs
+    du cache de tokens du processus pendant ce lot.
+    """
+    token_cache = get_token_cache()
+    before = token_cache.stats()
+    pending = [extract_conversation_entry(conversation, text_engine) for conversation in conversations]
+    # Les processus occupent déjà les coeurs : un seul thread d'encodage chacun
+    entries = analyze_conversations(pending, price_data, text_engine, tokenizer_threads=1)
+    after = token_cache.stats()
+    return entries, {key: after[key] - before[key] for key in after}
+
+def iter_shards(conversations, price_data, shard_messages=TOKENIZER_BATCH_SIZE, previous=None,
+                text_engine=DEFAULT_TEXT_ENGINE):
+    """
+    Regroupe les conversations d'un ConversationStream en lots d'au moins `shard_messages`
+    messages à analyser. Génère (lot, octets consommés à la fin du lot) ; un lot est une liste
+    de (conversation brute, None) ou, pour une conversation reprise de `previous`
+    (find_previous_entry), de (None, entrée reprise).
+    """
+    shard = []
+    messages = 0
+    for conversation in conversations:
+        entry = find_previous_entry(conversation, previous, price_data, text_engine)
+        if entry is not None:
+            shard.append((None, entry))
+            continue
+        shard.append((conversation, None))
+        messages += len(conversation.get('mapping') or {})
+        if messages >= shard_messages:
+            yield shard, conversations.bytes_consumed
+            shard = []
+            messages = 0
+    if shard:
+        yield shard, conversations.bytes_consumed
+
+def process_sharded(conversations, price_data, text_engine, workers, logger=None, progress_callback=None,
+                    previous=None):
+    """
+    Analyse les conversations d'un ConversationStream sur `workers` processus.
+
+    Le processus principal décode le fichier et distribue des lots de conversations ; les
+    résultats sont récupérés dans l'ordre de soumission, donc dans l'ordre du fichier, et
+    chaque coût est calculé et arrondi exactement comme en mode séquentiel. Au plus
+    2 lots par processus sont en cours, ce qui borne la mémoire utilisée. Les conversations
+    reprises de `previous` ne sont pas envoyées aux processus.
+    """
+    total_bytes = conversations.total_bytes
+    all_data = []
+    cache_stats = Counter()
+    in_flight = deque()
+
+    def collect(future, shard, consumed):
+        entries = iter(())
+        if future is not None:
+            entries, shard_cache_stats = future.result()
+            cache_stats.update(shard_cache_stats)
+            entries = iter(entries)
+        for _, conversation_entry in shard:
+            if conversation_entry is None:
+                conversation_entry = next(entries)
+            all_data.append(conversation_entry)
+            if logger:
+                logger.info("Processing conversation %s - %s", conversation_entry['id'], conversation_entry['title'])
+        if progress_callback and shard:
+            idx = len(all_data)
+            progress = (consumed / total_bytes) * 100 if total_bytes else 100
+            estimated_total = max(idx, round(idx * total_bytes / consumed)) if consumed else idx
+            progress_callback(progress, "Processing conversation %d/~%d: %s", idx, estimated_total, all_data[-1]['title'])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard, consumed in iter_shards(conversations, price_data, previous=previous, text_engine=text_engine):
+            to_analyze = [conversation for conversation, entry in shard if entry is None]
+            future = executor.submit(analyze_shard, to_analyze, price_data, text_engine) if to_analyze else None
+            in_flight.append((future, shard, consumed))
+            if len(in_flight) >= 2 * workers:
+                collect(*in_flight.popleft())
+        while in_flight:
+            collect(*in_flight.popleft())
+    return all_data, cache_stats
+
+def log_reused_entries(all_data, previous, logger=None):
+    if previous is None or not logger:
+        return
+    reused = sum(1 for entry in all_data if previous.get(entry['id']) is entry)
+    logger.info("Analyse incrémentale : %d conversations reprises, %d analysées", reused, len(all_data) - reused)
+
+def process_conversations(json_file_path, logger=None, progress_callback=None, text_engine=DEFAULT_TEXT_ENGINE,
+                          workers=1, previous_file_path=None, price_file=None, detail_level='full'):
     """
     Traite les conversations depuis un fichier JSON brut et retourne les données structurées.
     
     Args:
         json_file_path: Chemin vers le fichier JSON
         logger: Logger pour les messages de debug
-        progress_callback: Fonction de callback pour la progression (reçoit un pourcentage et une description)
+        progress_callback: Fonction de callback pour la progression (reçoit un pourcentage, une description
+            au format %-style et ses arguments, formatée seulement si le message est émis)
+        text_engine: Moteur de comptage des mots et phrases ('fast' ou 'nltk', voir text_metrics)
+        workers: Nombre de processus d'analyse ; au-delà de 1, les conversations sont réparties
+            par lots entre les processus (voir process_sharded)
+        previous_file_path: Sortie structurée d'une analyse précédente du même compte ; les
+            conversations dont l'empreinte (conversation_fingerprint) n'a pas changé en sont
+            reprises telles quelles au lieu d'être réanalysées. Les exports étant cumulatifs,
+            seules les conversations nouvelles ou modifiées sont alors analysées. Leurs coûts
+            sont recalculés avec les prix de cette analyse.
+        price_file: Fichier de prix du coût des messages (pricing.PRICE_FILE par défaut)
+        detail_level: Niveau de détail du fichier structuré de cette analyse (DETAIL_LEVELS) ; hors
+            'metadata', les entrées précédentes écrites sans textes ne sont pas reprises
     """
     try:
         # Charger les prix
         try:
-            with open('scripts/price.json', 'r', encoding='utf-8') as f:
-                price_data = json.load(f)
+            price_data = load_price_data(price_file)
         except Exception as e:
             if logger:
                 logger.error("Erreur lors du chargement des prix: %s", e)
-            price_data = {"models": {"gpt-4o": {"input": 2.50, "output": 10.00}}, "images": {"dalle.text2im": 0.020}}
+            price_data = DEFAULT_PRICE_DATA
 
-        # Compter d'abord le nombre total de conversations
-        total_conversations = sum(1 for _ in parse_conversations(json_file_path))
+        previous = None
+        if previous_file_path:
+            try:
+                previous = load_previous_entries(previous_file_path, detail_level, logger)
+            except Exception as e:
+                if logger:
+                    logger.warning("Analyse précédente illisible, analyse complète (%s): %s", previous_file_path, e)
+
+        # Un seul décodage du fichier : la progression est estimée à partir des octets consommés
+        conversations = ConversationStream(json_file_path)
+        total_bytes = conversations.total_bytes
         if progress_callback:
-            progress_callback(0, f"Démarrage du traitement de {total_conversations} conversations")
+            progress_callback(0, "Démarrage du traitement de %.1f Mo de conversations", total_bytes / 1_000_000)
+
+        if workers > 1:
+            all_data, cache_stats = process_sharded(conversations, price_data, text_engine, workers,
+                                                    logger, progress_callback, previous)
+            log_reused_entries(all_data, previous, logger)
+            token_cache = get_token_cache()
+            token_cache.logger = logger
+            token_cache.evict()
+            if logger:
+                logger.info("Cache de tokens (%d processus): %d hits mémoire, %d hits disque, %d misses", workers,
+                            cache_stats['memory_hits'], cache_stats['disk_hits'], cache_stats['misses'])
+            return all_data
 
-        conversations = parse_conversations(json_file_path)
         all_data = []
+        # Conversations extraites dont les textes attendent l'encodage par lots ; leurs entrées
+        # sont déjà à leur place dans all_data et sont complétées par analyze_conversations
+        pending = []
+        pending_texts = 0
         
         for idx, conversation in enumerate(conversations, 1):
-            conversation_id = conversation.get('id', 'id_non_specifie')
-            title = conversation.get('title', 'Sans titre')
-            details = extract_conversation_details(conversation)
-
-            conversation_entry = {
-                'id': conversation_id,
-                'title': title,
-                'create_time': details.get('create_time'),
-                'is_archived': details.get('is_archived'),
-                'user_message_count': details.get('user_message_count', 0),
-                'assistant_message_count': details.get('assistant_message_count', 0),
-                'tool_message_count': details.get('tool_message_count', 0),
-                'tools_used': details.get('tools_used', []),
-                'messages': [],
-                'totalCost': 0.0  # Initialiser le coût total
-            }
-
-            valid_message_ids = details.get('message_ids', [])
-            # Initialiser le compteur de tokens par modèle
-            model_tokens = {}
-            
+            conversation_entry = find_previous_entry(conversation, previous, price_data, text_engine)
+            if conversation_entry is None:
+                conversation_entry, messages = extract_conversation_entry(conversation, text_engine)
+                pending.append((conversation_entry, messages))
+                pending_texts += sum(1 for _, text, _ in messages if text is not None)
+            all_data.append(conversation_entry)
+
             if progress_callback:
-                progress = (idx / total_conversations) * 100
-                progress_callback(progress, f"Processing conversation {idx}/{total_conversations}: {title}")
+                consumed = conversations.bytes_consumed
+                progress = (consumed / total_bytes) * 100 if total_bytes else 100
+                estimated_total = max(idx, round(idx * total_bytes / consumed)) if consumed else idx
+                progress_callback(progress, "Processing conversation %d/~%d: %s", idx, estimated_total, conversation_entry['title'])
             
             if logger:
-                logger.info(f"Processing conversation {conversation_id} - {title}")
-            
-            for message_id in valid_message_ids:
-                message_info = conversation.get('mapping', {}).get(message_id, {})
-                conversation_mapping = conversation.get('mapping', {})
-                message_details = extract_message_details(conversation_id, message_id, message_info, conversation_mapping)
-
-                if (message_details['content_type'] in MESSAGE_TYPES_TO_ANALYZE and
-                    'text' in message_details.get('additional_info', {})):
-                    text = message_details['additional_info']['text']
-                    model = message_details.get('model_slug', 'gpt-4o')
-                    stats = analyze_text(text, model)
-                    message_details['additional_info'].update(stats)
-
-                    # Compter les tokens par modèle
-                    model_tokens[model] = model_tokens.get(model, 0) + stats['token_count']
-                    if logger:
-                        logger.debug(f"Message {message_id} - Modèle: {model}, Tokens: {stats['token_count']}")
-
-                    if message_details['role'] == 'user':
-                        conversation_entry.setdefault('input_tokens', 0)
-                        conversation_entry['input_tokens'] += stats['token_count']
-                    else:
-                        conversation_entry.setdefault('output_tokens', 0)
-                        conversation_entry['output_tokens'] += stats['token_count']
-
-                # Calculer le coût du message
-                message_cost = calculate_message_cost(message_details, price_data)
-                message_details['cost'] = message_cost
-                conversation_entry['totalCost'] += message_cost
-
-                conversation_entry['messages'].append(message_details)
-            
-            # Déterminer le modèle dominant
-            if model_tokens:
-                if logger:
-                    logger.info(f"Distribution des tokens par modèle pour la conversation {conversation_id}:")
-                    for model, tokens in model_tokens.items():
-                        logger.info(f"  - {model}: {tokens} tokens")
-                
-                dominant_model = max(model_tokens.items(), key=lambda x: x[1])[0]
-                conversation_entry['dominant_model'] = dominant_model
-                if logger:
-                    logger.info(f"Modèle dominant pour la conversation {conversation_id}: {dominant_model} avec {model_tokens[dominant_model]} tokens")
-            else:
-                if logger:
-                    logger.warning(f"Aucun modèle trouvé pour la conversation {conversation_id}")
+                logger.info("Processing conversation %s - %s", conversation_entry['id'], conversation_entry['title'])
 
-            # Arrondir le coût total à 6 décimales
-            conversation_entry['totalCost'] = round(conversation_entry['totalCost'], 6)
-            all_data.append(conversation_entry)
+            if pending_texts >= TOKENIZER_BATCH_SIZE:
+                analyze_conversations(pending, price_data, text_engine, logger)
+                pending = []
+                pending_texts = 0
+
+        analyze_conversations(pending, price_data, text_engine, logger)
+        log_reused_entries(all_data, previous, logger)
+
+        token_cache = get_token_cache()
+        token_cache.logger = logger
+        token_cache.evict()
+        if logger:
+            logger.info("Cache de tokens: %(memory_hits)d hits mémoire, %(disk_hits)d hits disque, %(misses)d misses",
+                        token_cache.stats())
         return all_data
+    except ConversationParseError as e:
+        if logger:
+            logger.error("Fichier de conversations invalide: %s", e)
+        return []
     except Exception as e:
         if logger:
             logger.error("Erreur lors du traitement des conversations: %s", e)
         return []
 
-def save_structured_data(all_data, output_file_path, logger=None):
+def message_texts_path(structured_file_path):
+    """
+    Chemin du fichier des textes associé à un fichier structuré écrit au niveau 'external' :
+    une ligne JSON par conversation ayant des textes, {"id": ..., "messages": {message_id: {"text": ..., ...}}}.
+    """
+    return os.path.splitext(structured_file_path)[0] + '.texts.jsonl'
+
+def export_message(message, texts=None):
+    """
+    Dictionnaire d'un message sans ses textes (TEXT_FIELDS) : la longueur du texte reste
+    disponible dans 'character_count' (déjà présent pour les textes analysés), les comptes (tokens, mots, phrases) restent inchangés.
+    Les textes retirés sont ajoutés à `texts` sous l'id du message.
+    """
+    data = message.to_dict() if isinstance(message, MessageRecord) else dict(message)
+    info = data.get('additional_info') or {}
+    removed = {field: info[field] for field in TEXT_FIELDS if field in info}
+    if removed:
+        info = {key: value for key, value in info.items() if key not in TEXT_FIELDS}
+        if 'text' in removed:
+            info.setdefault('character_count', len(removed['text']))
+        data['additional_info'] = info
+        if texts is not None:
+            texts[data['message_id']] = removed
+    return data
+
+def export_conversations(all_data, detail_level, texts_file=None):
+    """
+    Génère, une par une, les copies des conversations dont les messages sont passés par
+    export_message, marquées de leur `detail_level` (une analyse incrémentale ne les reprend pas
+    si elle a besoin des textes, voir load_previous_entries) : une seule copie existe à la fois
+    pendant l'écriture. Avec `texts_file`, les textes retirés y sont écrits au fur et à mesure,
+    une ligne JSON par conversation : {"id": ..., "messages": {message_id: {"text": ..., ...}}}.
+    """
+    for conversation in all_data:
+        texts = {} if texts_file else None
+        entry = dict(conversation)
+        entry['detail_level'] = detail_level
+        entry['messages'] = [export_message(message, texts) for message in conversation.get('messages', [])]
+        if texts:
+            texts_file.write(json.dumps({'id': conversation.get('id'), 'messages': texts},
+                                        ensure_ascii=False, separators=(',', ':')))
+            texts_file.write('\n')
+        yield entry
+
+def save_structured_data(all_data, output_file_path, logger=None, structured_format='json', detail_level='full',
+                         index_file_path=None):
     """
     Sauvegarde les données structurées (JSON détaillé) dans un fichier.
+
+    Le format (voir structured_io.STRUCTURED_FORMATS) 'json', par défaut, est compact et
+    sérialisé par l'encodeur C de json.dumps ; 'pretty' conserve l'ancienne sortie indentée,
+    beaucoup plus volumineuse et lente à écrire ; 'jsonl' et 'msgpack', éventuellement
+    compressés, écrivent une conversation par enregistrement et se lisent en flux
+    (structured_io.StructuredFile).
+
+    `detail_level` (DETAIL_LEVELS) choisit ce que le fichier garde des textes des messages :
+    'full' les conserve, 'external' les déplace dans message_texts_path(output_file_path)
+    (voir message_texts_path) et 'metadata' les supprime. Hors 'full', seuls les comptes et
+    métadonnées restent dans le fichier, avec 'character_count' à la place du texte ; all_data
+    n'est pas modifié (les statistiques peuvent être calculées en parallèle).
+
+    Avec `index_file_path`, l'index des conversations (positions et résumés, voir
+    structured_io.StructuredIndex) est écrit en même temps que le fichier.
     """
     try:
-        with open(output_file_path, 'w', encoding='utf-8') as outfile:
-            json.dump(all_data, outfile, ensure_ascii=False, indent=4)
+        if detail_level not in DETAIL_LEVELS:
+            raise ValueError(f"Niveau de détail inconnu: {detail_level}")
+        split_format(structured_format)
+        if detail_level == 'external':
+            texts_file_path = message_texts_path(output_file_path)
+            with open(texts_file_path, 'w', encoding='utf-8') as texts_file:
+                write_structured(export_conversations(all_data, detail_level, texts_file), output_file_path,
+                                 structured_format, index_file_path)
+            if logger:
+                logger.info("Les textes des messages ont été sauvegardés dans %s", texts_file_path)
+        elif detail_level == 'metadata':
+            write_structured(export_conversations(all_data, detail_level), output_file_path,
+                             structured_format, index_file_path)
+        else:
+            write_structured(all_data, output_file_path, structured_format, index_file_path)
         if logger:
             logger.info("Les données structurées ont été sauvegardées dans %s", output_file_path)
+            if index_file_path:
+                logger.info("L'index des conversations a été sauvegardé dans %s", index_file_path)
     except Exception as e:
         if logger:
             logger.error("Erreur lors de la sauvegarde des données structurées: %s", e)
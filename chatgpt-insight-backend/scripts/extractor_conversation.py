@@ -1,6 +1,12 @@
-def extract_conversation_details(conversation):
+from extractor_message import extract_message_details
+
+def extract_conversation_details(conversation, with_messages=False):
     """
     Extrait des détails spécifiques d'une conversation.
+
+    Avec `with_messages`, les détails de chaque message retenu (extract_message_details)
+    sont extraits dans le même parcours du mapping et ajoutés sous 'messages', dans
+    l'ordre de 'message_ids'.
     """
     details = {}
     details['create_time'] = conversation.get('create_time', None)
@@ -11,8 +17,12 @@ def extract_conversation_details(conversation):
     tool_count = 0
     message_ids = []
     tools_used = set()
+    messages = []
 
     mapping = conversation.get('mapping', {})
+    conversation_id = conversation.get('id', 'id_non_specifie')
+    # model_slug effectif des nœuds, résolu à la demande et partagé par tous les messages
+    model_slugs = {}
     for message_id, message_info in mapping.items():
         message = message_info.get('message', {})
         if not message:
@@ -40,11 +50,15 @@ def extract_conversation_details(conversation):
                 tools_used.add(tool_name)
 
         message_ids.append(message_id)
+        if with_messages:
+            messages.append(extract_message_details(conversation_id, message_id, message_info, mapping, model_slugs))
 
     details['user_message_count'] = user_count
     details['assistant_message_count'] = assistant_count
     details['tool_message_count'] = tool_count
     details['tools_used'] = list(tools_used)
     details['message_ids'] = message_ids
+    if with_messages:
+        details['messages'] = messages
 
     return details
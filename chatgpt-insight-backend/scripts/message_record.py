@@ -0,0 +1,145 @@
+from collections.abc import MutableMapping
+
+# Indicateurs booléens d'un message, dans l'ordre des clés du JSON structuré
+FLAG_NAMES = (
+    'is_multimodal',
+    'contains_images',
+    'contains_videos',
+    'contains_audios',
+    'contains_files',
+    'contains_embeds',
+    'contains_interactive_elements',
+    'contains_reactions',
+    'contains_media',
+    'is_audio'
+)
+FLAG_BITS = {name: 1 << index for index, name in enumerate(FLAG_NAMES)}
+
+# Ordre des clés d'un message sérialisé ; 'cost' n'existe qu'une fois le coût calculé
+FIELD_NAMES = (
+    'conversation_id',
+    'message_id',
+    'role',
+    'tool_name',
+    'model_slug',
+    'content_type',
+    'message_type',
+    *FLAG_NAMES,
+    'create_time',
+    'additional_info',
+    'cost'
+)
+_FIELDS = frozenset(FIELD_NAMES)
+
+
+class MessageRecord(MutableMapping):
+    """
+    Détails d'un message, produits par extract_message_details.
+
+    Les champs sont stockés dans des slots et les indicateurs booléens (contains_*,
+    is_multimodal, is_audio) dans un seul entier : un message occupe une fraction de la
+    mémoire d'un dictionnaire de 20 clés. L'accès reste celui d'un dictionnaire
+    (msg['role'], msg.get('model_slug')) et to_dict() reproduit exactement le
+    dictionnaire d'origine, clés dans le même ordre.
+    """
+    __slots__ = ('conversation_id', 'message_id', 'role', 'tool_name', 'model_slug', 'content_type',
+                 'message_type', 'flags', 'create_time', 'additional_info', 'cost')
+
+    def __init__(self, conversation_id=None, message_id=None):
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self.role = None
+        self.tool_name = None
+        self.model_slug = None
+        self.content_type = None
+        self.message_type = None
+        self.flags = 0
+        self.create_time = None
+        self.additional_info = {}
+        # 'cost' reste non assigné tant que le coût n'est pas calculé
+
+    def __getitem__(self, key):
+        bit = FLAG_BITS.get(key)
+        if bit is not None:
+            return bool(self.flags & bit)
+        if key not in _FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key != 'cost' or not hasattr(self, 'cost'):
+            raise KeyError(key)
+        del self.cost
+
+    def __iter__(self):
+        has_cost = hasattr(self, 'cost')
+        return (key for key in FIELD_NAMES if key != 'cost' or has_cost)
+
+    def __len__(self):
+        return len(FIELD_NAMES) - (0 if hasattr(self, 'cost') else 1)
+
+    def __contains__(self, key):
+        return key in _FIELDS and (key != 'cost' or hasattr(self, 'cost'))
+
+    def to_dict(self):
+        """Dictionnaire équivalent, dans l'ordre des clés du JSON structuré."""
+        data = {
+            'conversation_id': self.conversation_id,
+            'message_id': self.message_id,
+            'role': self.role,
+            'tool_name': self.tool_name,
+            'model_slug': self.model_slug,
+            'content_type': self.content_type,
+            'message_type': self.message_type
+        }
+        flags = self.flags
+        for name in FLAG_NAMES:
+            data[name] = bool(flags & FLAG_BITS[name])
+        data['create_time'] = self.create_time
+        data['additional_info'] = self.additional_info
+        if hasattr(self, 'cost'):
+            data['cost'] = self.cost
+        return data
+
+    def __repr__(self):
+        return f"MessageRecord({self.to_dict()!r})"
+
+
+def _flag_property(name):
+    bit = FLAG_BITS[name]
+
+    def getter(self):
+        return bool(self.flags & bit)
+
+    def setter(self, value):
+        if value:
+            self.flags |= bit
+        else:
+            self.flags &= ~bit
+
+    return property(getter, setter)
+
+
+for _name in FLAG_NAMES:
+    setattr(MessageRecord, _name, _flag_property(_name))
+
+
+def encode_record(obj):
+    """Fonction `default` de json.dump(s) pour sérialiser les MessageRecord."""
+    if isinstance(obj, MessageRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,172 @@
+"""
+Table en colonnes des messages, construite une fois pour toutes les statistiques.
+
+Chaque message est une ligne : index de conversation, date, codes de rôle, de modèle et de
+type de contenu, nombres de tokens, de mots, de phrases, de caractères et d'images. Les
+statistiques (voir `compute` dans stats_factory) en font des agrégations vectorisées par
+groupe au lieu d'appeler `msg.get(...)` pour chaque message.
+
+NumPy est requis ; sans lui, l'import de ce module échoue et StatsEngine calcule les
+statistiques message par message.
+
+Les sommes flottantes sont faites avec np.bincount, qui accumule les valeurs dans l'ordre
+des messages : les résultats sont identiques, au bit près, à ceux du calcul message par message.
+"""
+
+import numpy as np
+from message_record import MessageRecord
+from stats_factory import message_text_counts, message_character_count
+
+# Valeur d'un champ absent du message (les statistiques lui substituent leur valeur par défaut)
+MISSING = object()
+
+
+class MessageTable:
+    """Colonnes des messages de `data` (liste de conversations structurées)."""
+    def __init__(self, data, text_engine):
+        self.conversation_count = len(data)
+        self.conversation_create_time = [conv.get('create_time') for conv in data]
+        # Valeurs d'origine des codes, dans l'ordre de première apparition
+        self.roles = {}
+        self.models = {}
+        self.content_types = {}
+        # Résultats intermédiaires partagés entre statistiques (codes de période...)
+        self.cache = {}
+
+        conversation, create_time, role, model, content_type = [], [], [], [], []
+        token_count, image_count, has_text, word_count, sentence_count, char_count = [], [], [], [], [], []
+        roles, models, content_types = self.roles, self.models, self.content_types
+        nan = float('nan')
+        for conv_index, conv in enumerate(data):
+            conversation_time = self.conversation_create_time[conv_index] or nan
+            for msg in conv.get('messages', []):
+                if type(msg) is MessageRecord:
+                    # Accès direct aux slots : évite msg.get() pour chaque champ
+                    role_value, model_value = msg.role, msg.model_slug
+                    content_type_value, info = msg.content_type, msg.additional_info
+                    time_value = msg.create_time
+                else:
+                    role_value = msg.get('role', 'unknown')
+                    model_value = msg.get('model_slug', MISSING)
+                    content_type_value = msg.get('content_type')
+                    info = msg.get('additional_info', {})
+                    time_value = msg.get('create_time')
+                conversation.append(conv_index)
+                # Date du message, celle de sa conversation à défaut (NaN sans date)
+                create_time.append(time_value or conversation_time)
+                role.append(roles.setdefault(role_value, len(roles)))
+                model.append(models.setdefault(model_value, len(models)))
+                content_type.append(content_types.setdefault(content_type_value, len(content_types)))
+                token_count.append(info.get('token_count', 0))
+                images = info.get('images')
+                image_count.append(len(images) if images else 0)
+
+                words = info.get('tokenized_word_count')
+                if words is not None:
+                    counts = words, info['tokenized_sentence_count']
+                else:
+                    counts = message_text_counts(msg, text_engine)
+                has_text.append(counts is not None)
+                if counts is None:
+                    word_count.append(0)
+                    sentence_count.append(0)
+                    char_count.append(0)
+                else:
+                    word_count.append(counts[0])
+                    sentence_count.append(counts[1])
+                    char_count.append(message_character_count(info))
+
+        self.conversation = np.array(conversation, dtype=np.int64)
+        self.create_time = np.array(create_time, dtype=np.float64)
+        self.role = np.array(role, dtype=np.int64)
+        self.model = np.array(model, dtype=np.int64)
+        self.content_type = np.array(content_type, dtype=np.int64)
+        self.token_count = np.array(token_count, dtype=np.int64)
+        self.image_count = np.array(image_count, dtype=np.int64)
+        self.has_text = np.array(has_text, dtype=bool)
+        self.word_count = np.array(word_count, dtype=np.int64)
+        self.sentence_count = np.array(sentence_count, dtype=np.int64)
+        self.char_count = np.array(char_count, dtype=np.int64)
+        self.model_values = list(models)
+
+    def __len__(self):
+        return len(self.role)
+
+    def role_is(self, *values):
+        """Masque des messages dont le rôle est l'une de ces valeurs."""
+        codes = [self.roles[value] for value in values if value in self.roles]
+        return np.isin(self.role, codes)
+
+    def content_type_is(self, value):
+        code = self.content_types.get(value)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.content_type == code
+
+    def model_groups(self, default_model):
+        """
+        Code par message de son modèle, un modèle absent comptant comme `default_model`,
+        et la liste des modèles par code.
+        """
+        groups = {}
+        remap = np.array([
+            groups.setdefault(default_model if value is MISSING else value, len(groups))
+            for value in self.model_values
+        ], dtype=np.int64)
+        return remap[self.model], list(groups)
+
+    def conversation_codes(self, key_func, name):
+        """
+        Code par message de key_func(create_time) de sa conversation (-1 sans create_time),
+        et la liste des clés par code. Le résultat est gardé en cache sous `name`.
+        """
+        cached = self.cache.get(name)
+        if cached is None:
+            keys = {}
+            codes = [
+                keys.setdefault(key_func(create_time), len(keys)) if create_time else -1
+                for create_time in self.conversation_create_time
+            ]
+            conversation_codes = np.array(codes, dtype=np.int64)
+            cached = self.cache[name] = (conversation_codes[self.conversation], list(keys))
+        return cached
+
+    def message_codes(self, keys_func, name):
+        """
+        Code par message de sa clé (-1 sans date) et la liste des clés par code, où
+        keys_func(dates) calcule les clés entières d'un tableau de dates. Les codes suivent
+        l'ordre croissant des clés : pas de tri supplémentaire pour les parcourir dans
+        l'ordre chronologique. Le résultat est gardé en cache sous `name`.
+        """
+        cached = self.cache.get(name)
+        if cached is None:
+            dated = ~np.isnan(self.create_time)
+            keys, codes = np.unique(keys_func(self.create_time[dated]), return_inverse=True)
+            message_codes = np.full(len(self), -1, dtype=np.int64)
+            message_codes[dated] = codes
+            cached = self.cache[name] = (message_codes, keys.tolist())
+        return cached
+
+
+def first_appearance(codes):
+    """Codes distincts de `codes`, dans l'ordre de leur première apparition."""
+    unique, first = np.unique(codes, return_index=True)
+    return unique[np.argsort(first, kind='stable')].tolist()
+
+
+def group_sum(codes, weights, size):
+    """Somme de `weights` par code, accumulée dans l'ordre des lignes (comme une boucle Python)."""
+    return np.bincount(codes, weights=weights, minlength=size)
+
+
+def sequential_sum(weights):
+    """Somme accumulée dans l'ordre, identique à `total += w` pour chaque valeur."""
+    return float(np.bincount(np.zeros(len(weights), dtype=np.int64), weights=weights, minlength=1)[0])
+
+
+def interleave(first, second):
+    """[first[0], second[0], first[1], second[1], ...] : deux contributions successives par message."""
+    result = np.empty(2 * len(first), dtype=np.float64)
+    result[0::2] = first
+    result[1::2] = second
+    return result
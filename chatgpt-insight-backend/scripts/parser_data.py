@@ -1,15 +1,145 @@
+import codecs
 import json
+import os
+import re
 
-def parse_conversations(json_file_path):
+# Taille des blocs lus sur le disque par le parseur incrémental
+CHUNK_SIZE = 1 << 20
+# Nombre de caractères en fin de tampon pouvant correspondre à un littéral tronqué (true, \uXXXX...)
+TRUNCATION_MARGIN = 8
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ConversationParseError(ValueError):
+    """
+    Erreur de décodage du fichier de conversations, avec sa position en octets.
+    """
+    def __init__(self, message, offset):
+        super().__init__(f"{message} (octet {offset})")
+        self.offset = offset
+
+
+class ConversationStream:
+    """
+    Parseur incrémental du tableau JSON de premier niveau d'un export.
+
+    Les conversations sont décodées et générées une par une : la mémoire utilisée
+    reste de l'ordre de la plus grosse conversation, quelle que soit la taille du fichier.
+    `bytes_consumed` indique le nombre d'octets déjà traités (utile pour la progression).
+    """
+    def __init__(self, json_file_path, chunk_size=CHUNK_SIZE):
+        self.json_file_path = json_file_path
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(json_file_path)
+        self.bytes_consumed = 0
+
+    def __iter__(self):
+        with open(self.json_file_path, 'rb') as f:
+            yield from self._iter_array(f)
+
+    def _iter_array(self, f):
+        decode = json.JSONDecoder().raw_decode
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        buf = ''
+        pos = 0
+        eof = False
+        bytes_read = 0
+        self.bytes_consumed = 0
+
+        def fill(size):
+            # Ajoute un bloc au tampon en abandonnant la partie déjà consommée
+            nonlocal buf, pos, eof, bytes_read
+            chunk = f.read(size)
+            try:
+                text = utf8.decode(chunk, final=not chunk)
+            except UnicodeDecodeError as e:
+                raise ConversationParseError(f"Encodage UTF-8 invalide: {e.reason}", bytes_read + e.start)
+            bytes_read += len(chunk)
+            eof = not chunk
+            buf = buf[pos:] + text
+            pos = 0
+
+        def advance(end):
+            nonlocal pos
+            self.bytes_consumed += len(buf[pos:end].encode('utf-8'))
+            pos = end
+
+        def skip_whitespace():
+            while True:
+                advance(_WHITESPACE.match(buf, pos).end())
+                if pos < len(buf) or eof:
+                    return
+                fill(self.chunk_size)
+
+        def error(message, index):
+            return ConversationParseError(message, self.bytes_consumed + len(buf[pos:index].encode('utf-8')))
+
+        skip_whitespace()
+        if pos >= len(buf):
+            raise error("Fichier de conversations vide", pos)
+        if buf[pos] != '[':
+            raise error("Tableau JSON attendu", pos)
+        advance(pos + 1)
+
+        skip_whitespace()
+        if buf.startswith(']', pos):
+            advance(pos + 1)
+        else:
+            while True:
+                read_size = self.chunk_size
+                while True:
+                    try:
+                        conversation, end = decode(buf, pos)
+                        break
+                    except json.JSONDecodeError as e:
+                        truncated = e.pos >= len(buf) - TRUNCATION_MARGIN or e.msg.startswith('Unterminated string')
+                        if eof or not truncated:
+                            raise error(e.msg, e.pos)
+                        # Lectures de taille croissante : chaque conversation reste décodée en temps linéaire
+                        fill(read_size)
+                        read_size *= 2
+                advance(end)
+                yield conversation
+
+                skip_whitespace()
+                if buf.startswith(',', pos):
+                    advance(pos + 1)
+                    skip_whitespace()
+                elif buf.startswith(']', pos):
+                    advance(pos + 1)
+                    break
+                else:
+                    raise error("Expecting ',' delimiter", pos)
+
+        skip_whitespace()
+        if pos < len(buf):
+            raise error("Données inattendues après le tableau de conversations", pos)
+
+
+def parse_conversations(json_file_path, stream=True):
     """
     Lit un fichier JSON et génère chaque conversation individuellement.
+
+    Par défaut le fichier est décodé de façon incrémentale (voir ConversationStream) ;
+    `stream=False` charge tout le fichier d'un coup. Une erreur de décodage lève
+    ConversationParseError avec la position en octets.
     """
+    if stream:
+        return iter(ConversationStream(json_file_path))
+    return _load_conversations(json_file_path)
+
+
+def _load_conversations(json_file_path):
+    with open(json_file_path, 'rb') as f:
+        raw = f.read()
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            for conversation in data:
-                yield conversation
+        text = raw.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise ConversationParseError(f"Encodage UTF-8 invalide: {e.reason}", e.start)
+    try:
+        data = json.loads(text)
     except json.JSONDecodeError as e:
-        print(f"Erreur de décodage JSON: {e}")
-    except FileNotFoundError:
-        print(f"Fichier non trouvé: {json_file_path}")
+        raise ConversationParseError(e.msg, len(text[:e.pos].encode('utf-8')))
+    for conversation in data:
+        yield conversation
@@ -0,0 +1,198 @@
+"""
+Découpage des dates en périodes (heure, jour, semaine, mois, trimestre, semestre, année).
+
+Une période est identifiée par un entier calculé arithmétiquement à partir du timestamp
+(secondes epoch) : pas de datetime ni de strftime par conversation, et l'ordre des entiers
+est l'ordre chronologique des périodes. La clé texte ('2024-03', '2024-Q1'...) n'est
+formatée qu'à la sortie, une fois par période (format_key).
+
+Les dates sont découpées dans un fuseau explicite : un nom IANA (ex. 'Europe/Paris') ou,
+par défaut, le fuseau local du système comme datetime.fromtimestamp. Le décalage UTC est
+mis en cache par tranche de 15 minutes et le calendrier par jour : découper un même
+timestamp pour plusieurs périodes (bucket_ids) ne coûte que quelques opérations entières.
+bucket_id_array découpe un tableau NumPy de timestamps (un par message, par exemple) en
+ne calculant décalage et calendrier qu'une fois par valeur distincte.
+
+TIME_ATTRIBUTIONS : date utilisée pour placer un message dans une période, celle de sa
+conversation (create_time de la conversation, historique) ou la sienne.
+"""
+
+import math
+import time
+from datetime import date, datetime, timedelta
+
+PERIODS = ('hourly', 'daily', 'weekly', 'monthly', 'quarterly', 'semi-annually', 'yearly')
+TIME_ATTRIBUTIONS = ('conversation', 'message')
+
+# Les changements d'heure ont lieu sur des multiples de 15 minutes
+OFFSET_SLOT_SECONDS = 900
+EPOCH = datetime(1970, 1, 1)
+# date.fromordinal du 1er janvier 1970
+EPOCH_ORDINAL = 719163
+# Numéros de semaine %U (00 à 53) par année
+WEEKS_PER_YEAR = 54
+
+
+class PeriodBucketer:
+    """
+    Identifiants de période des timestamps, dans le fuseau `timezone` (None : fuseau local).
+
+    Les identifiants sont, pour chaque période : heures et jours écoulés depuis l'epoch
+    (en heure locale), année * 54 + semaine %U (semaine commençant le dimanche), année * 12
+    + mois - 1, année * 4 + trimestre - 1, année * 2 + semestre - 1 et l'année.
+    """
+    def __init__(self, timezone=None):
+        self.timezone = timezone
+        if timezone:
+            from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+            try:
+                self.zone = ZoneInfo(timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Fuseau horaire inconnu: {timezone}") from None
+        else:
+            self.zone = None
+        self._offsets = {}
+        self._days = {}
+
+    def utc_offset(self, timestamp):
+        """Décalage UTC (en secondes) du fuseau à l'instant `timestamp`."""
+        slot = math.floor(timestamp) // OFFSET_SLOT_SECONDS
+        offset = self._offsets.get(slot)
+        if offset is None:
+            instant = slot * OFFSET_SLOT_SECONDS
+            if self.zone is None:
+                offset = time.localtime(instant).tm_gmtoff
+            else:
+                offset = int(self.zone.utcoffset(datetime.fromtimestamp(instant, self.zone)).total_seconds())
+            self._offsets[slot] = offset
+        return offset
+
+    def local_seconds(self, timestamp):
+        """Secondes écoulées depuis l'epoch en heure locale du fuseau (arrondies à la seconde inférieure)."""
+        return math.floor(timestamp) + self.utc_offset(timestamp)
+
+    def local_datetime(self, timestamp):
+        """datetime naïf de `timestamp` dans le fuseau (comme datetime.fromtimestamp pour le fuseau local)."""
+        return EPOCH + timedelta(seconds=timestamp + self.utc_offset(timestamp))
+
+    def calendar_day(self, days):
+        """(année, mois, jour du mois, jour de l'année 0-365, jour de semaine 0=dimanche) d'un jour epoch."""
+        day = self._days.get(days)
+        if day is None:
+            current = date.fromordinal(days + EPOCH_ORDINAL)
+            day = self._days[days] = (
+                current.year,
+                current.month,
+                current.day,
+                current.timetuple().tm_yday - 1,
+                (current.weekday() + 1) % 7
+            )
+        return day
+
+    def bucket_ids(self, timestamp, periods):
+        """Identifiant de période de `timestamp` pour chaque période de `periods` ({période: id})."""
+        return self.local_bucket_ids(self.local_seconds(timestamp), periods)
+
+    def local_bucket_ids(self, seconds, periods):
+        """Comme bucket_ids, pour une heure locale déjà exprimée en secondes (voir local_seconds)."""
+        days = seconds // 86400
+        year, month, _, yday, weekday = self.calendar_day(days)
+        ids = {}
+        for period in periods:
+            if period == 'hourly':
+                ids[period] = seconds // 3600
+            elif period == 'daily':
+                ids[period] = days
+            elif period == 'weekly':
+                ids[period] = year * WEEKS_PER_YEAR + (yday + 7 - weekday) // 7
+            elif period == 'monthly':
+                ids[period] = year * 12 + month - 1
+            elif period == 'quarterly':
+                ids[period] = year * 4 + (month - 1) // 3
+            elif period == 'semi-annually':
+                ids[period] = year * 2 + (month - 1) // 6
+            elif period == 'yearly':
+                ids[period] = year
+            else:
+                raise ValueError("Invalid period.")
+        return ids
+
+    def bucket_id(self, timestamp, period):
+        return self.bucket_ids(timestamp, (period,))[period]
+
+    def _unique_map(self, values, func):
+        """func(valeur) pour chaque élément du tableau entier `values`, appelée une fois par valeur distincte."""
+        import numpy as np
+        unique, inverse = np.unique(values, return_inverse=True)
+        return np.array([func(int(value)) for value in unique], dtype=np.int64).reshape(len(unique), -1)[inverse]
+
+    def local_seconds_array(self, timestamps):
+        """local_seconds de chaque timestamp d'un tableau NumPy (float64, sans NaN)."""
+        import numpy as np
+        seconds = np.floor(timestamps).astype(np.int64)
+        offsets = self._unique_map(seconds // OFFSET_SLOT_SECONDS,
+                                   lambda slot: self.utc_offset(slot * OFFSET_SLOT_SECONDS))[:, 0]
+        return seconds + offsets
+
+    def local_time_array(self, timestamps):
+        """Secondes epoch locales (avec fraction) : même valeur que (local_datetime(t) - EPOCH) en secondes."""
+        import numpy as np
+        seconds = np.floor(timestamps).astype(np.int64)
+        return timestamps + (self.local_seconds_array(timestamps) - seconds)
+
+    def bucket_id_array(self, timestamps, period):
+        """Identifiants de période d'un tableau NumPy de timestamps (float64, sans NaN), comme bucket_id."""
+        seconds = self.local_seconds_array(timestamps)
+        if period == 'hourly':
+            return seconds // 3600
+        days = seconds // 86400
+        if period == 'daily':
+            return days
+        calendar = self._unique_map(days, self.calendar_day)
+        year, month, yday, weekday = calendar[:, 0], calendar[:, 1], calendar[:, 3], calendar[:, 4]
+        if period == 'weekly':
+            return year * WEEKS_PER_YEAR + (yday + 7 - weekday) // 7
+        if period == 'monthly':
+            return year * 12 + month - 1
+        if period == 'quarterly':
+            return year * 4 + (month - 1) // 3
+        if period == 'semi-annually':
+            return year * 2 + (month - 1) // 6
+        if period == 'yearly':
+            return year
+        raise ValueError("Invalid period.")
+
+    def format_key(self, period, bucket_id):
+        """Clé texte d'une période, identique à l'ancien strftime ('%Y-%m-%d %H:00', '%Y-%U', '%Y-Q1'...)."""
+        if period == 'hourly':
+            year, month, day, _, _ = self.calendar_day(bucket_id // 24)
+            return f"{year:04d}-{month:02d}-{day:02d} {bucket_id % 24:02d}:00"
+        if period == 'daily':
+            year, month, day, _, _ = self.calendar_day(bucket_id)
+            return f"{year:04d}-{month:02d}-{day:02d}"
+        if period == 'weekly':
+            year, week = divmod(bucket_id, WEEKS_PER_YEAR)
+            return f"{year:04d}-{week:02d}"
+        if period == 'monthly':
+            year, month = divmod(bucket_id, 12)
+            return f"{year:04d}-{month + 1:02d}"
+        if period == 'quarterly':
+            year, quarter = divmod(bucket_id, 4)
+            return f"{year}-Q{quarter + 1}"
+        if period == 'semi-annually':
+            year, half = divmod(bucket_id, 2)
+            return f"{year}-H{half + 1}"
+        if period == 'yearly':
+            return f"{bucket_id:04d}"
+        raise ValueError("Invalid period.")
+
+
+_bucketers = {}
+
+
+def get_bucketer(timezone=None):
+    """PeriodBucketer partagé (et ses caches) pour un fuseau ; lève ValueError si le fuseau est inconnu."""
+    bucketer = _bucketers.get(timezone)
+    if bucketer is None:
+        bucketer = _bucketers[timezone] = PeriodBucketer(timezone)
+    return bucketer
@@ -0,0 +1,151 @@
+"""
+Moteur de prix partagé par tous les calculs de coût (data_processor, stats_factory).
+
+price.json est chargé une fois (load_price_data) puis compilé en une table plate
+(PriceTable) : (clé de modèle, direction, type de contenu) -> prix par million de tokens.
+Le modèle d'un message est résolu une seule fois par slug, avec normalisation des alias :
+les slugs de l'export (`gpt-4o-mini`, `o1-preview`) et les clés de price.json ("4o mini",
+"o1 preview") désignent le même modèle. Un modèle inconnu est tarifé comme `default_model`.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+# price.json à côté de ce module, quel que soit le répertoire courant
+PRICE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price.json')
+
+# Prix utilisés si price.json est illisible
+DEFAULT_PRICE_DATA = {
+    "models": {"gpt-4o": {"input": 2.50, "output": 10.00}},
+    "images": {"dalle.text2im": 0.020},
+    "default_model": "gpt-4o"
+}
+# Prix par million de tokens d'une direction absente des prix du modèle
+FALLBACK_PRICES = {"input": 2.50, "output": 10.00}
+FALLBACK_IMAGE_PRICE = 0.020
+
+DIRECTIONS = ('input', 'output')
+CONTENT_TYPES = ('text', 'audio')
+
+_SEPARATORS = re.compile(r'[\s_.:/-]+')
+_SNAPSHOT_DATE = re.compile(r'-\d{4}-\d{2}-\d{2}$')
+
+_price_data = {}
+_tables = {}
+
+
+def normalize_model_name(name):
+    """
+    Forme canonique d'un nom de modèle pour la recherche d'alias : minuscules, séparateurs
+    unifiés, sans préfixe `gpt-` ni date de version (`gpt-4o-mini-2024-07-18` -> `4o-mini`).
+    Les points des numéros de version sont conservés (`claude-3.5-sonnet`).
+    """
+    name = str(name).strip().lower()
+    name = _SEPARATORS.sub(lambda match: '.' if match.group() == '.' else '-', name).strip('-')
+    name = _SNAPSHOT_DATE.sub('', name)
+    if name.startswith('gpt-'):
+        name = name[len('gpt-'):]
+    return name
+
+
+def content_price_type(content_type):
+    """Type de contenu tarifé : 'audio' pour les messages audio, 'text' pour tous les autres."""
+    return 'audio' if content_type == 'audio' else 'text'
+
+
+class PriceTable:
+    """
+    Table de prix compilée d'un price.json.
+
+    `price(model, direction, content_type)` retourne le prix par million de tokens avec les
+    règles historiques : prix `<direction>_audio` pour un contenu audio s'il existe, sinon
+    prix `<direction>` du modèle, sinon FALLBACK_PRICES. Un modèle absent de la table est
+    tarifé comme `default_model`. Chaque slug n'est résolu qu'une fois.
+
+    `fingerprint` identifie le contenu de price_data : deux tables de mêmes prix ont la
+    même empreinte (les statistiques ne fusionnent que des coûts de mêmes prix).
+    """
+    def __init__(self, price_data):
+        self.price_data = price_data
+        self.fingerprint = hashlib.sha256(
+            json.dumps(price_data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+        self.default_model = price_data.get("default_model", "gpt-4o")
+        models = price_data.get("models", {})
+        self.image_prices = price_data.get("images", {})
+        self.image_price = self.image_prices.get("dalle.text2im", FALLBACK_IMAGE_PRICE)
+
+        self.prices = {}
+        self.aliases = {}
+        for model, model_prices in models.items():
+            self._add_model(model, model_prices)
+            self.aliases.setdefault(normalize_model_name(model), model)
+        for alias, model in price_data.get("aliases", {}).items():
+            if model in models:
+                self.aliases[normalize_model_name(alias)] = model
+        # Modèle par défaut (même absent de price.json) et modèles inconnus
+        self.default_key = self.resolve_known(self.default_model)
+        if self.default_key is None:
+            self.default_key = self.default_model
+            self._add_model(self.default_model, {})
+        self.resolved = {}
+
+    def _add_model(self, model, model_prices):
+        for direction in DIRECTIONS:
+            text_price = model_prices.get(direction, FALLBACK_PRICES[direction])
+            self.prices[(model, direction, 'text')] = text_price
+            self.prices[(model, direction, 'audio')] = model_prices.get(f"{direction}_audio", text_price)
+
+    def resolve_known(self, model):
+        """Clé de price.json du modèle (nom exact ou alias), ou None s'il est inconnu."""
+        if (model, 'input', 'text') in self.prices:
+            return model
+        if model is None:
+            return None
+        return self.aliases.get(normalize_model_name(model))
+
+    def resolve(self, model):
+        """Clé de price.json utilisée pour tarifer `model` (celle du modèle par défaut s'il est inconnu)."""
+        try:
+            return self.resolved[model]
+        except KeyError:
+            key = self.resolve_known(model)
+            key = self.resolved[model] = key if key is not None else self.default_key
+            return key
+
+    def price(self, model, direction, content_type='text'):
+        """Prix par million de tokens de `model` pour une direction ('input'/'output') et un type de contenu."""
+        return self.prices[(self.resolve(model), direction, content_price_type(content_type))]
+
+    def token_cost(self, model, direction, content_type, token_count):
+        """Coût de `token_count` tokens."""
+        return (token_count / 1_000_000) * self.price(model, direction, content_type)
+
+    def images_cost(self, image_count):
+        """Coût de `image_count` images (prix 'dalle.text2im')."""
+        return image_count * self.image_price
+
+
+def load_price_data(price_file=None):
+    """
+    Contenu de price.json (PRICE_FILE par défaut). Le fichier n'est relu que s'il a été
+    modifié depuis le dernier chargement (workers persistants). Lève OSError ou
+    ValueError si le fichier est illisible.
+    """
+    path = os.path.abspath(price_file or PRICE_FILE)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _price_data.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = _price_data[path] = (mtime, json.load(f))
+    return cached[1]
+
+
+def get_price_table(price_data):
+    """PriceTable de `price_data`, compilée une seule fois pour un même dictionnaire de prix."""
+    cached = _tables.get(id(price_data))
+    if cached is None or cached[0] is not price_data:
+        cached = _tables[id(price_data)] = (price_data, PriceTable(price_data))
+    return cached[1]
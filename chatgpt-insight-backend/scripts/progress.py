@@ -0,0 +1,51 @@
+import time
+
+# Valeurs par défaut : au plus 4 messages par seconde, et seulement si la progression
+# a avancé d'au moins 0.5 point (ou si 2 secondes se sont écoulées sans message).
+DEFAULT_MAX_RATE = 4.0
+DEFAULT_MIN_STEP = 0.5
+DEFAULT_MAX_SILENCE = 2.0
+
+
+class ProgressThrottle:
+    """
+    Décide si une mise à jour de progression doit être émise.
+
+    Les mises à jour trop rapprochées sont fusionnées : un message n'est émis que si
+    `1 / max_rate` secondes se sont écoulées depuis le précédent et que le pourcentage
+    a avancé d'au moins `min_step` points (ou que `max_silence` secondes se sont écoulées).
+    """
+    def __init__(self, max_rate=DEFAULT_MAX_RATE, min_step=DEFAULT_MIN_STEP,
+                 max_silence=DEFAULT_MAX_SILENCE, clock=time.monotonic):
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.min_step = min_step
+        self.max_silence = max_silence
+        self.clock = clock
+        self.last_time = None
+        self.last_percentage = None
+
+    def ready(self, percentage, force=False):
+        """Retourne True (et mémorise l'émission) si ce pourcentage doit être émis."""
+        now = self.clock()
+        if not force and self.last_time is not None:
+            elapsed = now - self.last_time
+            if elapsed < self.min_interval:
+                return False
+            if abs(percentage - self.last_percentage) < self.min_step and elapsed < self.max_silence:
+                return False
+        self.last_time = now
+        self.last_percentage = percentage
+        return True
+
+
+def emit_progress(logger, throttle, percentage, description, args, force=False):
+    """
+    Émet "[PROGRESS] x% - description" via le logger si le throttle l'autorise.
+    La description est un format %-style : elle n'est formatée que si le message est émis.
+    """
+    if not throttle.ready(percentage, force):
+        return False
+    if args:
+        description = description % args
+    logger.info("[PROGRESS] %.1f%% - %s", percentage, description)
+    return True
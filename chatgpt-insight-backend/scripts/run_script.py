@@ -1,106 +1,204 @@
 """
 Usage:
-  run_script.py <raw_json_file> <structured_json_file> [--stats_output_file=<stats_output_file>] [--price_file=<price_file>] [--period=<period> ...] [--start_date=<start_date>] [--end_date=<end_date>] [--verbosity=<verbosity>]
+  run_script.py <raw_json_file> [<structured_json_file>] [--structured_format=<structured_format>] [--detail_level=<detail_level>] [--index_file=<index_file>] [--stats_output_file=<stats_output_file>] [--cube_output_file=<cube_output_file>] [--price_file=<price_file>] [--period=<period> ...] [--start_date=<start_date>] [--end_date=<end_date>] [--timezone=<timezone>] [--time_attribution=<time_attribution>] [--verbosity=<verbosity>] [--text_engine=<text_engine>] [--workers=<workers>] [--previous=<previous_file>] [--progress_rate=<progress_rate>] [--progress_step=<progress_step>]
+  run_script.py --worker
   run_script.py -h | --help
 
 Options:
   -h --help                                  Affiche l'aide.
+  --structured_format=<structured_format>    Format du fichier structuré, écrit seulement si demandé (json: compact, pretty: indenté, jsonl et msgpack : une conversation par enregistrement, compressés avec le suffixe .gz ou .zst ; voir structured_io) [default: json].
+  --detail_level=<detail_level>              Textes des messages dans le fichier structuré (full: conservés, external: déplacés dans <fichier>.texts.jsonl, metadata: supprimés ; voir data_processor.save_structured_data) [default: full].
+  --index_file=<index_file>                  Chemin de l'index du fichier structuré : position et résumé de chaque conversation, pour lire une conversation sans charger le fichier (formats json, jsonl et msgpack ; voir structured_io.StructuredIndex).
   --stats_output_file=<stats_output_file>    Chemin du fichier JSON de statistiques [default: rapport_stats.json].
-  --price_file=<price_file>                  Chemin du fichier JSON de prix (nécessaire pour certaines stats).
+  --cube_output_file=<cube_output_file>      Chemin du cube horaire (tokens, coût, messages et images par heure, modèle, rôle et type de contenu) pour les requêtes par plage de dates sans nouvelle analyse (voir timeseries_cube).
+  --price_file=<price_file>                  Chemin du fichier JSON de prix (nécessaire pour certaines stats ; coût des messages : price.json des scripts par défaut).
   --period=<period>                          Période(s) pour les stats temporelles (ex.: hourly, daily, weekly, monthly...).
   --start_date=<start_date>                  Date de début (YYYY-MM-DD) pour les stats combinées.
-  --end_date=<end_date>                      Date de fin (YYYY-MM-DD) pour les stats combinées.
+  --end_date=<end_date>                      Date de fin (YYYY-MM-DD) pour les stats combinées, incluse jusqu'à 00:00 seulement (indiquer l'heure, "YYYY-MM-DD 23:59:59", pour inclure toute la journée).
+  --timezone=<timezone>                      Fuseau horaire des périodes et des dates de début/fin (nom IANA, ex.: Europe/Paris ; par défaut celui du système).
+  --time_attribution=<time_attribution>      Date qui place un message dans une période et dans les dates de début/fin (conversation: création de la conversation, message: création du message) [default: conversation].
   --verbosity=<verbosity>                    Niveau de verbosité (silent, normal, detailed, progress) [default: normal].
+  --text_engine=<text_engine>                Moteur de comptage des mots et phrases (nltk, fast ; voir text_metrics) [default: nltk].
+  --workers=<workers>                        Nombre de processus pour l'analyse des conversations [default: 1].
+  --previous=<previous_file>                 Fichier structuré d'une analyse précédente (tout format) : seules les conversations nouvelles ou modifiées sont analysées.
+  --progress_rate=<progress_rate>            Nombre maximal de messages de progression par seconde [default: 4].
+  --progress_step=<progress_step>            Avancée minimale (en points de pourcentage) entre deux messages de progression [default: 0.5].
+  --worker                                   Mode worker persistant : traite les analyses reçues en JSON lines sur stdin (voir worker.py).
 """
 
 import sys
 import json
 import logging
 from docopt import docopt
-from data_processor import process_conversations, save_structured_data
-from stats_factory import ConversationData, PriceData, StatFactory
+from data_processor import process_conversations, save_structured_data, DETAIL_LEVELS
+from structured_io import STRUCTURED_FORMATS, INDEXED_FORMATS
+from stats_factory import PriceData, StatFactory, StatsEngine
+from timeseries_cube import write_cube
 from datetime import datetime
 from utils import parse_period_key as parse_period_key_global, sort_period as sort_period_global
+from progress import ProgressThrottle, emit_progress
+from periods import TIME_ATTRIBUTIONS, get_bucketer
+from text_metrics import TEXT_ENGINES
+from token_analysis import ENCODING_NAMES, load_encoding, get_token_cache
+from worker import serve
 
 class ProgressTracker:
     """Gère le suivi de la progression du traitement."""
-    def __init__(self, logger, total_steps=100):
+    def __init__(self, logger, total_steps=100, throttle=None):
         self.logger = logger
         self.total_steps = total_steps
         self.current_step = 0
         self.current_phase = ""
+        self.throttle = throttle or ProgressThrottle()
         
-    def update(self, percentage, description):
-        """Met à jour la progression avec un nouveau pourcentage et une description."""
-        self.current_phase = description
-        message = f"[PROGRESS] {percentage:.1f}% - {description}"
-        self.logger.info(message)
+    def update(self, percentage, description, *args, force=False):
+        """
+        Met à jour la progression avec un nouveau pourcentage et une description.
+        Les mises à jour rapprochées sont fusionnées ; `force` émet toujours le message.
+        """
+        if emit_progress(self.logger, self.throttle, percentage, description, args, force):
+            self.current_phase = description % args if args else description
 
-def main():
-    args = docopt(__doc__)
-
-    raw_json_file = args['<raw_json_file>']
-    structured_json_file = args['<structured_json_file>']
-    stats_output_file = args['--stats_output_file']
-    price_file = args['--price_file']
-    periods = args['--period'] if args['--period'] else ['hourly']
-    start_date = args['--start_date']
-    end_date = args['--end_date']
-    verbosity = args['--verbosity']
-
-    # Initialiser le logger et le tracker de progression
-    logger = logging.getLogger("RunScript")
-    logger.setLevel(logging.DEBUG)
-    # Forcer l'encodage UTF-8 pour le handler de console
-    console_handler = logging.StreamHandler(
-        stream=open(sys.stdout.fileno(), mode='w', encoding='utf-8', buffering=1)
-    )
-    # Configurer le format du logger selon le mode de verbosité
+def configure_console_handler(handler, verbosity):
+    """Configure le format, le niveau et le filtre d'un handler selon le mode de verbosité."""
     if verbosity == "progress":
         formatter = logging.Formatter("%(message)s")  # Format simplifié pour le mode progress
-        console_handler.setLevel(logging.INFO)
+        handler.setLevel(logging.INFO)
         # Filtre pour ne garder que les messages de progression
         class ProgressFilter(logging.Filter):
             def filter(self, record):
                 return "[PROGRESS]" in record.getMessage()
-        console_handler.addFilter(ProgressFilter())
+        handler.addFilter(ProgressFilter())
     else:
         formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
         if verbosity == "silent":
-            console_handler.setLevel(logging.ERROR)
+            handler.setLevel(logging.ERROR)
         elif verbosity == "detailed":
-            console_handler.setLevel(logging.DEBUG)
+            handler.setLevel(logging.DEBUG)
         else:
-            console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+            handler.setLevel(logging.INFO)
+    handler.setFormatter(formatter)
+    return handler
+
+def main():
+    args = docopt(__doc__)
+
+    # Initialiser le logger
+    logger = logging.getLogger("RunScript")
+    logger.setLevel(logging.DEBUG)
+
+    if args['--worker']:
+        serve(run_job, warm_up=warm_up)
+        return
+
+    # Forcer l'encodage UTF-8 pour le handler de console
+    console_handler = logging.StreamHandler(
+        stream=open(sys.stdout.fileno(), mode='w', encoding='utf-8', buffering=1)
+    )
+    logger.addHandler(configure_console_handler(console_handler, args['--verbosity']))
+
+    if not run_analysis(args, logger):
+        sys.exit(1)
+
+def warm_up():
+    """Charge une fois pour toutes ce que chaque analyse du mode worker réutilise."""
+    for encoding_name in ENCODING_NAMES:
+        load_encoding(encoding_name)
+    get_token_cache()
+
+def run_job(argv, handler):
+    """
+    Exécute une tâche du mode worker. `argv` reprend les arguments de la ligne de commande ;
+    les messages du logger de la tâche sont envoyés à `handler`.
+    """
+    args = docopt(__doc__, argv=argv, help=False)
+    if args['--worker'] or args['--help']:
+        raise ValueError("Les options --worker et --help ne sont pas acceptées dans une tâche")
+    logger = logging.getLogger("RunScript")
+    logger.addHandler(configure_console_handler(handler, args['--verbosity']))
+    try:
+        return run_analysis(args, logger)
+    finally:
+        logger.removeHandler(handler)
+
+def run_analysis(args, logger):
+    """
+    Traite un export et écrit ses statistiques (et le fichier structuré s'il est demandé).
+    Retourne False si l'analyse n'a pas pu aboutir.
+    """
+    raw_json_file = args['<raw_json_file>']
+    structured_json_file = args['<structured_json_file>']
+    structured_format = args['--structured_format']
+    detail_level = args['--detail_level']
+    index_file = args['--index_file']
+    stats_output_file = args['--stats_output_file']
+    cube_output_file = args['--cube_output_file']
+    price_file = args['--price_file']
+    periods = args['--period'] if args['--period'] else ['hourly']
+    start_date = args['--start_date']
+    end_date = args['--end_date']
+    timezone = args['--timezone']
+    time_attribution = args['--time_attribution']
+    verbosity = args['--verbosity']
+    text_engine = args['--text_engine']
+    workers = args['--workers']
+    previous_file = args['--previous']
+    progress_rate = float(args['--progress_rate'])
+    progress_step = float(args['--progress_step'])
 
     logger.debug("Arguments parsés via docopt: %s", args)
+    if text_engine not in TEXT_ENGINES:
+        logger.error("Moteur de texte inconnu: %s (attendu: %s)", text_engine, ", ".join(TEXT_ENGINES))
+        return False
+    try:
+        get_bucketer(timezone)
+    except ValueError as e:
+        logger.error("%s", e)
+        return False
+    if time_attribution not in TIME_ATTRIBUTIONS:
+        logger.error("Attribution temporelle inconnue: %s (attendu: %s)", time_attribution, ", ".join(TIME_ATTRIBUTIONS))
+        return False
+    if structured_format not in STRUCTURED_FORMATS:
+        logger.error("Format structuré inconnu: %s (attendu: %s)", structured_format, ", ".join(STRUCTURED_FORMATS))
+        return False
+    if detail_level not in DETAIL_LEVELS:
+        logger.error("Niveau de détail inconnu: %s (attendu: %s)", detail_level, ", ".join(DETAIL_LEVELS))
+        return False
+    if index_file and not structured_json_file:
+        logger.error("L'index (--index_file) nécessite un fichier structuré")
+        return False
+    if index_file and structured_format not in INDEXED_FORMATS:
+        logger.error("Index non disponible pour le format %s (attendu: %s)", structured_format, ", ".join(INDEXED_FORMATS))
+        return False
+    if not workers.isdigit() or int(workers) < 1:
+        logger.error("Nombre de processus invalide: %s (entier >= 1 attendu)", workers)
+        return False
+    workers = int(workers)
 
     # Calculer le nombre total d'étapes pour la progression
     total_steps = 100  # Base pour le traitement des conversations
     total_steps += len(periods) * len(['token_stats', 'cost_stats', 'message_stats'])  # Stats par période
     total_steps += len(['cost_stats_combined', 'text_stats', 'global_stats'])  # Stats globales
     
-    progress_tracker = ProgressTracker(logger, total_steps)
+    progress_tracker = ProgressTracker(logger, total_steps, ProgressThrottle(progress_rate, progress_step))
 
     # Étape 1 : Traitement des données brutes -> structured_json_file
     logger.info("=== Étape 1 : Traitement des données brutes ===")
-    def progress_callback(percentage, description):
+    def progress_callback(percentage, description, *args):
         # Limiter cette phase à 20% de la progression totale
         adjusted_percentage = (percentage * 0.2)
-        progress_tracker.update(adjusted_percentage, description)
+        progress_tracker.update(adjusted_percentage, description, *args)
         
-    all_data = process_conversations(raw_json_file, logger, progress_callback)
+    all_data = process_conversations(raw_json_file, logger, progress_callback, text_engine, workers, previous_file,
+                                    price_file, detail_level)
     if not all_data:
         logger.error("Aucune donnée structurée générée. Terminaison du script.")
-        sys.exit(1)
-    save_structured_data(all_data, structured_json_file, logger)
+        return False
 
-    # Étape 2 : Charger ces données pour générer des stats
-    data = ConversationData(structured_json_file).conversations
+    # Étape 2 : Les données en mémoire sont directement utilisées pour les stats
+    data = all_data
     logger.info("Nombre de conversations chargées pour les statistiques : %d", len(data))
-    progress_tracker.update(25, "Données chargées pour l'analyse statistique")
+    progress_tracker.update(25, "Données chargées pour l'analyse statistique", force=True)
 
     # Charger les prix (si nécessaire)
     price_data = None
@@ -114,6 +212,9 @@ def main():
     factory_kwargs = {
         'start_date': start_date,
         'end_date': end_date,
+        'timezone': timezone,
+        'time_attribution': time_attribution,
+        'text_engine': text_engine,
         'verbose': (verbosity == 'detailed')
     }
 
@@ -129,58 +230,70 @@ def main():
         'global_stats'
     ]
 
-    results = {}
+    # Toutes les stats (25-100%) sont calculées en un seul parcours des messages
+    def stats_progress_callback(percentage, description, *args):
+        progress_tracker.update(25 + percentage * 0.75, description, *args)
+
+    engine = StatsEngine(data, progress_callback=stats_progress_callback)
 
-    # Stats par période (25-50%)
-    current_progress = 25
-    progress_per_stat = 25 / (len(periods) * len(per_period_stats))
-    
     for period in periods:
-        logger.info("=== Traitement de la période : %s ===", period)
         factory_kwargs['period'] = period
         for stat_name in per_period_stats:
-            current_progress += progress_per_stat
-            progress_tracker.update(current_progress, f"Calcul de {stat_name} pour la période {period}")
-            logger.info("--- Calcul de la statistique : %s (Période: %s) ---", stat_name, period)
+            logger.info("--- Préparation de la statistique : %s (Période: %s) ---", stat_name, period)
             try:
                 stat = StatFactory.get_stat(stat_name, data, price_data=price_data, **factory_kwargs)
             except ValueError as ve:
                 logger.error("Erreur d'instanciation: %s", ve)
                 continue
-            try:
-                result = stat.calculate()
-                if stat_name not in results:
-                    results[stat_name] = {}
-                results[stat_name][period] = result
-                logger.debug("Statistique '%s' (Période: %s) calculée avec succès.", stat_name, period)
-            except Exception as e:
-                logger.error("Erreur de calcul '%s' (Période: %s): %s", stat_name, period, e)
-                continue
+            engine.register((stat_name, period), stat)
 
-    # Stats globales
-    # Répartition des pourcentages pour les stats globales (50-100%)
-    progress_ranges = {
-        'cost_stats_combined_over_time': (50.0, 65.0),  # 15%
-        'text_stats': (65.0, 82.5),                     # 17.5%
-        'global_stats': (82.5, 100.0)                   # 17.5%
-    }
-    
     for stat_name in global_stats:
-        start_progress, end_progress = progress_ranges.get(stat_name, (0, 0))
-        progress_tracker.update(start_progress, f"Starting calculation of {stat_name}")
-        logger.info("--- Calcul de la statistique globale : %s ---", stat_name)
+        logger.info("--- Préparation de la statistique globale : %s ---", stat_name)
         try:
             stat = StatFactory.get_stat(stat_name, data, price_data=price_data, **factory_kwargs)
         except ValueError as ve:
             logger.error("Erreur d'instanciation stat globale: %s", ve)
             continue
+        engine.register(stat_name, stat)
+
+    # Le cube horaire est calculé dans le même parcours que les statistiques
+    if cube_output_file:
         try:
-            result = stat.calculate()
-            results[stat_name] = result
+            engine.register('time_series_cube', StatFactory.get_stat('time_series_cube', data, price_data=price_data,
+                                                                     **factory_kwargs))
+        except ValueError as ve:
+            logger.error("Erreur d'instanciation du cube horaire: %s", ve)
+
+    logger.info("=== Calcul des statistiques (%d périodes, %d statistiques) ===", len(periods), len(engine.stats))
+    stat_results = engine.run()
+
+    results = {}
+    for period in periods:
+        for stat_name in per_period_stats:
+            key = (stat_name, period)
+            if key in engine.errors:
+                logger.error("Erreur de calcul '%s' (Période: %s): %s", stat_name, period, engine.errors[key])
+            elif key in stat_results:
+                results.setdefault(stat_name, {})[period] = stat_results[key]
+                logger.debug("Statistique '%s' (Période: %s) calculée avec succès.", stat_name, period)
+
+    for stat_name in global_stats:
+        if stat_name in engine.errors:
+            logger.error("Erreur de calcul stat globale '%s': %s", stat_name, engine.errors[stat_name])
+            raise engine.errors[stat_name]
+        if stat_name in stat_results:
+            results[stat_name] = stat_results[stat_name]
             logger.debug("Statistique globale '%s' calculée avec succès.", stat_name)
-        except Exception as e:
-            logger.error("Erreur de calcul stat globale '%s': %s", stat_name, e)
-            raise
+
+    if 'time_series_cube' in engine.errors:
+        logger.error("Erreur de calcul du cube horaire: %s", engine.errors['time_series_cube'])
+    elif 'time_series_cube' in stat_results:
+        try:
+            write_cube(stat_results['time_series_cube'], cube_output_file)
+            logger.info("Cube horaire sauvegardé dans %s (%d cellules)", cube_output_file,
+                        len(stat_results['time_series_cube']['cells']))
+        except OSError as e:
+            logger.error("Erreur lors de la sauvegarde du cube horaire: %s", e)
 
     # Afficher les résultats (selon le niveau de verbosité)
     if verbosity == "detailed":
@@ -195,7 +308,7 @@ def main():
                 logger.info("\nStat globale '%s': %s", stat_name, json.dumps(result, indent=2))
 
     # Sauvegarder les résultats
-    progress_tracker.update(100, "Sauvegarde des résultats finaux")
+    progress_tracker.update(100, "Sauvegarde des résultats finaux", force=True)
     logger.info("Sauvegarde des résultats dans %s ...", stats_output_file)
     try:
         sorted_results = {}
@@ -212,5 +325,14 @@ def main():
     except Exception as e:
         logger.error("Erreur lors de la sauvegarde des résultats: %s", e)
 
+    # Le fichier structuré n'est écrit que s'il est demandé, après les stats : sa sérialisation
+    # (encode_record appelé pour chaque message) garde le GIL, et un thread d'écriture pendant
+    # le calcul des stats ne gagnait rien (export de 68 Mo : stats 0,52 s, écriture 1,80 s,
+    # 2,39 s en médiane avec ou sans thread)
+    if structured_json_file:
+        save_structured_data(all_data, structured_json_file, logger, structured_format=structured_format,
+                             detail_level=detail_level, index_file_path=index_file)
+    return True
+
 if __name__ == "__main__":
     main()
@@ -1,22 +1,70 @@
-import json
+import importlib.util
 from collections import defaultdict
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from abc import ABC, abstractmethod
-from dateutil import parser as date_parser
-import nltk
+from progress import ProgressThrottle, emit_progress
+from text_metrics import count_words_and_sentences, DEFAULT_TEXT_ENGINE
+from structured_io import StructuredFile, read_structured
+from pricing import get_price_table, load_price_data
+from periods import EPOCH, PERIODS, TIME_ATTRIBUTIONS, get_bucketer
+from utils import parse_date
+from timeseries_cube import build_cube
+
+def message_text_counts(msg: Dict[str, Any], text_engine: str = DEFAULT_TEXT_ENGINE) -> Optional[Tuple[int, int]]:
+    """Returns the (words, sentences) of a message's text, or None if it has no text.
+
+    Uses the counts stored by data_processor, and only tokenizes (with `text_engine`)
+    messages from structured files produced before those counts existed.
+    """
+    info = msg.get('additional_info', {})
+    if 'tokenized_word_count' in info:
+        return info['tokenized_word_count'], info['tokenized_sentence_count']
+    content = info.get('text', '')
+    if not content:
+        return None
+    counts = count_words_and_sentences(content, text_engine)
+    return counts['tokenized_word_count'], counts['tokenized_sentence_count']
+
+def message_character_count(info: Dict[str, Any]) -> int:
+    """Returns the length of a message's text from its `additional_info`.
+
+    Structured files written without texts (see data_processor.DETAIL_LEVELS) keep
+    that length as 'character_count'.
+    """
+    if 'character_count' in info:
+        return info['character_count']
+    return len(info.get('text', ''))
+
+def message_create_time(msg: Dict[str, Any], conversation_time: Optional[float]) -> Optional[float]:
+    """Returns the timestamp a message is bucketed by with message time attribution:
+    its own create_time, or its conversation's when the message has none."""
+    return msg.get('create_time') or conversation_time
 
 class ConversationData:
-    """Loads conversation data from a JSON file."""
-    def __init__(self, json_file: str):
-        self.conversations = self.load_data(json_file)
+    """Loads conversation data from a structured file.
+
+    Every format written by structured_io is accepted and detected on load. With
+    `lazy`, `conversations` is a StructuredFile that decodes one conversation at a
+    time on each iteration instead of a list holding the whole file.
+    """
+    def __init__(self, json_file: str, lazy: bool = False):
+        self.conversations = self.open_data(json_file) if lazy else self.load_data(json_file)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.conversations)
 
     @staticmethod
     def load_data(json_file: str) -> List[Dict[str, Any]]:
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data
+            return read_structured(json_file)
+        except Exception as e:
+            print(f"Error loading JSON file: {e}")
+            return []
+
+    @staticmethod
+    def open_data(json_file: str) -> Iterable[Dict[str, Any]]:
+        try:
+            return StructuredFile(json_file)
         except Exception as e:
             print(f"Error loading JSON file: {e}")
             return []
@@ -29,437 +77,916 @@ class PriceData:
     @staticmethod
     def load_prices(price_file: str) -> Dict[str, Any]:
         try:
-            with open(price_file, 'r', encoding='utf-8') as f:
-                prices = json.load(f)
-            return prices
+            return load_price_data(price_file)
         except Exception as e:
             print(f"Error loading price file: {e}")
             return {}
 
+def token_price_table(stat, models: List[Any]):
+    """Input and output price per token of each model for a cost stat, indexed by [model code, is_audio].
+
+    Prices come from the stat's PriceTable, as in its per-message computation.
+    """
+    import numpy as np
+    prices = {direction: [[stat.prices.price(model, direction, content_type) for content_type in ('text', 'audio')]
+                          for model in models]
+              for direction in ("input", "output")}
+    return (np.array(prices["input"], dtype=np.float64).reshape(-1, 2),
+            np.array(prices["output"], dtype=np.float64).reshape(-1, 2))
+
+def _token_counts() -> Dict[str, int]:
+    return {"input_tokens": 0, "output_tokens": 0}
+
+def _period_costs() -> Dict[str, float]:
+    return {"input_cost": 0.0, "output_cost": 0.0, "total_cost": 0.0}
+
+def _model_costs() -> Dict[str, Any]:
+    return {
+        "input_cost": 0.0, "output_cost": 0.0, "total_cost": 0.0,
+        "input_tokens": 0, "output_tokens": 0, "total_tokens": 0
+    }
+
+def _message_counts() -> Dict[str, int]:
+    return {"user_messages": 0, "assistant_messages": 0, "tool_messages": 0, "total_messages": 0}
+
+def _cube_cell() -> List[Any]:
+    return [0, 0.0, 0, 0]
+
+def check_same_prices(stat: 'BaseStat', other: 'BaseStat') -> None:
+    """Raises ValueError if `other` was built from a different price table than `stat`."""
+    if other.prices.fingerprint != stat.prices.fingerprint:
+        raise ValueError(f"Cannot merge {type(other).__name__} computed with different prices")
+
+def check_same_text_engine(stat: 'BaseStat', other: 'BaseStat') -> None:
+    """Raises ValueError if `other` counts words and sentences with a different text engine than `stat`."""
+    if other.text_engine != stat.text_engine:
+        raise ValueError(f"Cannot merge text engine {other.text_engine} into {stat.text_engine}")
+
+def merge_grouped(target: Dict[str, Dict[str, Any]], source: Dict[str, Dict[str, Any]]) -> None:
+    """Adds each value of `source` (group -> field -> number) into the defaultdict `target`."""
+    for group, values in source.items():
+        totals = target[group]
+        for field, value in values.items():
+            totals[field] += value
+
 class BaseStat(ABC):
-    """Base class for statistics."""
+    """Base class for statistics.
+
+    A statistic is an accumulator fed by StatsEngine: `begin()` resets its state,
+    `add()` is called once per message and `finalize()` returns the result.
+    Statistics may also implement `compute(table)`, returning the same result from a
+    columnar MessageTable; StatsEngine uses it when NumPy is available.
+
+    Accumulators are mergeable: `merge(other)` adds the state of another accumulator of
+    the same statistic, so data can be split into shards (or uploads), accumulated
+    separately with `add_conversation()` and combined. The state only holds sums and
+    counts, and averages are derived from them in `finalize()`, so a merged result is
+    the one a single pass would give (float sums up to rounding). The state is picklable
+    and can be sent between processes. See StatFactory.get_accumulator.
+    """
     def __init__(self, verbose: bool = False, logger=None):
         self.verbose = verbose
         self.logger = logger
+        self.progress_throttle = None
 
-    def log_progress(self, percentage: float, description: str):
-        """Emits a progress message if a logger is available."""
+    def log_progress(self, percentage: float, description: str, *args):
+        """Emits a throttled progress message if a logger is available.
+
+        `description` is a %-style format, only formatted with `args` when the message is emitted.
+        """
         if self.logger:
-            self.logger.info(f"[PROGRESS] {percentage:.1f}% - {description}")
+            if self.progress_throttle is None:
+                self.progress_throttle = ProgressThrottle()
+            emit_progress(self.logger, self.progress_throttle, percentage, description, args)
+
+    def begin(self) -> None:
+        """Resets the accumulated state before a pass over the data."""
+
+    def begin_conversation(self, conv: Dict[str, Any]) -> None:
+        """Called before the messages of a conversation."""
 
     @abstractmethod
-    def calculate(self) -> Any:
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        """Accumulates one message. `period_keys` maps each (timezone, period, time attribution)
+        to the bucket id of the conversation's or the message's date (see periods.PeriodBucketer);
+        it is None, or lacks the key, without date."""
+
+    def end_conversation(self, conv: Dict[str, Any]) -> None:
+        """Called after the messages of a conversation."""
+
+    @abstractmethod
+    def finalize(self) -> Any:
         pass
 
-class PeriodHelper:
-    """Tools for managing time periods."""
-    @staticmethod
-    def calculate_period_key(date: datetime, period: str) -> str:
-        if period == 'hourly':
-            return date.strftime('%Y-%m-%d %H:00')
-        elif period == 'daily':
-            return date.strftime('%Y-%m-%d')
-        elif period == 'weekly':
-            return date.strftime('%Y-%U')
-        elif period == 'monthly':
-            return date.strftime('%Y-%m')
-        elif period == 'quarterly':
-            quarter = (date.month - 1) // 3 + 1
-            return f"{date.year}-Q{quarter}"
-        elif period == 'semi-annually':
-            half = 1 if date.month <= 6 else 2
-            return f"{date.year}-H{half}"
-        elif period == 'yearly':
-            return date.strftime('%Y')
-        else:
-            raise ValueError("Invalid period.")
+    @abstractmethod
+    def merge(self, other: 'BaseStat') -> 'BaseStat':
+        """Adds the accumulated state of `other` into this accumulator and returns it."""
 
-    @staticmethod
-    def parse_period_key(key: str, period: str) -> datetime:
-        try:
-            if period == 'hourly':
-                return datetime.strptime(key, '%Y-%m-%d %H:%M')
-            elif period == 'daily':
-                return datetime.strptime(key, '%Y-%m-%d')
-            elif period == 'weekly':
-                year, week = key.split('-')
-                return datetime.strptime(f'{year} {week} 1', '%Y %U %w')
-            elif period == 'monthly':
-                return datetime.strptime(key, '%Y-%m')
-            elif period == 'quarterly':
-                year, quarter = key.split('-Q')
-                month = (int(quarter) - 1) * 3 + 1
-                return datetime(year=int(year), month=month, day=1)
-            elif period == 'semi-annually':
-                year, half = key.split('-H')
-                month = 1 if half == '1' else 7
-                return datetime(year=int(year), month=month, day=1)
-            elif period == 'yearly':
-                return datetime.strptime(key, '%Y')
-        except Exception:
-            return datetime.min
+    def check_mergeable(self, other: 'BaseStat') -> None:
+        if type(other) is not type(self):
+            raise TypeError(f"Cannot merge {type(other).__name__} into {type(self).__name__}")
+
+    def conversation_period_keys(self, conv: Dict[str, Any]) -> Optional[Dict[Tuple[Optional[str], str], int]]:
+        """The `period_keys` StatsEngine passes to add() for the messages of `conv`."""
+        return None
+
+    def add_conversation(self, conv: Dict[str, Any]) -> 'BaseStat':
+        """Accumulates every message of a conversation, as StatsEngine does."""
+        period_keys = self.conversation_period_keys(conv)
+        self.begin_conversation(conv)
+        for msg in conv.get('messages', []):
+            self.add(msg, period_keys)
+        self.end_conversation(conv)
+        return self
+
+    def calculate(self) -> Any:
+        engine = StatsEngine(self.data, progress_callback=self.log_progress if self.logger else None)
+        engine.register('stat', self)
+        results = engine.run()
+        if 'stat' in engine.errors:
+            raise engine.errors['stat']
+        return results['stat']
 
 class BaseStatWithPeriod(BaseStat):
-    """Base class for period-based statistics."""
-    def __init__(self, data: List[Dict[str, Any]], period: str, verbose: bool=False, logger=None):
+    """Base class for period-based statistics.
+
+    Dates are bucketed in `timezone` (an IANA name, the system timezone if None) into integer
+    period ids (see periods.PeriodBucketer); keys are only formatted by finalize().
+
+    With `time_attribution='conversation'`, every message falls in the period of its
+    conversation's create_time. With 'message', each message falls in the period of its
+    own create_time (see message_create_time), so long conversations are spread over the
+    periods they actually span.
+    """
+    def __init__(self, data: List[Dict[str, Any]], period: str, verbose: bool=False, logger=None,
+                 timezone: Optional[str]=None, time_attribution: str='conversation'):
         super().__init__(verbose, logger)
         self.data = data
         self.period = period.lower()
+        if self.period not in PERIODS:
+            raise ValueError("Invalid period.")
+        if time_attribution not in TIME_ATTRIBUTIONS:
+            raise ValueError(f"Invalid time attribution: {time_attribution}")
+        self.timezone = timezone
+        self.time_attribution = time_attribution
+        self.bucketer = get_bucketer(timezone)
+        # Key of this stat's bucket id in the `period_keys` passed to add()
+        self.period_id = (timezone, self.period, time_attribution)
+
+    def period_key(self, period_keys: Optional[Dict[Tuple[Optional[str], str, str], int]]) -> Optional[int]:
+        """This stat's bucket id in the `period_keys` passed to add(), None without date."""
+        return period_keys.get(self.period_id) if period_keys else None
+
+    def check_mergeable(self, other: BaseStat) -> None:
+        super().check_mergeable(other)
+        if other.period_id != self.period_id:
+            raise ValueError(f"Cannot merge period {other.period_id} into {self.period_id}")
+
+    def conversation_period_keys(self, conv: Dict[str, Any]) -> Optional[Dict[Tuple[Optional[str], str], int]]:
+        create_time = conv.get('create_time')
+        if not create_time:
+            return None
+        return {self.period_id: self.bucketer.bucket_id(create_time, self.period)}
+
+    def add_conversation(self, conv: Dict[str, Any]) -> 'BaseStat':
+        if self.time_attribution == 'conversation':
+            return super().add_conversation(conv)
+        conversation_time = conv.get('create_time')
+        self.begin_conversation(conv)
+        for msg in conv.get('messages', []):
+            create_time = message_create_time(msg, conversation_time)
+            self.add(msg, {self.period_id: self.bucketer.bucket_id(create_time, self.period)} if create_time else None)
+        self.end_conversation(conv)
+        return self
 
-    def calculate_period_key(self, date: datetime) -> str:
-        return PeriodHelper.calculate_period_key(date, self.period)
+    def sort_by_period(self, stats: Dict[int, Any]) -> Dict[str, Any]:
+        """Results by period id, in chronological order and keyed by their formatted period key."""
+        return {self.bucketer.format_key(self.period, bucket): stats[bucket] for bucket in sorted(stats)}
 
-    def parse_period_key(self, key: str) -> datetime:
-        return PeriodHelper.parse_period_key(key, self.period)
+    def period_buckets(self, table) -> Tuple[Any, List[int]]:
+        """Per-message period code (-1 for messages without date) and the bucket id of each code."""
+        if self.time_attribution == 'message':
+            return table.message_codes(
+                lambda create_times: self.bucketer.bucket_id_array(create_times, self.period),
+                ('period', self.period_id)
+            )
+        return table.conversation_codes(
+            lambda create_time: self.bucketer.bucket_id(create_time, self.period),
+            ('period', self.period_id)
+        )
+
+    def period_codes(self, table) -> Tuple[Any, List[str]]:
+        """Per-message period code (-1 for messages without date) and the period key of each code."""
+        codes, buckets = self.period_buckets(table)
+        keys = table.cache.get(('period_keys', self.period_id))
+        if keys is None:
+            keys = table.cache[('period_keys', self.period_id)] = [
+                self.bucketer.format_key(self.period, bucket) for bucket in buckets
+            ]
+        return codes, keys
+
+    def sorted_period_codes(self, table, codes) -> List[int]:
+        """Distinct period codes of `codes`, in chronological order."""
+        from message_table import first_appearance
+        _, buckets = self.period_buckets(table)
+        return sorted(first_appearance(codes), key=buckets.__getitem__)
 
 class TokenStatsOverTime(BaseStatWithPeriod):
     """Counts input and output tokens per period."""
-    def calculate(self) -> Dict[str, Dict[str, int]]:
-        stats = defaultdict(lambda: {"input_tokens": 0, "output_tokens": 0})
-        total_convs = len(self.data)
-        
-        for idx, conv in enumerate(self.data, 1):
-            create_time = conv.get('create_time')
-            if not create_time:
-                continue
-            date = datetime.fromtimestamp(create_time)
-            period_key = self.calculate_period_key(date)
-
-            msg_count = len(conv.get('messages', []))
-            for msg_idx, msg in enumerate(conv.get('messages', []), 1):
-                role = msg.get('role', 'unknown')
-                token_count = msg.get('additional_info', {}).get('token_count', 0)
-                if role == 'user':
-                    stats[period_key]["input_tokens"] += token_count
-                elif role in ['assistant', 'tool']:
-                    stats[period_key]["output_tokens"] += token_count
-                
-                # Detailed progress per message
-                progress = ((idx - 1) / total_convs) + ((msg_idx / msg_count) / total_convs)
-                self.log_progress(46.9 + (progress * 2), 
-                    f"Token Analysis - Processing conversation {idx}/{total_convs}, message {msg_idx}/{msg_count}")
-
-        return dict(sorted(stats.items(), key=lambda x: self.parse_period_key(x[0])))
+    def begin(self) -> None:
+        self.stats = defaultdict(_token_counts)
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        period_key = self.period_key(period_keys)
+        if period_key is None:
+            return
+        role = msg.get('role', 'unknown')
+        token_count = msg.get('additional_info', {}).get('token_count', 0)
+        if role == 'user':
+            self.stats[period_key]["input_tokens"] += token_count
+        elif role in ['assistant', 'tool']:
+            self.stats[period_key]["output_tokens"] += token_count
+
+    def finalize(self) -> Dict[str, Dict[str, int]]:
+        return self.sort_by_period(self.stats)
+
+    def merge(self, other: 'TokenStatsOverTime') -> 'TokenStatsOverTime':
+        self.check_mergeable(other)
+        merge_grouped(self.stats, other.stats)
+        return self
+
+    def compute(self, table) -> Dict[str, Dict[str, int]]:
+        from message_table import group_sum
+        period_codes, period_keys = self.period_codes(table)
+        is_user = table.role_is('user')
+        is_output = table.role_is('assistant', 'tool')
+        mask = (period_codes >= 0) & (is_user | is_output)
+        codes, tokens = period_codes[mask], table.token_count[mask]
+        input_tokens = group_sum(codes, tokens * is_user[mask], len(period_keys))
+        output_tokens = group_sum(codes, tokens * is_output[mask], len(period_keys))
+        return {
+            period_keys[code]: {"input_tokens": int(input_tokens[code]), "output_tokens": int(output_tokens[code])}
+            for code in self.sorted_period_codes(table, codes)
+        }
 
 class CostStatsOverTime(BaseStatWithPeriod):
     """Calculates input and output costs per period."""
-    def __init__(self, data: List[Dict[str, Any]], price_data: Dict[str, Any], period: str, verbose: bool=False, logger=None):
-        super().__init__(data, period, verbose, logger)
+    def __init__(self, data: List[Dict[str, Any]], price_data: Dict[str, Any], period: str, verbose: bool=False, logger=None,
+                 timezone: Optional[str]=None, time_attribution: str='conversation'):
+        super().__init__(data, period, verbose, logger, timezone, time_attribution)
         self.price_data = price_data
-        self.default_model = self.price_data.get("default_model", "gpt-4o")
-
-    def calculate(self) -> Dict[str, Any]:
-        costs_over_time = defaultdict(lambda: {"input_cost": 0.0, "output_cost": 0.0, "total_cost": 0.0})
-        costs_by_model = defaultdict(lambda: {
-            "input_cost": 0.0, "output_cost": 0.0, "total_cost": 0.0,
-            "input_tokens": 0, "output_tokens": 0, "total_tokens": 0
-        })
-        costs_by_image = defaultdict(float)
-        total_cost_ref = [0.0]
-        total_convs = len(self.data)
+        self.prices = get_price_table(price_data)
+        self.default_model = self.prices.default_model
 
-        for idx, conv in enumerate(self.data, 1):
-            create_time = conv.get('create_time')
-            if not create_time:
-                continue
-            date = datetime.fromtimestamp(create_time)
-            period_key = self.calculate_period_key(date)
-
-            msg_count = len(conv.get('messages', []))
-            for msg_idx, msg in enumerate(conv.get('messages', []), 1):
-                model = msg.get('model_slug', self.default_model)
-                role = msg.get('role', 'unknown')
-                token_count = msg.get('additional_info', {}).get('token_count', 0)
-                content_type = msg.get('content_type', 'text')
-
-                # Detailed progress per message
-                progress = ((idx - 1) / total_convs) + ((msg_idx / msg_count) / total_convs)
-                self.log_progress(48.9 + (progress * 2), 
-                    f"Cost Calculation - Processing conversation {idx}/{total_convs}, message {msg_idx}/{msg_count}")
-
-                model_prices = self.price_data.get("models", {}).get(
-                    model,
-                    self.price_data.get("models", {}).get(self.default_model, {})
-                )
-
-                # Token cost
-                if role == 'user':
-                    price_per_token = self.get_price_per_token(model_prices, content_type, "input")
-                    cost = (token_count / 1_000_000) * price_per_token
-                    costs_over_time[period_key]["input_cost"] += cost
-                    costs_by_model[model]["input_cost"] += cost
-                    costs_by_model[model]["input_tokens"] += token_count
-                elif role in ['assistant', 'tool']:
-                    price_per_token = self.get_price_per_token(model_prices, content_type, "output")
-                    cost = (token_count / 1_000_000) * price_per_token
-                    costs_over_time[period_key]["output_cost"] += cost
-                    costs_by_model[model]["output_cost"] += cost
-                    costs_by_model[model]["output_tokens"] += token_count
-                else:
-                    cost = 0.0
-
-                costs_by_model[model]["total_tokens"] += token_count
-                costs_over_time[period_key]["total_cost"] += cost
-                costs_by_model[model]["total_cost"] += cost
-                total_cost_ref[0] += cost
-
-                # Image cost
-                self.process_images(msg, role, period_key, model, costs_over_time, costs_by_model, costs_by_image, total_cost_ref)
-
-        total_cost = total_cost_ref[0]
+    def check_mergeable(self, other: BaseStat) -> None:
+        super().check_mergeable(other)
+        check_same_prices(self, other)
+
+    def begin(self) -> None:
+        self.costs_over_time = defaultdict(_period_costs)
+        self.costs_by_model = defaultdict(_model_costs)
+        self.costs_by_image = defaultdict(float)
+        self.total_cost = 0.0
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        period_key = self.period_key(period_keys)
+        if period_key is None:
+            return
+        model = msg.get('model_slug', self.default_model)
+        role = msg.get('role', 'unknown')
+        token_count = msg.get('additional_info', {}).get('token_count', 0)
+        content_type = msg.get('content_type', 'text')
+
+        # Token cost
+        if role == 'user':
+            cost = self.prices.token_cost(model, "input", content_type, token_count)
+            self.costs_over_time[period_key]["input_cost"] += cost
+            self.costs_by_model[model]["input_cost"] += cost
+            self.costs_by_model[model]["input_tokens"] += token_count
+        elif role in ['assistant', 'tool']:
+            cost = self.prices.token_cost(model, "output", content_type, token_count)
+            self.costs_over_time[period_key]["output_cost"] += cost
+            self.costs_by_model[model]["output_cost"] += cost
+            self.costs_by_model[model]["output_tokens"] += token_count
+        else:
+            cost = 0.0
+
+        self.costs_by_model[model]["total_tokens"] += token_count
+        self.costs_over_time[period_key]["total_cost"] += cost
+        self.costs_by_model[model]["total_cost"] += cost
+        self.total_cost += cost
+
+        # Image cost
+        self.process_images(msg, role, period_key, model)
+
+    def finalize(self) -> Dict[str, Any]:
         return {
-            "total_cost": round(total_cost, 4),
-            "costs_by_model": dict(costs_by_model),
-            "costs_by_image": dict(costs_by_image),
-            "costs_over_time": dict(sorted(costs_over_time.items(), key=lambda x: self.parse_period_key(x[0]))),
+            "total_cost": round(self.total_cost, 4),
+            "costs_by_model": dict(self.costs_by_model),
+            "costs_by_image": dict(self.costs_by_image),
+            "costs_over_time": self.sort_by_period(self.costs_over_time),
             "message_stats_over_time": {}
         }
 
-    def get_price_per_token(self, model_prices: Dict[str, float], content_type: str, direction: str) -> float:
-        if f"{direction}_audio" in model_prices and content_type == 'audio':
-            return model_prices[f"{direction}_audio"]
-        return model_prices.get(direction, 2.50 if direction == "input" else 10.00)
+    def merge(self, other: 'CostStatsOverTime') -> 'CostStatsOverTime':
+        self.check_mergeable(other)
+        merge_grouped(self.costs_over_time, other.costs_over_time)
+        merge_grouped(self.costs_by_model, other.costs_by_model)
+        for image_model, cost in other.costs_by_image.items():
+            self.costs_by_image[image_model] += cost
+        self.total_cost += other.total_cost
+        return self
+
+    def compute(self, table, message_mask=None) -> Dict[str, Any]:
+        """Columnar version of add()/finalize(); `message_mask` keeps only some messages."""
+        import numpy as np
+        from message_table import first_appearance, group_sum, sequential_sum, interleave
+        period_codes, period_keys = self.period_codes(table)
+        model_codes, models = table.model_groups(self.default_model)
+        mask = period_codes >= 0
+        if message_mask is not None:
+            mask &= message_mask
+
+        periods = period_codes[mask]
+        model_codes = model_codes[mask]
+        tokens = table.token_count[mask]
+        is_user = table.role_is('user')[mask]
+        is_output = table.role_is('assistant', 'tool')[mask]
+        is_audio = table.content_type_is('audio')[mask].astype(np.int64)
+
+        # Token cost, as computed message by message in add()
+        input_prices, output_prices = token_price_table(self, models)
+        price = np.where(
+            is_user,
+            input_prices[model_codes, is_audio],
+            output_prices[model_codes, is_audio]
+        )
+        cost = np.where(is_user | is_output, (tokens / 1_000_000) * price, 0.0)
+        image_cost = self.prices.images_cost(table.image_count[mask])
 
-    def process_images(self, msg: Dict[str, Any], role: str, period_key: str, model: str,
-                       costs_over_time: defaultdict, costs_by_model: defaultdict,
-                       costs_by_image: defaultdict, total_cost_ref: list):
+        # Each message adds its token cost, then its image cost: sums follow that order
+        event_periods = np.repeat(periods, 2)
+        event_models = np.repeat(model_codes, 2)
+        input_events = interleave(cost * is_user, image_cost * is_user)
+        output_events = interleave(cost * is_output, image_cost * ~is_user)
+        total_events = interleave(cost, image_cost)
+
+        period_count, model_count = len(period_keys), len(models)
+        period_input = group_sum(event_periods, input_events, period_count)
+        period_output = group_sum(event_periods, output_events, period_count)
+        period_total = group_sum(event_periods, total_events, period_count)
+        model_input = group_sum(event_models, input_events, model_count)
+        model_output = group_sum(event_models, output_events, model_count)
+        model_total = group_sum(event_models, total_events, model_count)
+        model_input_tokens = group_sum(model_codes, tokens * is_user, model_count)
+        model_output_tokens = group_sum(model_codes, tokens * is_output, model_count)
+        model_tokens = group_sum(model_codes, tokens, model_count)
+
+        costs_over_time = {
+            period_keys[code]: {
+                "input_cost": float(period_input[code]),
+                "output_cost": float(period_output[code]),
+                "total_cost": float(period_total[code])
+            }
+            for code in self.sorted_period_codes(table, periods)
+        }
+        costs_by_model = {
+            models[code]: {
+                "input_cost": float(model_input[code]),
+                "output_cost": float(model_output[code]),
+                "total_cost": float(model_total[code]),
+                "input_tokens": int(model_input_tokens[code]),
+                "output_tokens": int(model_output_tokens[code]),
+                "total_tokens": int(model_tokens[code])
+            }
+            for code in first_appearance(model_codes)
+        }
+        with_images = image_cost[table.image_count[mask] > 0]
+        costs_by_image = {'dalle.text2im': sequential_sum(with_images)} if len(with_images) else {}
+
+        return {
+            "total_cost": round(sequential_sum(total_events), 4),
+            "costs_by_model": costs_by_model,
+            "costs_by_image": costs_by_image,
+            "costs_over_time": costs_over_time,
+            "message_stats_over_time": {}
+        }
+
+    def process_images(self, msg: Dict[str, Any], role: str, period_key: str, model: str):
         images = msg.get('additional_info', {}).get('images', [])
         number_of_images = len(images)
         if number_of_images > 0:
-            image_price = self.price_data.get("images", {}).get("dalle.text2im", 0.020)
-            image_cost = number_of_images * image_price
-            costs_by_image['dalle.text2im'] += image_cost
+            image_cost = self.prices.images_cost(number_of_images)
+            self.costs_by_image['dalle.text2im'] += image_cost
             if role == 'user':
-                costs_over_time[period_key]["input_cost"] += image_cost
-                costs_by_model[model]["input_cost"] += image_cost
+                self.costs_over_time[period_key]["input_cost"] += image_cost
+                self.costs_by_model[model]["input_cost"] += image_cost
             else:
-                costs_over_time[period_key]["output_cost"] += image_cost
-                costs_by_model[model]["output_cost"] += image_cost
-            costs_by_model[model]["total_cost"] += image_cost
-            costs_over_time[period_key]["total_cost"] += image_cost
-            total_cost_ref[0] += image_cost
+                self.costs_over_time[period_key]["output_cost"] += image_cost
+                self.costs_by_model[model]["output_cost"] += image_cost
+            self.costs_by_model[model]["total_cost"] += image_cost
+            self.costs_over_time[period_key]["total_cost"] += image_cost
+            self.total_cost += image_cost
 
 class MessageStatsOverTime(BaseStatWithPeriod):
     """Counts the number of user/assistant/tool messages per period."""
-    def calculate(self) -> Dict[str, Dict[str, int]]:
-        stats = defaultdict(lambda: {"user_messages": 0, "assistant_messages": 0, "tool_messages": 0, "total_messages": 0})
-        total_convs = len(self.data)
-        
-        for idx, conv in enumerate(self.data, 1):
-            create_time = conv.get('create_time')
-            if not create_time:
-                continue
-            date = datetime.fromtimestamp(create_time)
-            period_key = self.calculate_period_key(date)
-
-            msg_count = len(conv.get('messages', []))
-            for msg_idx, msg in enumerate(conv.get('messages', []), 1):
-                role = msg.get('role', 'unknown')
-                if role == 'user':
-                    stats[period_key]["user_messages"] += 1
-                elif role == 'assistant':
-                    stats[period_key]["assistant_messages"] += 1
-                elif role == 'tool':
-                    stats[period_key]["tool_messages"] += 1
-                stats[period_key]["total_messages"] += 1
-
-                # Detailed progress per message
-                progress = ((idx - 1) / total_convs) + ((msg_idx / msg_count) / total_convs)
-                self.log_progress(50.8 + (progress * 2), 
-                    f"Message Analysis - Processing conversation {idx}/{total_convs}, message {msg_idx}/{msg_count}")
-
-        return dict(sorted(stats.items(), key=lambda x: self.parse_period_key(x[0])))
+    def begin(self) -> None:
+        self.stats = defaultdict(_message_counts)
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        period_key = self.period_key(period_keys)
+        if period_key is None:
+            return
+        role = msg.get('role', 'unknown')
+        if role == 'user':
+            self.stats[period_key]["user_messages"] += 1
+        elif role == 'assistant':
+            self.stats[period_key]["assistant_messages"] += 1
+        elif role == 'tool':
+            self.stats[period_key]["tool_messages"] += 1
+        self.stats[period_key]["total_messages"] += 1
+
+    def finalize(self) -> Dict[str, Dict[str, int]]:
+        return self.sort_by_period(self.stats)
+
+    def merge(self, other: 'MessageStatsOverTime') -> 'MessageStatsOverTime':
+        self.check_mergeable(other)
+        merge_grouped(self.stats, other.stats)
+        return self
+
+    def compute(self, table) -> Dict[str, Dict[str, int]]:
+        from message_table import group_sum
+        period_codes, period_keys = self.period_codes(table)
+        mask = period_codes >= 0
+        codes = period_codes[mask]
+        size = len(period_keys)
+        counts = {
+            name: group_sum(codes, table.role_is(role)[mask], size)
+            for name, role in (("user_messages", 'user'), ("assistant_messages", 'assistant'), ("tool_messages", 'tool'))
+        }
+        counts["total_messages"] = group_sum(codes, None, size)
+        return {
+            period_keys[code]: {name: int(values[code]) for name, values in counts.items()}
+            for code in self.sorted_period_codes(table, codes)
+        }
 
 class CostStatsCombinedOverTime(CostStatsOverTime):
-    """Combines model costs and image costs over the period, filterable by start/end date."""
+    """Combines model costs and image costs over the period, filterable by start/end date.
+
+    The date filter applies to the same date as the periods: the conversation's, or each
+    message's with message time attribution. Both bounds are inclusive, so a date-only
+    end_date stops at midnight at the start of that day (unlike the frontend's date range,
+    which includes the whole end day).
+    """
     def __init__(self, data: List[Dict[str, Any]], price_data: Dict[str, Any],
                  period: str, start_date: Optional[str]=None, end_date: Optional[str]=None,
-                 verbose: bool=False, logger=None):
-        super().__init__(data, price_data, period, verbose, logger)
-        self.start_date = date_parser.parse(start_date) if start_date else None
-        self.end_date = date_parser.parse(end_date) if end_date else None
-
-    def calculate(self) -> Dict[str, Any]:
-        filtered_data = self.filter_data_by_date()
-        total = len(filtered_data)
-        total_messages = sum(len(conv.get('messages', [])) for conv in filtered_data)
-        current_message = 0
-        
-        for idx, conv in enumerate(filtered_data, 1):
-            for msg in conv.get('messages', []):
-                current_message += 1
-                progress = 50.0 + ((current_message / total_messages) * 15.0)
-                self.log_progress(progress,
-                    f"Combined Cost Analysis - Processing conversation {idx}/{total}, message {current_message}/{total_messages}")
-        self.data = filtered_data
-        return super().calculate()
+                 verbose: bool=False, logger=None, timezone: Optional[str]=None,
+                 time_attribution: str='conversation'):
+        super().__init__(data, price_data, period, verbose, logger, timezone, time_attribution)
+        self.start_date = parse_date(start_date)
+        self.end_date = parse_date(end_date)
+        # Bounds as local epoch seconds, compared with the messages' local time
+        self.start_seconds = (self.start_date - EPOCH).total_seconds() if self.start_date else None
+        self.end_seconds = (self.end_date - EPOCH).total_seconds() if self.end_date else None
+
+    def begin_conversation(self, conv: Dict[str, Any]) -> None:
+        self.conversation_time = conv.get('create_time')
+        self.in_range = self.time_attribution == 'message' or self.is_in_range(conv)
+
+    def check_mergeable(self, other: BaseStat) -> None:
+        super().check_mergeable(other)
+        if (other.start_date, other.end_date) != (self.start_date, self.end_date):
+            raise ValueError("Cannot merge cost stats combined over different date ranges")
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        if not self.in_range:
+            return
+        if self.time_attribution == 'message':
+            create_time = message_create_time(msg, self.conversation_time)
+            if not create_time or not self.is_local_time_in_range(create_time + self.bucketer.utc_offset(create_time)):
+                return
+        super().add(msg, period_keys)
+
+    def compute(self, table, message_mask=None) -> Dict[str, Any]:
+        import numpy as np
+        if self.time_attribution == 'message':
+            create_times = table.create_time
+            in_range = ~np.isnan(create_times)
+            in_range[in_range] = self.is_local_time_in_range(self.bucketer.local_time_array(create_times[in_range]))
+            return super().compute(table, in_range)
+        in_range = np.array([self.is_in_range(conv) for conv in self.data], dtype=bool)
+        return super().compute(table, in_range[table.conversation])
+
+    def is_local_time_in_range(self, local_time):
+        """Whether local epoch seconds (a number or a NumPy array) are within the start/end dates."""
+        in_range = True
+        if self.start_seconds is not None:
+            in_range = in_range & (local_time >= self.start_seconds)
+        if self.end_seconds is not None:
+            in_range = in_range & (local_time <= self.end_seconds)
+        return in_range
+
+    def is_in_range(self, conv: Dict[str, Any]) -> bool:
+        create_time = conv.get('create_time')
+        if not create_time:
+            return False
+        date = self.bucketer.local_datetime(create_time)
+        if self.start_date and date < self.start_date:
+            return False
+        if self.end_date and date > self.end_date:
+            return False
+        return True
 
     def filter_data_by_date(self) -> List[Dict[str, Any]]:
-        filtered_data = []
-        for conv in self.data:
-            create_time = conv.get('create_time')
-            if not create_time:
-                continue
-            date = datetime.fromtimestamp(create_time)
-            if self.start_date and date < self.start_date:
-                continue
-            if self.end_date and date > self.end_date:
-                continue
-            filtered_data.append(conv)
-        return filtered_data
+        return [conv for conv in self.data if self.is_in_range(conv)]
+
+class TimeSeriesCubeStats(BaseStatWithPeriod):
+    """Hourly cube of tokens, cost, messages and images per (hour, model, role, content type).
+
+    The result is the dictionary of timeseries_cube.build_cube; TimeSeriesCube answers date
+    range and coarser period queries from it without another pass over the messages.
+    """
+    def __init__(self, data: List[Dict[str, Any]], price_data: Dict[str, Any], verbose: bool=False, logger=None,
+                 timezone: Optional[str]=None, time_attribution: str='conversation'):
+        super().__init__(data, 'hourly', verbose, logger, timezone, time_attribution)
+        self.price_data = price_data
+        self.prices = get_price_table(price_data)
+        self.default_model = self.prices.default_model
+
+    def check_mergeable(self, other: BaseStat) -> None:
+        super().check_mergeable(other)
+        check_same_prices(self, other)
+
+    def begin(self) -> None:
+        # (hour id, model, role, content type) -> [tokens, cost, messages, images]
+        self.cells = defaultdict(_cube_cell)
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        hour = self.period_key(period_keys)
+        if hour is None:
+            return
+        model = msg.get('model_slug', self.default_model)
+        role = msg.get('role', 'unknown')
+        content_type = msg.get('content_type')
+        info = msg.get('additional_info', {})
+        token_count = info.get('token_count', 0)
+        images = info.get('images')
+        image_count = len(images) if images else 0
+
+        # Token cost then image cost, as in CostStatsOverTime
+        cell = self.cells[(hour, model, role, content_type)]
+        cell[0] += token_count
+        if role == 'user':
+            cell[1] += self.prices.token_cost(model, "input", content_type, token_count)
+        elif role in ['assistant', 'tool']:
+            cell[1] += self.prices.token_cost(model, "output", content_type, token_count)
+        if image_count:
+            cell[1] += self.prices.images_cost(image_count)
+        cell[2] += 1
+        cell[3] += image_count
+
+    def finalize(self) -> Dict[str, Any]:
+        return build_cube(self.cells, self.timezone, self.time_attribution)
+
+    def merge(self, other: 'TimeSeriesCubeStats') -> 'TimeSeriesCubeStats':
+        self.check_mergeable(other)
+        for key, values in other.cells.items():
+            cell = self.cells[key]
+            for index, value in enumerate(values):
+                cell[index] += value
+        return self
+
+    def compute(self, table) -> Dict[str, Any]:
+        import numpy as np
+        from message_table import group_sum, interleave
+        hour_codes, hours = self.period_buckets(table)
+        model_codes, models = table.model_groups(self.default_model)
+        roles, content_types = list(table.roles), list(table.content_types)
+        mask = hour_codes >= 0
+
+        # One code per (hour, model, role, content type), numbered in order of first appearance
+        cell_codes = ((hour_codes[mask] * len(models) + model_codes[mask]) * len(roles)
+                      + table.role[mask]) * len(content_types) + table.content_type[mask]
+        unique, first, inverse = np.unique(cell_codes, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        cells = rank[inverse.reshape(-1)]
+        size = len(unique)
+
+        tokens = table.token_count[mask]
+        image_count = table.image_count[mask]
+        is_user = table.role_is('user')[mask]
+        is_output = table.role_is('assistant', 'tool')[mask]
+        is_audio = table.content_type_is('audio')[mask].astype(np.int64)
+        input_prices, output_prices = token_price_table(self, models)
+        price = np.where(is_user, input_prices[model_codes[mask], is_audio], output_prices[model_codes[mask], is_audio])
+        cost = np.where(is_user | is_output, (tokens / 1_000_000) * price, 0.0)
+        image_cost = self.prices.images_cost(image_count)
+
+        cell_tokens = group_sum(cells, tokens, size)
+        cell_cost = group_sum(np.repeat(cells, 2), interleave(cost, image_cost), size)
+        cell_messages = group_sum(cells, None, size)
+        cell_images = group_sum(cells, image_count, size)
+
+        results = {}
+        for rank_code, code in enumerate(unique[order].tolist()):
+            code, content_type = divmod(code, len(content_types))
+            code, role = divmod(code, len(roles))
+            hour, model = divmod(code, len(models))
+            results[(hours[hour], models[model], roles[role], content_types[content_type])] = [
+                int(cell_tokens[rank_code]),
+                float(cell_cost[rank_code]),
+                int(cell_messages[rank_code]),
+                int(cell_images[rank_code])
+            ]
+        return build_cube(results, self.timezone, self.time_attribution)
 
 class TextStats(BaseStat):
     """Calculates number of words, sentences, characters, tokens, etc."""
-    def __init__(self, data: List[Dict[str, Any]], verbose: bool=False, logger=None):
+    def __init__(self, data: List[Dict[str, Any]], verbose: bool=False, logger=None,
+                 text_engine: str=DEFAULT_TEXT_ENGINE):
         super().__init__(verbose, logger)
         self.data = data
+        self.text_engine = text_engine
 
-    def calculate(self) -> Dict[str, Any]:
-        total_words, total_sentences, total_chars, total_tokens = 0, 0, 0, 0
-        conv_word_counts = []
-        total_convs = len(self.data)
+    def check_mergeable(self, other: BaseStat) -> None:
+        super().check_mergeable(other)
+        check_same_text_engine(self, other)
 
-        for idx, conv in enumerate(self.data, 1):
-            word_count_conv = 0
-            msg_count = len(conv.get('messages', []))
-            
-            for msg_idx, msg in enumerate(conv.get('messages', []), 1):
-                content = msg.get('additional_info', {}).get('text', '')
-                if not content:
-                    continue
-                    
-                # Detailed progress per message and operation
-                base_progress = ((idx - 1) / total_convs) + ((msg_idx / msg_count) / total_convs)
-                
-                # Tokenization (1/3 of time) - 65.0 to 70.8
-                self.log_progress(65.0 + (base_progress * 5.8),
-                    f"Text Tokenization - Processing conversation {idx}/{total_convs}, message {msg_idx}/{msg_count}")
-                words = nltk.word_tokenize(content)
-                
-                # Sentence analysis (1/3 of time) - 70.8 to 76.7
-                self.log_progress(70.8 + (base_progress * 5.9),
-                    f"Sentence Analysis - Processing conversation {idx}/{total_convs}, message {msg_idx}/{msg_count}")
-                sentences = nltk.sent_tokenize(content)
-                
-                # Counting and statistics (1/3 of time) - 76.7 to 82.5
-                self.log_progress(76.7 + (base_progress * 5.8),
-                    f"Statistics Calculation - Processing conversation {idx}/{total_convs}, message {msg_idx}/{msg_count}")
-                
-                words = nltk.word_tokenize(content)
-                wc = len(words)
-                total_words += wc
-                word_count_conv += wc
-
-                sentences = nltk.sent_tokenize(content)
-                total_sentences += len(sentences)
-                total_chars += len(content)
-
-                tokens = msg.get('additional_info', {}).get('token_count', 0)
-                total_tokens += tokens
-
-            conv_word_counts.append(word_count_conv)
-
-        avg_words = (sum(conv_word_counts)/len(conv_word_counts)) if conv_word_counts else 0
+    def begin(self) -> None:
+        self.total_words, self.total_sentences, self.total_chars, self.total_tokens = 0, 0, 0, 0
+        self.conversation_count = 0
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        counts = message_text_counts(msg, self.text_engine)
+        if counts is None:
+            return
+        words, sentences = counts
+        self.total_words += words
+        self.total_sentences += sentences
+        self.total_chars += message_character_count(msg['additional_info'])
+        self.total_tokens += msg.get('additional_info', {}).get('token_count', 0)
+
+    def end_conversation(self, conv: Dict[str, Any]) -> None:
+        self.conversation_count += 1
+
+    def finalize(self) -> Dict[str, Any]:
+        avg_words = (self.total_words / self.conversation_count) if self.conversation_count else 0
         return {
-            "total_words": total_words,
-            "total_sentences": total_sentences,
-            "total_characters": total_chars,
-            "total_tokens": total_tokens,
+            "total_words": self.total_words,
+            "total_sentences": self.total_sentences,
+            "total_characters": self.total_chars,
+            "total_tokens": self.total_tokens,
             "average_words_per_conversation": round(avg_words)
         }
 
+    def merge(self, other: 'TextStats') -> 'TextStats':
+        self.check_mergeable(other)
+        self.total_words += other.total_words
+        self.total_sentences += other.total_sentences
+        self.total_chars += other.total_chars
+        self.total_tokens += other.total_tokens
+        self.conversation_count += other.conversation_count
+        return self
+
+    def compute(self, table) -> Dict[str, Any]:
+        has_text = table.has_text
+        self.total_words = int(table.word_count[has_text].sum())
+        self.total_sentences = int(table.sentence_count[has_text].sum())
+        self.total_chars = int(table.char_count[has_text].sum())
+        self.total_tokens = int(table.token_count[has_text].sum())
+        self.conversation_count = table.conversation_count
+        return self.finalize()
+
 class GlobalStats(BaseStat):
     """Calculates global statistics (words, tokens, costs...) across all conversations."""
-    def __init__(self, data: List[Dict[str, Any]], price_data: Dict[str, Any], verbose: bool=False, logger=None):
+    def __init__(self, data: List[Dict[str, Any]], price_data: Dict[str, Any], verbose: bool=False, logger=None,
+                 text_engine: str=DEFAULT_TEXT_ENGINE):
         super().__init__(verbose, logger)
         self.data = data
         self.price_data = price_data
-        self.default_model = self.price_data.get("default_model", "gpt-4o")
+        self.prices = get_price_table(price_data)
+        self.default_model = self.prices.default_model
+        self.text_engine = text_engine
 
-    def calculate(self) -> Dict[str, Any]:
-        total_conversations = len(self.data)
-        total_words = 0
-        total_tokens_in = 0
-        total_tokens_out = 0
-        total_cost = 0.0
-        conv_word_counts = []
+    def check_mergeable(self, other: BaseStat) -> None:
+        super().check_mergeable(other)
+        check_same_prices(self, other)
+        check_same_text_engine(self, other)
 
-        for idx, conv in enumerate(self.data, 1):
-            wconv = 0
-            msg_count = len(conv.get('messages', []))
-            
-            for msg_idx, msg in enumerate(conv.get('messages', []), 1):
-                # Detailed progress per message and operation
-                base_progress = ((idx - 1) / total_conversations) + ((msg_idx / msg_count) / total_conversations)
-                
-                # Text analysis (1/3 of time) - 82.5 to 88.3
-                self.log_progress(82.5 + (base_progress * 5.8),
-                    f"Text Analysis - Processing conversation {idx}/{total_conversations}, message {msg_idx}/{msg_count}")
-                content = msg.get('additional_info', {}).get('text', '')
-                words = nltk.word_tokenize(content)
-                
-                # Token calculation (1/3 of time) - 88.3 to 94.2
-                self.log_progress(88.3 + (base_progress * 5.9),
-                    f"Token Calculation - Processing conversation {idx}/{total_conversations}, message {msg_idx}/{msg_count}")
-                token_count = msg.get('additional_info', {}).get('token_count', 0)
-                
-                # Cost calculation (1/3 of time) - 94.2 to 100.0
-                self.log_progress(94.2 + (base_progress * 5.8),
-                    f"Cost Calculation - Processing conversation {idx}/{total_conversations}, message {msg_idx}/{msg_count}")
-                
-                content = msg.get('additional_info', {}).get('text', '')
-                words = nltk.word_tokenize(content)
-                wc = len(words)
-                total_words += wc
-                wconv += wc
-
-                token_count = msg.get('additional_info', {}).get('token_count', 0)
-                role = msg.get('role', 'unknown')
-                if role == 'user':
-                    total_tokens_in += token_count
-                else:
-                    total_tokens_out += token_count
-
-                model = msg.get('model_slug', self.default_model)
-                model_prices = self.price_data.get("models", {}).get(
-                    model,
-                    self.price_data.get("models", {}).get(self.default_model, {})
-                )
-
-                if role == 'user':
-                    price_per_token = self.get_price_per_token(model_prices, msg.get('content_type'), "input")
-                elif role in ['assistant', 'tool']:
-                    price_per_token = self.get_price_per_token(model_prices, msg.get('content_type'), "output")
-                else:
-                    price_per_token = 0.0
-
-                cost = (token_count / 1_000_000) * price_per_token
-
-                # Images processing
-                images = msg.get('additional_info', {}).get('images', [])
-                nb_img = len(images)
-                if nb_img > 0:
-                    img_price = self.price_data.get("images", {}).get("dalle.text2im", 0.020)
-                    cost += nb_img * img_price
-
-                total_cost += cost
-
-            conv_word_counts.append(wconv)
-
-        avg_words_conv = (sum(conv_word_counts)/total_conversations) if total_conversations else 0
+    def begin(self) -> None:
+        self.total_conversations = 0
+        self.total_words = 0
+        self.total_tokens_in = 0
+        self.total_tokens_out = 0
+        self.total_cost = 0.0
+
+    def begin_conversation(self, conv: Dict[str, Any]) -> None:
+        self.total_conversations += 1
+
+    def add(self, msg: Dict[str, Any], period_keys: Optional[Dict[str, str]]) -> None:
+        counts = message_text_counts(msg, self.text_engine)
+        if counts is not None:
+            self.total_words += counts[0]
+
+        token_count = msg.get('additional_info', {}).get('token_count', 0)
+        role = msg.get('role', 'unknown')
+        if role == 'user':
+            self.total_tokens_in += token_count
+        else:
+            self.total_tokens_out += token_count
+
+        model = msg.get('model_slug', self.default_model)
+        if role == 'user':
+            price_per_token = self.prices.price(model, "input", msg.get('content_type'))
+        elif role in ['assistant', 'tool']:
+            price_per_token = self.prices.price(model, "output", msg.get('content_type'))
+        else:
+            price_per_token = 0.0
+
+        cost = (token_count / 1_000_000) * price_per_token
+
+        # Images processing
+        images = msg.get('additional_info', {}).get('images', [])
+        nb_img = len(images)
+        if nb_img > 0:
+            cost += self.prices.images_cost(nb_img)
+
+        self.total_cost += cost
+
+    def finalize(self) -> Dict[str, Any]:
+        avg_words_conv = (self.total_words / self.total_conversations) if self.total_conversations else 0
         return {
-            "total_conversations": total_conversations,
-            "total_words": total_words,
-            "total_tokens_in": total_tokens_in,
-            "total_tokens_out": total_tokens_out,
+            "total_conversations": self.total_conversations,
+            "total_words": self.total_words,
+            "total_tokens_in": self.total_tokens_in,
+            "total_tokens_out": self.total_tokens_out,
             "average_words_per_conversation": round(avg_words_conv),
-            "total_cost": round(total_cost, 4)
+            "total_cost": round(self.total_cost, 4)
+        }
+
+    def merge(self, other: 'GlobalStats') -> 'GlobalStats':
+        self.check_mergeable(other)
+        self.total_conversations += other.total_conversations
+        self.total_words += other.total_words
+        self.total_tokens_in += other.total_tokens_in
+        self.total_tokens_out += other.total_tokens_out
+        self.total_cost += other.total_cost
+        return self
+
+    def compute(self, table) -> Dict[str, Any]:
+        import numpy as np
+        from message_table import sequential_sum
+        model_codes, models = table.model_groups(self.default_model)
+        tokens = table.token_count
+        is_user = table.role_is('user')
+        is_output = table.role_is('assistant', 'tool')
+        is_audio = table.content_type_is('audio').astype(np.int64)
+
+        input_prices, output_prices = token_price_table(self, models)
+        price = np.where(is_user, input_prices[model_codes, is_audio],
+                         np.where(is_output, output_prices[model_codes, is_audio], 0.0))
+
+        cost = (tokens / 1_000_000) * price
+        cost = np.where(table.image_count > 0, cost + self.prices.images_cost(table.image_count), cost)
+
+        self.total_conversations = table.conversation_count
+        self.total_words = int(table.word_count[table.has_text].sum())
+        self.total_tokens_in = int(tokens[is_user].sum())
+        self.total_tokens_out = int(tokens[~is_user].sum())
+        self.total_cost = sequential_sum(cost)
+        return self.finalize()
+
+class StatsEngine:
+    """Computes several statistics in a single pass over the messages.
+
+    When NumPy is installed, stats implementing `compute(table)` are computed from a
+    columnar MessageTable built once (see message_table); `columnar=False` forces the
+    row-by-row path. The other stats are fed each message once; period keys are computed
+    once per conversation for all the periods requested by the registered stats, and once
+    per message for the stats with message time attribution. A stat
+    that raises is dropped and its exception is kept in `errors`, the others still complete.
+    """
+    def __init__(self, data: List[Dict[str, Any]], progress_callback=None, columnar: Optional[bool]=None):
+        self.data = data
+        self.progress_callback = progress_callback
+        self.columnar = columnar
+        self.stats: Dict[Any, BaseStat] = {}
+        self.errors: Dict[Any, Exception] = {}
+        self.tables: Dict[str, Any] = {}
+
+    def register(self, name: Any, stat: BaseStat) -> None:
+        self.stats[name] = stat
+
+    def run(self) -> Dict[Any, Any]:
+        self.errors = {}
+        stats = list(self.stats.items())
+        columnar = [(name, stat) for name, stat in stats if hasattr(stat, 'compute')] if self.use_columnar() else []
+        rows = [(name, stat) for name, stat in stats if (name, stat) not in columnar]
+
+        results = {}
+        if columnar:
+            results.update(self._run_columnar(columnar))
+        if rows:
+            results.update(self._run_rows(rows))
+        return {name: results[name] for name, _ in stats if name in results}
+
+    def use_columnar(self) -> bool:
+        if self.columnar is not None:
+            return self.columnar
+        # message_table requires NumPy
+        return importlib.util.find_spec('numpy') is not None
+
+    def table(self, text_engine: str):
+        """The MessageTable of the data, built once per text engine."""
+        from message_table import MessageTable
+        if text_engine not in self.tables:
+            self.tables[text_engine] = MessageTable(self.data, text_engine)
+        return self.tables[text_engine]
+
+    def _run_columnar(self, stats) -> Dict[Any, Any]:
+        results = {}
+        # Stats without text counts share the table of the text stats instead of building
+        # another one that tokenizes the texts with the default engine
+        engines = [stat.text_engine for _, stat in stats if hasattr(stat, 'text_engine')]
+        default_engine = engines[0] if engines else DEFAULT_TEXT_ENGINE
+        for idx, (name, stat) in enumerate(stats, 1):
+            try:
+                results[name] = stat.compute(self.table(getattr(stat, 'text_engine', default_engine)))
+            except Exception as e:
+                self.errors[name] = e
+            if self.progress_callback:
+                self.progress_callback((idx / len(stats)) * 100, "Statistics - Computing %d/%d", idx, len(stats))
+        return results
+
+    def _run_rows(self, stats) -> Dict[Any, Any]:
+        active = self._call_each(stats, 'begin')
+        # Periods requested per timezone and time attribution, bucketed together from each
+        # conversation's (or message's) timestamp
+        periods = {attribution: defaultdict(set) for attribution in TIME_ATTRIBUTIONS}
+        for _, stat in active:
+            if isinstance(stat, BaseStatWithPeriod):
+                periods[stat.time_attribution][stat.timezone].add(stat.period)
+        bucketers = {
+            attribution: [(timezone, get_bucketer(timezone), tuple(timezone_periods))
+                          for timezone, timezone_periods in attribution_periods.items()]
+            for attribution, attribution_periods in periods.items()
         }
+        conversation_bucketers, message_bucketers = bucketers['conversation'], bucketers['message']
+        total_convs = len(self.data)
 
-    def get_price_per_token(self, model_prices: Dict[str, float], content_type: str, direction: str) -> float:
-        if f"{direction}_audio" in model_prices and content_type == 'audio':
-            return model_prices[f"{direction}_audio"]
-        return model_prices.get(direction, 2.50 if direction == "input" else 10.00)
+        for idx, conv in enumerate(self.data, 1):
+            create_time = conv.get('create_time')
+            conversation_keys = None
+            if create_time and conversation_bucketers:
+                conversation_keys = {}
+                for timezone, bucketer, timezone_periods in conversation_bucketers:
+                    for period, bucket in bucketer.bucket_ids(create_time, timezone_periods).items():
+                        conversation_keys[(timezone, period, 'conversation')] = bucket
+
+            active = self._call_each(active, 'begin_conversation', conv)
+            adders = [(name, stat.add) for name, stat in active]
+            for msg in conv.get('messages', []):
+                period_keys = conversation_keys
+                message_time = message_create_time(msg, create_time) if message_bucketers else None
+                if message_time:
+                    period_keys = dict(conversation_keys) if conversation_keys else {}
+                    for timezone, bucketer, timezone_periods in message_bucketers:
+                        for period, bucket in bucketer.bucket_ids(message_time, timezone_periods).items():
+                            period_keys[(timezone, period, 'message')] = bucket
+                for name, add in adders:
+                    try:
+                        add(msg, period_keys)
+                    except Exception as e:
+                        self.errors.setdefault(name, e)
+            active = self._call_each(active, 'end_conversation', conv)
+
+            if self.progress_callback:
+                self.progress_callback((idx / total_convs) * 100,
+                    "Statistics - Processing conversation %d/%d", idx, total_convs)
+
+        results = {}
+        for name, stat in active:
+            try:
+                results[name] = stat.finalize()
+            except Exception as e:
+                self.errors.setdefault(name, e)
+        return results
+
+    def _call_each(self, active, method: str, *args):
+        """Calls `method` on every active stat and returns those that did not fail."""
+        remaining = []
+        for name, stat in active:
+            if name in self.errors:
+                continue
+            try:
+                getattr(stat, method)(*args)
+            except Exception as e:
+                self.errors[name] = e
+                continue
+            remaining.append((name, stat))
+        return remaining
 
 class StatFactory:
     """Statistics factory."""
@@ -468,26 +995,45 @@ class StatFactory:
         verbose = kwargs.get('verbose', False)
         period = kwargs.get('period', 'monthly')
         logger = kwargs.get('logger', None)
+        text_engine = kwargs.get('text_engine', DEFAULT_TEXT_ENGINE)
+        timezone = kwargs.get('timezone')
+        time_attribution = kwargs.get('time_attribution') or 'conversation'
 
         if stat_name == 'token_stats_over_time':
-            return TokenStatsOverTime(data, period, verbose, logger)
+            return TokenStatsOverTime(data, period, verbose, logger, timezone, time_attribution)
         elif stat_name == 'cost_stats_over_time':
             if not price_data:
                 raise ValueError("Price data is required for 'cost_stats_over_time'.")
-            return CostStatsOverTime(data, price_data, period, verbose, logger)
+            return CostStatsOverTime(data, price_data, period, verbose, logger, timezone, time_attribution)
         elif stat_name == 'message_stats_over_time':
-            return MessageStatsOverTime(data, period, verbose, logger)
+            return MessageStatsOverTime(data, period, verbose, logger, timezone, time_attribution)
         elif stat_name == 'cost_stats_combined_over_time':
             if not price_data:
                 raise ValueError("Price data is required for 'cost_stats_combined_over_time'.")
             start_date = kwargs.get('start_date')
             end_date = kwargs.get('end_date')
-            return CostStatsCombinedOverTime(data, price_data, period, start_date, end_date, verbose, logger)
+            return CostStatsCombinedOverTime(data, price_data, period, start_date, end_date, verbose, logger, timezone,
+                                             time_attribution)
+        elif stat_name == 'time_series_cube':
+            if not price_data:
+                raise ValueError("Price data is required for 'time_series_cube'.")
+            return TimeSeriesCubeStats(data, price_data, verbose, logger, timezone, time_attribution)
         elif stat_name == 'text_stats':
-            return TextStats(data, verbose, logger)
+            return TextStats(data, verbose, logger, text_engine)
         elif stat_name == 'global_stats':
             if not price_data:
                 raise ValueError("Price data is required for 'global_stats'.")
-            return GlobalStats(data, price_data, verbose, logger)
+            return GlobalStats(data, price_data, verbose, logger, text_engine)
         else:
             raise ValueError(f"Unknown statistic: {stat_name}")
+
+    @staticmethod
+    def get_accumulator(stat_name: str, price_data: Optional[Dict[str, Any]]=None, **kwargs) -> BaseStat:
+        """Returns an empty accumulator of a statistic, not bound to any data.
+
+        Feed it with `add_conversation()`, combine accumulators of the same statistic and
+        options with `merge()` and get the result with `finalize()`.
+        """
+        stat = StatFactory.get_stat(stat_name, [], price_data=price_data, **kwargs)
+        stat.begin()
+        return stat
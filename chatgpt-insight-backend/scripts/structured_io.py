@@ -0,0 +1,285 @@
+"""
+Écriture et lecture du fichier structuré (conversations analysées par data_processor).
+
+Formats d'écriture (STRUCTURED_FORMATS) :
+  - json : tableau JSON compact (format historique, lu en entier par Node) ;
+  - pretty : tableau JSON indenté ;
+  - jsonl : une conversation JSON par ligne ;
+  - msgpack : suite d'objets MessagePack, une conversation par objet.
+jsonl et msgpack acceptent une compression gzip (suffixe .gz) ou zstd (suffixe .zst).
+
+Hors json/pretty, les conversations sont écrites et relues une par une : un consommateur
+peut traiter le fichier en flux sans le charger en entier. À la lecture, le format est
+détecté à partir des premiers octets (voir detect_format), quelle que soit l'extension.
+
+Pour json, jsonl et msgpack non compressés, write_structured peut écrire un index
+(structured_index_path) : position en octets et résumé (titre, date, nombre de messages,
+coût...) de chaque conversation. StructuredIndex s'en sert pour paginer les résumés et relire
+une seule conversation en se plaçant directement à sa position, sans parcourir le fichier.
+
+msgpack et zstandard sont optionnels : ils ne sont importés que pour les formats qui
+les utilisent.
+"""
+
+import gzip
+import io
+import json
+import os
+from message_record import encode_record
+from parser_data import ConversationStream
+
+STRUCTURED_FORMATS = (
+    'json',
+    'pretty',
+    'jsonl',
+    'jsonl.gz',
+    'jsonl.zst',
+    'msgpack',
+    'msgpack.gz',
+    'msgpack.zst'
+)
+
+# Formats dont chaque conversation occupe une plage d'octets lisible seule
+INDEXED_FORMATS = ('json', 'jsonl', 'msgpack')
+INDEX_VERSION = 1
+# Champs des conversations repris dans les résumés de l'index (avec 'message_count')
+SUMMARY_FIELDS = (
+    'id',
+    'title',
+    'create_time',
+    'is_archived',
+    'user_message_count',
+    'assistant_message_count',
+    'tool_message_count',
+    'tools_used',
+    'totalCost',
+    'dominant_model',
+    'input_tokens',
+    'output_tokens'
+)
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def _import_optional(module_name, structured_format):
+    try:
+        return __import__(module_name)
+    except ImportError:
+        raise ValueError(
+            f"Le format structuré {structured_format} nécessite le paquet Python '{module_name}'"
+        ) from None
+
+
+def split_format(structured_format):
+    """Sépare un format de STRUCTURED_FORMATS en (encodage, compression ou None)."""
+    if structured_format not in STRUCTURED_FORMATS:
+        raise ValueError(f"Format de sortie structurée inconnu: {structured_format}")
+    payload, _, compression = structured_format.partition('.')
+    return payload, compression or None
+
+
+def _open_compressed_writer(raw, compression, structured_format):
+    if compression == 'gz':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    if compression == 'zst':
+        zstandard = _import_optional('zstandard', structured_format)
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+    return None
+
+
+def _open_compressed_reader(raw, compression, structured_format):
+    if compression == 'gz':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == 'zst':
+        zstandard = _import_optional('zstandard', structured_format)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=False))
+    return raw
+
+
+def structured_index_path(structured_file_path):
+    """Chemin par défaut de l'index d'un fichier structuré."""
+    return os.path.splitext(structured_file_path)[0] + '.index.json'
+
+
+def conversation_summary(conversation):
+    """Résumé d'une conversation pour l'index : SUMMARY_FIELDS présents et nombre de messages."""
+    summary = {field: conversation[field] for field in SUMMARY_FIELDS if field in conversation}
+    summary['message_count'] = len(conversation.get('messages', []))
+    return summary
+
+
+def write_structured(conversations, output_file_path, structured_format='json', index_file_path=None):
+    """
+    Écrit les conversations dans `output_file_path` au format `structured_format`.
+
+    Les messages (MessageRecord) sont sérialisés avec exactement les clés de l'ancien
+    dictionnaire. `conversations` peut être n'importe quel itérable : hors 'pretty' (qui
+    le charge en liste), il est écrit au fil de l'eau, une conversation à la fois ; le
+    tableau 'json' est identique octet pour octet à json.dumps de la liste.
+
+    Avec `index_file_path` (formats INDEXED_FORMATS seulement), l'index des conversations
+    y est écrit (voir StructuredIndex) ; le fichier structuré est identique à celui écrit sans index.
+    """
+    payload, compression = split_format(structured_format)
+    if index_file_path and structured_format not in INDEXED_FORMATS:
+        raise ValueError(
+            f"Index non disponible pour le format {structured_format} (attendu: {', '.join(INDEXED_FORMATS)})"
+        )
+    if payload == 'pretty':
+        with open(output_file_path, 'w', encoding='utf-8') as outfile:
+            json.dump(list(conversations), outfile, ensure_ascii=False, indent=4, default=encode_record)
+        return
+
+    # Octets écrits avant la première conversation, entre deux conversations et après la dernière
+    opening, separator, closing = b'', b'', b''
+    if payload == 'msgpack':
+        msgpack = _import_optional('msgpack', structured_format)
+        packer = msgpack.Packer(default=encode_record)
+        encode = packer.pack
+    elif payload == 'json':
+        # Même sortie que json.dumps de la liste, une conversation à la fois (positions pour l'index)
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=encode_record)
+        opening, separator, closing = b'[', b',', b']'
+
+        def encode(conversation):
+            return encoder.encode(conversation).encode('utf-8')
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=encode_record)
+
+        def encode(conversation):
+            return (encoder.encode(conversation) + '\n').encode('utf-8')
+
+    index = [] if index_file_path else None
+    with open(output_file_path, 'wb') as raw:
+        compressed = _open_compressed_writer(raw, compression, structured_format)
+        outfile = compressed or raw
+        try:
+            outfile.write(opening)
+            position = len(opening)
+            for count, conversation in enumerate(conversations):
+                if count and separator:
+                    outfile.write(separator)
+                    position += len(separator)
+                data = encode(conversation)
+                if index is not None:
+                    index.append({'offset': position, 'length': len(data), **conversation_summary(conversation)})
+                outfile.write(data)
+                position += len(data)
+            outfile.write(closing)
+        finally:
+            if compressed:
+                compressed.close()
+
+    if index is not None:
+        with open(index_file_path, 'w', encoding='utf-8') as index_file:
+            index_file.write(json.dumps({
+                'version': INDEX_VERSION,
+                'structured_file': os.path.basename(output_file_path),
+                'format': structured_format,
+                'conversations': index
+            }, ensure_ascii=False, separators=(',', ':')))
+
+
+def detect_format(structured_file_path):
+    """
+    Format d'un fichier structuré, d'après ses premiers octets : compression (magic gzip
+    ou zstd) puis premier caractère utile ('[' : tableau JSON, '{' : JSON lines, sinon
+    MessagePack). Un tableau JSON est toujours rapporté comme 'json', indenté ou non.
+    """
+    with open(structured_file_path, 'rb') as raw:
+        magic = raw.read(4)
+        raw.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            compression = 'gz'
+        elif magic == ZSTD_MAGIC:
+            compression = 'zst'
+        else:
+            compression = None
+        reader = _open_compressed_reader(raw, compression, compression)
+        head = reader.read(64).lstrip(b' \t\r\n\xef\xbb\xbf')
+
+    first = head[:1]
+    if first == b'[':
+        if compression:
+            raise ValueError(f"Tableau JSON compressé non pris en charge: {structured_file_path}")
+        return 'json'
+    payload = 'jsonl' if first in (b'{', b'') else 'msgpack'
+    return f"{payload}.{compression}" if compression else payload
+
+
+class StructuredFile:
+    """
+    Conversations d'un fichier structuré, lues une par une à chaque itération.
+
+    Le format est détecté à la création (detect_format) ; un tableau JSON est décodé
+    par le parseur incrémental de parser_data, les autres formats enregistrement par
+    enregistrement. L'objet peut être parcouru plusieurs fois.
+    """
+    def __init__(self, structured_file_path, structured_format=None):
+        self.path = structured_file_path
+        self.format = structured_format or detect_format(structured_file_path)
+
+    def __iter__(self):
+        payload, compression = split_format(self.format)
+        if payload in ('json', 'pretty'):
+            yield from ConversationStream(self.path)
+            return
+        with open(self.path, 'rb') as raw:
+            reader = _open_compressed_reader(raw, compression, self.format)
+            if payload == 'msgpack':
+                msgpack = _import_optional('msgpack', self.format)
+                yield from msgpack.Unpacker(reader, raw=False, strict_map_key=False)
+                return
+            for line in reader:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_structured(structured_file_path):
+    """Liste des conversations d'un fichier structuré, quel que soit son format."""
+    return list(StructuredFile(structured_file_path))
+
+
+class StructuredIndex:
+    """
+    Index d'un fichier structuré (write_structured avec index_file_path).
+
+    Les résumés des conversations sont en mémoire (summaries) ; read_conversation relit
+    une conversation complète en se plaçant à sa position dans le fichier structuré
+    (par défaut celui nommé dans l'index, dans le même répertoire).
+    """
+    def __init__(self, index_file_path, structured_file_path=None):
+        with open(index_file_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Version d'index non prise en charge: {index.get('version')}")
+        self.format = index['format']
+        self.structured_file_path = structured_file_path or os.path.join(
+            os.path.dirname(os.path.abspath(index_file_path)), index['structured_file']
+        )
+        self.entries = index['conversations']
+        self.positions = {entry['id']: position for position, entry in enumerate(self.entries)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def summaries(self, offset=0, limit=None):
+        """Résumés des conversations [offset, offset + limit[, dans l'ordre du fichier."""
+        end = offset + limit if limit is not None else None
+        return [
+            {key: value for key, value in entry.items() if key not in ('offset', 'length')}
+            for entry in self.entries[offset:end]
+        ]
+
+    def read_conversation(self, conversation_id):
+        """Conversation complète (messages compris) ; lève KeyError si elle n'est pas dans l'index."""
+        entry = self.entries[self.positions[conversation_id]]
+        with open(self.structured_file_path, 'rb') as f:
+            f.seek(entry['offset'])
+            data = f.read(entry['length'])
+        payload, _ = split_format(self.format)
+        if payload == 'msgpack':
+            msgpack = _import_optional('msgpack', self.format)
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return json.loads(data)
@@ -0,0 +1,66 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Les modules des scripts s'importent par leur nom (python run_script.py depuis scripts/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_record import FLAG_NAMES  # noqa: E402
+from pricing import load_price_data  # noqa: E402
+
+MODELS = ['gpt-4o', 'o1', '4o mini', 'unknown-model', None]
+ROLES = ['user', 'assistant', 'tool', 'system']
+TEXTS = ["Bonjour, ça va ? Oui.", "Don't stop... it's fine! Really?", "déjà vu: 3.14 et 1,000 €", ""]
+
+
+def make_message(rng, conversation_id, index, create_time):
+    """Message au format du fichier structuré (MessageRecord.to_dict et son coût)."""
+    text = rng.choice(TEXTS)
+    info = {'text': text, 'character_count': len(text), 'token_count': rng.randint(0, 400)}
+    if text and rng.random() < 0.7:
+        # Comptages enregistrés par data_processor ; sinon les stats tokenisent le texte
+        info['tokenized_word_count'] = rng.randint(1, 20)
+        info['tokenized_sentence_count'] = rng.randint(1, 3)
+    if rng.random() < 0.1:
+        info['images'] = [{}] * rng.randint(1, 3)
+    message = {
+        'conversation_id': conversation_id,
+        'message_id': f'{conversation_id}-{index}',
+        'role': rng.choice(ROLES),
+        'tool_name': None,
+        'model_slug': rng.choice(MODELS),
+        'content_type': 'audio' if rng.random() < 0.05 else 'text',
+        'message_type': 'text',
+        **{name: False for name in FLAG_NAMES},
+        'create_time': None if rng.random() < 0.1 else create_time,
+        'additional_info': info,
+        'cost': round(rng.random() / 100, 6)
+    }
+    if rng.random() < 0.05:
+        del message['model_slug']
+    return message
+
+
+@pytest.fixture
+def conversations():
+    """Conversations structurées sur six mois, avec les cas limites rencontrés dans les exports."""
+    rng = random.Random(1)
+    data = []
+    for index in range(120):
+        conversation_id = f'conv-{index}'
+        create_time = 1672531200 + rng.randint(0, 180 * 86400)
+        data.append({
+            'id': conversation_id,
+            'title': f'Conversation {index}',
+            'create_time': None if index % 17 == 0 else create_time,
+            'messages': [make_message(rng, conversation_id, position, create_time + position * 90)
+                         for position in range(rng.randint(0, 12))]
+        })
+    return data
+
+
+@pytest.fixture
+def price_data():
+    return load_price_data()
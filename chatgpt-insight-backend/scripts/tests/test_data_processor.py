@@ -0,0 +1,141 @@
+import functools
+import json
+import random
+
+import pytest
+
+import data_processor
+from data_processor import (conversation_fingerprint, find_previous_entry, load_previous_entries,
+                            process_conversations, save_structured_data)
+from message_record import encode_record
+from structured_io import read_structured
+
+MODELS = ['gpt-4o', 'gpt-4', 'text-davinci-002-render-sha']
+TEXTS = ["Bonjour, ça va ? Oui.", "Don't stop... it's fine! Really?", "déjà vu: 3.14 et 1,000 €", "Dr. Smith est là."]
+
+
+@pytest.fixture
+def encodings():
+    # Les tables BPE de tiktoken sont téléchargées au premier usage
+    try:
+        for model_slug in MODELS:
+            data_processor.count_tokens_batch(['test'], [model_slug])
+    except Exception as e:
+        pytest.skip(f"Encodages tiktoken indisponibles: {e}")
+
+
+def raw_conversation(rng, index):
+    """Conversation au format de l'export ChatGPT : une branche de messages sous une racine vide."""
+    create_time = 1672531200 + index * 3600
+    mapping = {'root': {'id': 'root', 'message': None, 'parent': None, 'children': []}}
+    parent = 'root'
+    for position in range(rng.randint(0, 8)):
+        node_id = f'{index}-{position}'
+        mapping[parent]['children'].append(node_id)
+        mapping[node_id] = {'id': node_id, 'parent': parent, 'children': [], 'message': {
+            'id': node_id,
+            'author': {'role': 'user' if position % 2 == 0 else 'assistant', 'name': None, 'metadata': {}},
+            'create_time': create_time + position * 60,
+            'content': {'content_type': 'text', 'parts': [rng.choice(TEXTS)]},
+            'metadata': {'model_slug': rng.choice(MODELS)},
+            'recipient': 'all'
+        }}
+        parent = node_id
+    return {'id': f'conv-{index}', 'title': f'Conversation {index}', 'create_time': create_time,
+            'update_time': create_time + 600, 'mapping': mapping, 'current_node': parent, 'is_archived': False}
+
+
+def write_export(path, conversations):
+    path.write_text(json.dumps(conversations, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def raw_conversations():
+    rng = random.Random(2)
+    return [raw_conversation(rng, index) for index in range(40)]
+
+
+@pytest.fixture
+def export_path(tmp_path, raw_conversations):
+    return write_export(tmp_path / 'conversations.json', raw_conversations)
+
+
+def as_json(data):
+    return json.dumps(data, default=encode_record)
+
+
+def test_workers_match_sequential_analysis(encodings, export_path, monkeypatch):
+    sequential = process_conversations(export_path, text_engine='fast')
+    # Petits lots : chaque processus en analyse plusieurs
+    monkeypatch.setattr(data_processor, 'iter_shards',
+                        functools.partial(data_processor.iter_shards, shard_messages=5))
+    sharded = process_conversations(export_path, text_engine='fast', workers=2)
+
+    assert len(sequential) == 40
+    assert as_json(sharded) == as_json(sequential)
+
+
+def previous_entry(conversation, text_engine='fast', token_count=1000):
+    """Entrée structurée d'une analyse précédente de `conversation`, avec un message de gpt-4o."""
+    return {
+        'id': conversation['id'],
+        'title': conversation['title'],
+        'fingerprint': conversation_fingerprint(conversation, text_engine),
+        'messages': [{'role': 'user', 'model_slug': 'gpt-4o', 'content_type': 'text',
+                      'additional_info': {'token_count': token_count}, 'cost': 0.0}],
+        'totalCost': 0.0
+    }
+
+
+def test_find_previous_entry_reprices_unchanged_conversations(raw_conversations, price_data):
+    conversation = raw_conversations[0]
+    previous = {conversation['id']: previous_entry(conversation)}
+    prices = {**price_data, 'models': {**price_data['models'], 'gpt-4o': {'input': 5.0, 'output': 20.0}}}
+
+    entry = find_previous_entry(conversation, previous, prices, 'fast')
+    assert entry is previous[conversation['id']]
+    assert entry['messages'][0]['cost'] == pytest.approx(1000 / 1_000_000 * 5.0)
+    assert entry['totalCost'] == round(entry['messages'][0]['cost'], 6)
+
+
+def test_find_previous_entry_rejects_changed_conversations(raw_conversations, price_data):
+    conversation = raw_conversations[0]
+    previous = {conversation['id']: previous_entry(conversation)}
+
+    # Autre moteur de texte : les comptes de mots et phrases ne sont pas les mêmes
+    assert find_previous_entry(conversation, previous, price_data, 'nltk') is None
+    assert find_previous_entry(raw_conversations[1], previous, price_data, 'fast') is None
+    assert find_previous_entry({**conversation, 'update_time': 0}, previous, price_data, 'fast') is None
+    assert find_previous_entry(conversation, None, price_data, 'fast') is None
+
+
+def test_load_previous_entries_skips_entries_without_texts(tmp_path, raw_conversations):
+    full, metadata, old = (previous_entry(conversation) for conversation in raw_conversations[:3])
+    metadata['detail_level'] = 'metadata'
+    del old['fingerprint']
+    path = str(tmp_path / 'previous.jsonl')
+    save_structured_data([full, metadata, old], path, structured_format='jsonl')
+
+    assert list(load_previous_entries(path)) == [full['id']]
+    assert list(load_previous_entries(path, 'metadata')) == [full['id'], metadata['id']]
+
+
+def test_previous_analysis_is_reused(encodings, tmp_path, raw_conversations, export_path):
+    first = process_conversations(export_path, text_engine='fast')
+    # Titre qu'une réanalyse ne retrouverait pas : l'entrée a bien été reprise
+    first[0]['title'] = 'Reprise'
+    previous_path = str(tmp_path / 'previous.jsonl')
+    save_structured_data(first, previous_path, structured_format='jsonl')
+    assert as_json(process_conversations(export_path, text_engine='fast', previous_file_path=previous_path)) == \
+        as_json(read_structured(previous_path))
+
+    # Conversation modifiée depuis l'analyse précédente : elle seule est réanalysée
+    changed = raw_conversations[3]
+    changed['update_time'] += 60
+    changed['title'] = 'Modifiée'
+    export_path = write_export(tmp_path / 'conversations-2.json', raw_conversations)
+    result = process_conversations(export_path, text_engine='fast', previous_file_path=previous_path)
+
+    assert [result[index]['title'] for index in (0, 2, 3)] == ['Reprise', 'Conversation 2', 'Modifiée']
+    assert as_json(result[1:]) == as_json(process_conversations(export_path, text_engine='fast')[1:])
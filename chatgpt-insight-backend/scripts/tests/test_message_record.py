@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from message_record import FIELD_NAMES, FLAG_NAMES, MessageRecord, encode_record
+
+
+def make_record():
+    record = MessageRecord('conv-1', 'msg-1')
+    record['role'] = 'assistant'
+    record['model_slug'] = 'gpt-4o'
+    record['content_type'] = 'text'
+    record['message_type'] = 'text'
+    record.contains_images = True
+    record.is_audio = True
+    record['create_time'] = 1672531200.5
+    record['additional_info'] = {'text': 'déjà', 'token_count': 3}
+    return record
+
+
+def test_json_shape_without_cost():
+    record = make_record()
+    data = json.loads(json.dumps([record], default=encode_record))[0]
+
+    assert list(data) == [name for name in FIELD_NAMES if name != 'cost']
+    assert data['conversation_id'] == 'conv-1'
+    assert data['tool_name'] is None
+    assert {name: data[name] for name in FLAG_NAMES} == {
+        name: name in ('contains_images', 'is_audio') for name in FLAG_NAMES
+    }
+    assert data['additional_info'] == {'text': 'déjà', 'token_count': 3}
+
+
+def test_json_shape_with_cost_matches_dict():
+    record = make_record()
+    record['cost'] = 1.5e-05
+
+    assert list(record) == list(FIELD_NAMES)
+    assert dict(record) == record.to_dict()
+    assert json.dumps(record, default=encode_record, ensure_ascii=False) == \
+        json.dumps(record.to_dict(), ensure_ascii=False)
+
+
+def test_mapping_access():
+    record = make_record()
+
+    assert record['contains_images'] is True
+    assert record.get('contains_files') is False
+    assert 'cost' not in record and len(record) == len(FIELD_NAMES) - 1
+    assert record.get('cost') is None
+    with pytest.raises(KeyError):
+        record['text']
+    with pytest.raises(KeyError):
+        record['text'] = 'champ inconnu'
+
+    record['cost'] = 0.0
+    del record['cost']
+    assert 'cost' not in record
+    with pytest.raises(KeyError):
+        del record['role']
+
+
+def test_flags_can_be_cleared():
+    record = make_record()
+    record.contains_images = False
+    assert record.to_dict()['contains_images'] is False
+    assert record.to_dict()['is_audio'] is True
+
+
+def test_encode_record_rejects_other_objects():
+    with pytest.raises(TypeError):
+        json.dumps({'value': object()}, default=encode_record)
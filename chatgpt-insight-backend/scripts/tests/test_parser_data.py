@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from parser_data import ConversationParseError, ConversationStream, parse_conversations
+
+# Littéraux, échappements et caractères multi-octets qui tombent sur des limites de blocs
+CONVERSATIONS = [
+    {'id': 'a', 'title': 'Résumé 🌞', 'is_archived': True, 'create_time': 1672531200.25,
+     'mapping': {'n1': {'message': None, 'children': ['n2']}}},
+    {'id': 'b', 'title': 'quote " and \\ backslash', 'is_archived': False, 'create_time': None,
+     'mapping': {'n2': {'message': {'content': {'parts': ['déjà…', 'é中']}}}}},
+    {'id': 'c', 'title': '', 'mapping': {}, 'values': [1, -2.5e-3, 0, True, False, None]},
+]
+
+
+def write_export(tmp_path, text, name='conversations.json'):
+    path = tmp_path / name
+    path.write_bytes(text.encode('utf-8'))
+    return str(path)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64, 1 << 20])
+@pytest.mark.parametrize('ensure_ascii', [False, True])
+def test_stream_matches_json_load_at_any_chunk_size(tmp_path, chunk_size, ensure_ascii):
+    text = json.dumps(CONVERSATIONS, ensure_ascii=ensure_ascii, indent=1)
+    stream = ConversationStream(write_export(tmp_path, text), chunk_size=chunk_size)
+
+    assert list(stream) == CONVERSATIONS
+    assert stream.bytes_consumed == stream.total_bytes
+
+
+@pytest.mark.parametrize('text', ['[]', ' \n[ \n] \n'])
+def test_empty_array(tmp_path, text):
+    assert list(ConversationStream(write_export(tmp_path, text), chunk_size=2)) == []
+
+
+def test_truncated_file_raises_at_every_cut(tmp_path):
+    text = json.dumps(CONVERSATIONS, ensure_ascii=False)
+    data = text.encode('utf-8')
+    for cut in range(len(data)):
+        path = tmp_path / f'truncated-{cut}.json'
+        # Coupure éventuelle au milieu d'un caractère multi-octets
+        path.write_bytes(data[:cut])
+        with pytest.raises(ConversationParseError):
+            list(ConversationStream(str(path), chunk_size=3))
+
+
+def test_error_offsets_are_in_bytes(tmp_path):
+    text = '[{"title": "é"} {"title": "b"}]'
+    with pytest.raises(ConversationParseError) as error:
+        list(ConversationStream(write_export(tmp_path, text), chunk_size=4))
+    assert error.value.offset == len('[{"title": "é"} '.encode('utf-8'))
+
+
+def test_invalid_utf8(tmp_path):
+    path = tmp_path / 'latin1.json'
+    path.write_bytes('[{"title": "é"}]'.encode('latin-1'))
+    with pytest.raises(ConversationParseError) as error:
+        list(ConversationStream(str(path), chunk_size=2))
+    assert error.value.offset == len('[{"title": "')
+
+
+def test_stream_rejects_top_level_object(tmp_path):
+    with pytest.raises(ConversationParseError):
+        list(ConversationStream(write_export(tmp_path, '{"id": "a"}')))
+
+
+@pytest.mark.parametrize('stream', [True, False])
+@pytest.mark.parametrize('text', ['', '[{"id": "a"}] trailing', '[{"id": "a"},]'])
+def test_invalid_files_raise_parse_error(tmp_path, text, stream):
+    with pytest.raises(ConversationParseError):
+        list(parse_conversations(write_export(tmp_path, text), stream=stream))
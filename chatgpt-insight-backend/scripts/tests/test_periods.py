@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from periods import PERIODS, PeriodBucketer
+
+TIMEZONES = [None, 'UTC', 'Europe/Paris', 'America/New_York', 'Asia/Kolkata', 'Australia/Lord_Howe']
+# Changements d'heure de Paris (fin mars, fin octobre), fin d'année et années bissextiles
+DATES = ['2023-03-26 00:59:59', '2023-03-26 01:00:00', '2023-10-29 00:30:00', '2023-10-29 01:00:00',
+         '2023-12-31 22:59:59.5', '2023-12-31 23:00:00', '2024-02-29 12:00:00', '2020-12-31 23:30:00']
+
+
+def strftime_key(value, period):
+    """Clé de période calculée avec datetime, comme avant les identifiants entiers."""
+    if period == 'hourly':
+        return value.strftime('%Y-%m-%d %H:00')
+    if period == 'daily':
+        return value.strftime('%Y-%m-%d')
+    if period == 'weekly':
+        return value.strftime('%Y-%U')
+    if period == 'monthly':
+        return value.strftime('%Y-%m')
+    if period == 'quarterly':
+        return f"{value.year}-Q{(value.month - 1) // 3 + 1}"
+    if period == 'semi-annually':
+        return f"{value.year}-H{(value.month - 1) // 6 + 1}"
+    return value.strftime('%Y')
+
+
+def local_datetime(timestamp, timezone):
+    if timezone is None:
+        return datetime.fromtimestamp(timestamp)
+    return datetime.fromtimestamp(timestamp, ZoneInfo(timezone)).replace(tzinfo=None)
+
+
+@pytest.fixture
+def timestamps():
+    rng = random.Random(4)
+    values = [datetime.fromisoformat(value).replace(tzinfo=ZoneInfo('UTC')).timestamp() for value in DATES]
+    values += [rng.uniform(946684800, 1798761600) for _ in range(2000)]
+    return values
+
+
+@pytest.mark.parametrize('timezone', TIMEZONES)
+def test_bucket_ids_match_datetime(timestamps, timezone):
+    bucketer = PeriodBucketer(timezone)
+    for timestamp in timestamps:
+        value = local_datetime(timestamp, timezone)
+        ids = bucketer.bucket_ids(timestamp, PERIODS)
+        for period in PERIODS:
+            assert bucketer.format_key(period, ids[period]) == strftime_key(value, period), (timestamp, period)
+
+
+@pytest.mark.parametrize('timezone', TIMEZONES)
+def test_ids_are_in_chronological_order(timestamps, timezone):
+    bucketer = PeriodBucketer(timezone)
+    timestamps = sorted(timestamps)
+    for period in PERIODS:
+        ids = [bucketer.bucket_id(timestamp, period) for timestamp in timestamps]
+        assert ids == sorted(ids), period
+
+
+@pytest.mark.parametrize('timezone', ['Europe/Paris', 'Australia/Lord_Howe'])
+def test_bucket_id_array_matches_bucket_id(timestamps, timezone):
+    np = pytest.importorskip('numpy')
+    bucketer = PeriodBucketer(timezone)
+    values = np.array(timestamps, dtype=np.float64)
+    for period in PERIODS:
+        assert bucketer.bucket_id_array(values, period).tolist() == \
+            [bucketer.bucket_id(timestamp, period) for timestamp in timestamps], period
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        PeriodBucketer('Mars/Olympus_Mons')
+    with pytest.raises(ValueError):
+        PeriodBucketer('UTC').bucket_id(0, 'fortnightly')
@@ -0,0 +1,67 @@
+import pytest
+
+from pricing import FALLBACK_PRICES, PriceTable, get_price_table, normalize_model_name
+
+
+@pytest.mark.parametrize('name, normalized', [
+    ('gpt-4o-mini', '4o-mini'),
+    ('4o mini', '4o-mini'),
+    ('GPT-4o-mini-2024-07-18', '4o-mini'),
+    ('o1_preview', 'o1-preview'),
+    ('claude-3.5-sonnet', 'claude-3.5-sonnet'),
+])
+def test_normalize_model_name(name, normalized):
+    assert normalize_model_name(name) == normalized
+
+
+@pytest.mark.parametrize('slug, key', [
+    ('gpt-4o', 'gpt-4o'),
+    ('gpt-4o-mini', '4o mini'),
+    ('gpt-4o-mini-2024-07-18', '4o mini'),
+    ('o1-preview', 'o1 preview'),
+    ('o1-mini', 'o1 mini'),
+    ('o1', 'o1'),
+    ('Claude 3.5 Sonnet', 'claude-3.5-sonnet'),
+])
+def test_export_slugs_resolve_to_price_keys(price_data, slug, key):
+    assert PriceTable(price_data).resolve(slug) == key
+
+
+@pytest.mark.parametrize('slug', ['unknown-model', 'gpt-4', None])
+def test_unknown_models_use_the_default_model(price_data, slug):
+    prices = PriceTable(price_data)
+
+    assert prices.resolve(slug) == price_data['default_model']
+    assert prices.price(slug, 'output') == prices.price(price_data['default_model'], 'output')
+
+
+def test_declared_aliases(price_data):
+    prices = PriceTable({**price_data, 'aliases': {'gpt-4o-latest': 'gpt-4o', 'chatgpt': 'absent'}})
+
+    assert prices.resolve('chatgpt-4o-latest') == 'gpt-4o'
+    # Un alias vers un modèle absent des prix est ignoré
+    assert prices.resolve_known('chatgpt') is None
+
+
+def test_audio_and_fallback_prices(price_data):
+    prices = PriceTable(price_data)
+
+    assert prices.price('gpt-4o-audio-preview', 'input', 'audio') == 100.0
+    # Pas de prix texte pour ce modèle : prix de repli
+    assert prices.price('gpt-4o-audio-preview', 'input', 'text') == FALLBACK_PRICES['input']
+    # Pas de prix audio : prix texte
+    assert prices.price('gpt-4o', 'output', 'audio') == prices.price('gpt-4o', 'output') == 10.0
+    assert prices.token_cost('4o mini', 'input', 'text', 2_000_000) == pytest.approx(0.30)
+
+
+def test_default_model_missing_from_prices():
+    prices = PriceTable({'models': {'o1': {'input': 15.0, 'output': 60.0}}, 'default_model': 'gpt-4o'})
+
+    assert prices.resolve('unknown-model') == 'gpt-4o'
+    assert prices.price('unknown-model', 'input') == FALLBACK_PRICES['input']
+
+
+def test_fingerprint_and_shared_tables(price_data):
+    assert PriceTable(dict(price_data)).fingerprint == PriceTable(price_data).fingerprint
+    assert PriceTable({**price_data, 'default_model': 'o1'}).fingerprint != PriceTable(price_data).fingerprint
+    assert get_price_table(price_data) is get_price_table(price_data)
@@ -0,0 +1,75 @@
+import math
+import pickle
+
+import pytest
+
+from stats_factory import StatFactory, StatsEngine
+
+OPTIONS = dict(start_date='2023-02-01', end_date='2023-05-01', text_engine='fast', timezone='Europe/Paris')
+STATS = [(name, period) for period in ('hourly', 'weekly', 'quarterly')
+         for name in ('token_stats_over_time', 'cost_stats_over_time', 'message_stats_over_time')]
+STATS += [(name, 'monthly') for name in ('cost_stats_combined_over_time', 'time_series_cube', 'text_stats',
+                                         'global_stats')]
+
+
+def assert_close(actual, expected, path=''):
+    """Mêmes clés, dans le même ordre, et mêmes valeurs aux arrondis des sommes de flottants près."""
+    if isinstance(expected, dict):
+        assert list(actual) == list(expected), path
+        for key in expected:
+            assert_close(actual[key], expected[key], f'{path}/{key}')
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected), path
+        for index, (actual_value, expected_value) in enumerate(zip(actual, expected)):
+            assert_close(actual_value, expected_value, f'{path}/{index}')
+    elif isinstance(expected, float):
+        assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-9), path
+    else:
+        assert actual == expected, path
+
+
+@pytest.mark.parametrize('time_attribution', ['conversation', 'message'])
+@pytest.mark.parametrize('stat_name, period', STATS)
+def test_merged_shards_match_a_single_pass(conversations, price_data, stat_name, period, time_attribution):
+    options = dict(OPTIONS, period=period, time_attribution=time_attribution)
+    engine = StatsEngine(conversations, columnar=False)
+    engine.register('stat', StatFactory.get_stat(stat_name, conversations, price_data=price_data, **options))
+    expected = engine.run()['stat']
+
+    accumulators = []
+    for shard in (conversations[:30], conversations[30:31], [], conversations[31:]):
+        accumulator = StatFactory.get_accumulator(stat_name, price_data, **options)
+        for conversation in shard:
+            accumulator.add_conversation(conversation)
+        # L'état est envoyé entre processus
+        accumulators.append(pickle.loads(pickle.dumps(accumulator)))
+    merged = accumulators[0]
+    for accumulator in accumulators[1:]:
+        merged = merged.merge(accumulator)
+
+    assert_close(merged.finalize(), expected)
+
+
+@pytest.mark.parametrize('stat_name', ['cost_stats_over_time', 'time_series_cube', 'global_stats'])
+def test_merge_refuses_different_prices(price_data, stat_name):
+    other_prices = {**price_data, 'default_model': 'o1'}
+    accumulator = StatFactory.get_accumulator(stat_name, price_data, **OPTIONS)
+
+    with pytest.raises(ValueError):
+        accumulator.merge(StatFactory.get_accumulator(stat_name, other_prices, **OPTIONS))
+    # Une copie des mêmes prix se fusionne
+    accumulator.merge(StatFactory.get_accumulator(stat_name, dict(price_data), **OPTIONS))
+
+
+@pytest.mark.parametrize('stat_name', ['text_stats', 'global_stats'])
+def test_merge_refuses_different_text_engines(price_data, stat_name):
+    accumulator = StatFactory.get_accumulator(stat_name, price_data, **OPTIONS)
+
+    with pytest.raises(ValueError):
+        accumulator.merge(StatFactory.get_accumulator(stat_name, price_data, **dict(OPTIONS, text_engine='nltk')))
+
+
+def test_merge_refuses_other_statistics():
+    with pytest.raises(TypeError):
+        StatFactory.get_accumulator('token_stats_over_time', **OPTIONS).merge(
+            StatFactory.get_accumulator('message_stats_over_time', **OPTIONS))
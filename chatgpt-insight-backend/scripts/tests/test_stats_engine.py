@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from stats_factory import StatFactory, StatsEngine
+
+pytest.importorskip('numpy')
+
+PERIODS = ('hourly', 'daily', 'weekly', 'monthly', 'quarterly', 'semi-annually', 'yearly')
+
+
+def run_engine(data, price_data, columnar, time_attribution):
+    engine = StatsEngine(data, columnar=columnar)
+    options = dict(start_date='2023-02-01', end_date='2023-05-01', text_engine='fast',
+                   time_attribution=time_attribution, timezone='Europe/Paris')
+    for period in PERIODS:
+        for stat_name in ('token_stats_over_time', 'cost_stats_over_time', 'message_stats_over_time'):
+            engine.register((stat_name, period),
+                            StatFactory.get_stat(stat_name, data, price_data=price_data, period=period, **options))
+    for stat_name in ('cost_stats_combined_over_time', 'time_series_cube', 'text_stats', 'global_stats'):
+        engine.register(stat_name, StatFactory.get_stat(stat_name, data, price_data=price_data, **options))
+    results = engine.run()
+    assert not engine.errors
+    return results
+
+
+@pytest.mark.parametrize('time_attribution', ['conversation', 'message'])
+def test_columnar_matches_rows(conversations, price_data, time_attribution):
+    rows = run_engine(conversations, price_data, False, time_attribution)
+    columnar = run_engine(conversations, price_data, True, time_attribution)
+
+    assert list(columnar) == list(rows)
+    for name in rows:
+        # Même JSON : mêmes clés, dans le même ordre, et mêmes valeurs
+        assert json.dumps(columnar[name]) == json.dumps(rows[name]), name
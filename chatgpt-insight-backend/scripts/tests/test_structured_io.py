@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from message_record import MessageRecord, encode_record
+from structured_io import (INDEXED_FORMATS, STRUCTURED_FORMATS, StructuredFile, StructuredIndex, conversation_summary,
+                           detect_format, read_structured, structured_index_path, write_structured)
+
+OPTIONAL_MODULES = {'msgpack': 'msgpack', 'zst': 'zstandard'}
+
+
+def require_format(structured_format):
+    """Saute le test si le format demande un paquet optionnel absent."""
+    for part in structured_format.split('.'):
+        if part in OPTIONAL_MODULES:
+            pytest.importorskip(OPTIONAL_MODULES[part])
+
+
+def as_json(conversations):
+    return json.loads(json.dumps(conversations, default=encode_record))
+
+
+@pytest.fixture
+def structured(conversations):
+    # Un message sous forme de MessageRecord, comme à la sortie de data_processor
+    record = MessageRecord('conv-0', 'conv-0-record')
+    record['role'] = 'assistant'
+    record['additional_info'] = {'text': 'déjà 🌞', 'token_count': 2}
+    record['cost'] = 1.5e-05
+    conversations[0]['messages'].append(record)
+    return conversations
+
+
+@pytest.mark.parametrize('structured_format', STRUCTURED_FORMATS)
+def test_round_trip(tmp_path, structured, structured_format):
+    require_format(structured_format)
+    path = str(tmp_path / 'structured.out')
+    write_structured(iter(structured), path, structured_format)
+
+    expected = 'json' if structured_format == 'pretty' else structured_format
+    assert detect_format(path) == expected
+    assert read_structured(path) == as_json(structured)
+
+
+def test_json_matches_json_dumps(tmp_path, structured):
+    path = tmp_path / 'structured.json'
+    write_structured(iter(structured), str(path))
+
+    assert path.read_text(encoding='utf-8') == json.dumps(
+        structured, ensure_ascii=False, separators=(',', ':'), default=encode_record)
+
+
+@pytest.mark.parametrize('structured_format', ['json', 'jsonl', 'jsonl.gz', 'msgpack'])
+def test_empty(tmp_path, structured_format):
+    require_format(structured_format)
+    path = str(tmp_path / 'structured.out')
+    write_structured([], path, structured_format)
+
+    assert read_structured(path) == []
+
+
+def test_structured_file_can_be_read_twice(tmp_path, structured):
+    path = str(tmp_path / 'structured.jsonl.gz')
+    write_structured(structured, path, 'jsonl.gz')
+    conversations = StructuredFile(path)
+
+    assert list(conversations) == list(conversations) == as_json(structured)
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        write_structured([], str(tmp_path / 'structured.out'), 'csv')
+
+
+@pytest.mark.parametrize('structured_format', INDEXED_FORMATS)
+def test_index_reads_each_conversation_at_its_offset(tmp_path, structured, structured_format):
+    require_format(structured_format)
+    path = str(tmp_path / 'structured.out')
+    index_path = structured_index_path(path)
+    write_structured(iter(structured), path, structured_format, index_path)
+    unindexed_path = str(tmp_path / 'unindexed.out')
+    write_structured(iter(structured), unindexed_path, structured_format)
+
+    with open(path, 'rb') as indexed, open(unindexed_path, 'rb') as unindexed:
+        assert indexed.read() == unindexed.read()
+    index = StructuredIndex(index_path)
+    expected = as_json(structured)
+    assert len(index) == len(expected)
+    assert index.summaries() == [conversation_summary(conversation) for conversation in expected]
+    assert index.summaries(10, 5) == index.summaries()[10:15]
+    for conversation in reversed(expected):
+        assert index.read_conversation(conversation['id']) == conversation
+    with pytest.raises(KeyError):
+        index.read_conversation('absente')
+
+
+def test_index_of_a_moved_structured_file(tmp_path, structured):
+    path = tmp_path / 'structured.jsonl'
+    index_path = str(tmp_path / 'index.json')
+    write_structured(structured, str(path), 'jsonl', index_path)
+    moved = tmp_path / 'moved.jsonl'
+    path.rename(moved)
+
+    index = StructuredIndex(index_path, str(moved))
+    assert index.read_conversation('conv-5') == as_json(structured)[5]
+
+
+def test_index_is_refused_for_compressed_and_pretty_formats(tmp_path):
+    for structured_format in ('pretty', 'jsonl.gz'):
+        with pytest.raises(ValueError):
+            write_structured([], str(tmp_path / 'structured.out'), structured_format, str(tmp_path / 'index.json'))
+
+
+def test_index_version(tmp_path):
+    index_path = tmp_path / 'index.json'
+    index_path.write_text(json.dumps({'version': 0, 'format': 'json', 'structured_file': 'x', 'conversations': []}))
+    with pytest.raises(ValueError):
+        StructuredIndex(str(index_path))
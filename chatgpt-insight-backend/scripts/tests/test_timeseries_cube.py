@@ -0,0 +1,87 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from periods import EPOCH
+from timeseries_cube import CUBE_DIMENSIONS, CUBE_MEASURES, TimeSeriesCube, build_cube
+
+START = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def cells():
+    """Cellules {(heure, modèle, rôle, type): [tokens, coût, messages, images]} sur deux semaines."""
+    rng = random.Random(3)
+    first_hour = int((START - EPOCH).total_seconds() // 3600)
+    cells = {}
+    for _ in range(400):
+        key = (first_hour + rng.randrange(14 * 24), rng.choice(['gpt-4o', 'o1', None]),
+               rng.choice(['user', 'assistant', 'tool']), rng.choice(['text', 'audio']))
+        cells[key] = [rng.randrange(1000), rng.random(), rng.randint(1, 5), rng.randint(0, 2)]
+    return cells
+
+
+def brute_force(cells, first, last, by=None):
+    """Sommes directes des cellules dont l'heure est dans [first, last[."""
+    results = {}
+    for (hour, *values), measures in cells.items():
+        if first <= hour < last:
+            key = values[CUBE_DIMENSIONS.index(by)] if by else None
+            totals = results.setdefault(key, [0, 0.0, 0, 0])
+            for offset, value in enumerate(measures):
+                totals[offset] += value
+    return {key: dict(zip(CUBE_MEASURES, totals)) for key, totals in results.items()}
+
+
+def assert_measures_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for measure in ('tokens', 'messages', 'images'):
+        assert actual[measure] == expected[measure], measure
+    assert math.isclose(actual['cost'], expected['cost'], rel_tol=1e-9, abs_tol=1e-12)
+
+
+def hour_id(value):
+    return int((value - EPOCH).total_seconds() // 3600)
+
+
+@pytest.mark.parametrize('by', [None, *CUBE_DIMENSIONS])
+def test_query_matches_brute_force(cells, by):
+    cube = TimeSeriesCube(build_cube(cells, timezone='Europe/Paris'))
+    rng = random.Random(5)
+    ranges = [(None, None), (START, None), (None, START + timedelta(days=3)),
+              (START + timedelta(days=20), START + timedelta(days=30)),
+              (START + timedelta(days=2), START + timedelta(days=2))]
+    for _ in range(50):
+        start = START + timedelta(hours=rng.randrange(-24, 15 * 24))
+        ranges.append((start, start + timedelta(hours=rng.randrange(0, 200))))
+
+    for start, end in ranges:
+        first = hour_id(start) if start else -math.inf
+        last = hour_id(end) if end else math.inf
+        expected = brute_force(cells, first, last, by)
+        result = cube.query(start, end, by=by)
+        if by is None:
+            assert_measures_equal(result, expected.get(None, dict(zip(CUBE_MEASURES, (0, 0.0, 0, 0)))))
+        else:
+            assert result.keys() == expected.keys()
+            for key in expected:
+                assert_measures_equal(result[key], expected[key])
+
+
+def test_query_accepts_iso_strings_and_rounds_up_to_the_hour(cells):
+    cube = TimeSeriesCube(build_cube(cells))
+    # Une heure est retenue si son début est dans la plage : 10:30 commence à 11:00
+    assert cube.query('2024-03-02T10:30', '2024-03-04') == cube.query(
+        datetime(2024, 3, 2, 11), datetime(2024, 3, 4))
+
+
+def test_query_rejects_unknown_dimension(cells):
+    with pytest.raises(ValueError):
+        TimeSeriesCube(build_cube(cells)).query(by='conversation')
+
+
+def test_unsupported_version():
+    with pytest.raises(ValueError):
+        TimeSeriesCube({'version': 0})
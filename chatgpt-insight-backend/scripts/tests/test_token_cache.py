@@ -0,0 +1,76 @@
+from token_cache import TokenCountCache, text_digest
+
+ENCODING = 'o200k_base'
+
+
+def digests(*texts):
+    return [text_digest(text) for text in texts]
+
+
+def test_memory_cache_is_lru():
+    cache = TokenCountCache(path='', memory_entries=2)
+    a, b, c = digests('a', 'b', 'c')
+    cache.put_many(ENCODING, [(a, 1), (b, 2)])
+    # 'a' est relu : 'b' devient le moins récemment utilisé
+    assert cache.get_many(ENCODING, [a]) == [1]
+    cache.put_many(ENCODING, [(c, 3)])
+
+    assert cache.get_many(ENCODING, [a, b, c]) == [1, None, 3]
+    assert cache.stats() == {'memory_hits': 3, 'disk_hits': 0, 'misses': 1}
+
+
+def test_keys_include_the_encoding():
+    cache = TokenCountCache(path='')
+    (digest,) = digests('déjà vu')
+    cache.put_many(ENCODING, [(digest, 4)])
+
+    assert cache.get_many('cl100k_base', [digest]) == [None]
+    assert cache.get_many(ENCODING, [digest]) == [4]
+
+
+def test_in_memory_by_default_without_path(tmp_path):
+    cache = TokenCountCache(path='')
+    cache.put_many(ENCODING, [(text_digest('a'), 1)])
+
+    assert cache.evict() == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_counts_persist_across_instances(tmp_path):
+    path = str(tmp_path / 'cache' / 'token_counts.sqlite')
+    texts = [f'message {index}' for index in range(1200)]
+    items = [(text_digest(text), len(text)) for text in texts]
+    TokenCountCache(path=path).put_many(ENCODING, items)
+
+    cache = TokenCountCache(path=path)
+    # Plus de paramètres que la limite d'une requête SQLite
+    assert cache.get_many(ENCODING, [digest for digest, _ in items]) == [count for _, count in items]
+    assert cache.stats() == {'memory_hits': 0, 'disk_hits': len(items), 'misses': 0}
+    # Les comptes relus sur disque sont ensuite servis par la mémoire
+    assert cache.get_many(ENCODING, [items[0][0]]) == [items[0][1]]
+    assert cache.memory_hits == 1
+
+
+def test_evict_keeps_the_most_recently_used(tmp_path):
+    path = str(tmp_path / 'token_counts.sqlite')
+    cache = TokenCountCache(path=path, max_entries=2)
+    a, b, c = digests('a', 'b', 'c')
+    cache.put_many(ENCODING, [(a, 1), (b, 2), (c, 3)])
+    connection = cache._connect()
+    with connection:
+        connection.execute("UPDATE token_counts SET last_used = 0 WHERE digest = ?", (b,))
+
+    assert cache.evict() == 1
+    assert cache.evict() == 0
+    assert TokenCountCache(path=path).get_many(ENCODING, [a, b, c]) == [1, None, 3]
+
+
+def test_unusable_path_falls_back_to_memory(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    cache = TokenCountCache(path=str(blocker / 'token_counts.sqlite'))
+    (digest,) = digests('a')
+    cache.put_many(ENCODING, [(digest, 1)])
+
+    assert cache.path is None
+    assert cache.get_many(ENCODING, [digest]) == [1]
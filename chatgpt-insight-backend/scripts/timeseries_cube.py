@@ -0,0 +1,201 @@
+"""
+Cube de séries temporelles : agrégats horaires pré-calculés pour les requêtes par plage de dates.
+
+L'analyse (statistique 'time_series_cube' de stats_factory, option --cube_output_file de
+run_script) produit une cellule par (heure, modèle, rôle, type de contenu) avec le nombre de
+tokens, le coût (tokens et images), le nombre de messages et d'images. Les heures sont les
+identifiants 'hourly' de periods (heures locales écoulées depuis l'epoch) dans le fuseau de
+l'analyse : seules les heures où il y a des messages sont présentes.
+
+TimeSeriesCube répond ensuite à n'importe quelle plage de dates, ou la découpe en périodes
+plus larges, sans relancer l'analyse : les sommes préfixes de chaque groupe (modèle, rôle,
+type) le long de ses heures ramènent une plage à deux recherches dichotomiques et une
+soustraction par groupe, quelle que soit sa longueur. Les coûts ainsi sommés sont égaux à
+ceux des statistiques à l'arrondi flottant près.
+
+Format du fichier (JSON compact) :
+  {"version": 1, "period": "hourly", "timezone": ..., "time_attribution": ...,
+   "measures": ["tokens", "cost", "messages", "images"],
+   "dimensions": {"model": [...], "role": [...], "content_type": [...]},
+   "groups": [[modèle, rôle, type], ...],      (indices dans dimensions)
+   "hours": [heure, ...],                      (croissantes)
+   "cells": [[indice d'heure, indice de groupe, tokens, coût, messages, images], ...]}
+"""
+
+import json
+import math
+from bisect import bisect_left
+from datetime import datetime
+from periods import EPOCH, PERIODS, get_bucketer
+
+CUBE_VERSION = 1
+CUBE_MEASURES = ('tokens', 'cost', 'messages', 'images')
+CUBE_DIMENSIONS = ('model', 'role', 'content_type')
+
+
+def build_cube(cells, timezone=None, time_attribution='conversation'):
+    """
+    Dictionnaire du cube (format ci-dessus) à partir de `cells` :
+    {(heure, modèle, rôle, type de contenu): [tokens, coût, messages, images]}.
+    Valeurs de dimension et groupes sont numérotés dans l'ordre de `cells`.
+    """
+    dimensions = {dimension: {} for dimension in CUBE_DIMENSIONS}
+    groups = {}
+    hours = sorted({key[0] for key in cells})
+    hour_indexes = {hour: index for index, hour in enumerate(hours)}
+    rows = []
+    for (hour, *values), measures in cells.items():
+        group = tuple(
+            dimensions[dimension].setdefault(value, len(dimensions[dimension]))
+            for dimension, value in zip(CUBE_DIMENSIONS, values)
+        )
+        rows.append([hour_indexes[hour], groups.setdefault(group, len(groups)), *measures])
+    rows.sort(key=lambda row: (row[0], row[1]))
+    return {
+        'version': CUBE_VERSION,
+        'period': 'hourly',
+        'timezone': timezone,
+        'time_attribution': time_attribution,
+        'measures': list(CUBE_MEASURES),
+        'dimensions': {dimension: list(values) for dimension, values in dimensions.items()},
+        'groups': [list(group) for group in groups],
+        'hours': hours,
+        'cells': rows
+    }
+
+
+def write_cube(cube, cube_file_path):
+    with open(cube_file_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(cube, ensure_ascii=False, separators=(',', ':')))
+
+
+def load_cube(cube_file_path):
+    """TimeSeriesCube d'un fichier écrit par write_cube."""
+    with open(cube_file_path, 'r', encoding='utf-8') as f:
+        return TimeSeriesCube(json.load(f))
+
+
+def local_hour(value):
+    """
+    Identifiant d'heure locale d'une borne de plage : datetime naïf ou chaîne ISO
+    ('2024-03-01', '2024-03-01T14:00'), arrondi à l'heure supérieure.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return math.ceil((value - EPOCH).total_seconds() / 3600)
+
+
+class TimeSeriesCube:
+    """
+    Requêtes sur un cube horaire (dictionnaire de build_cube).
+
+    Les plages [start, end[ sont en heure locale du fuseau de l'analyse (datetime naïfs ou
+    chaînes ISO, None : sans borne) ; une heure est retenue si son début est dans la plage.
+    Les sommes préfixes de chaque groupe sont calculées une fois, à la création, le long des
+    seules heures où le groupe a des messages : leur taille est celle des cellules du cube.
+    """
+    def __init__(self, cube):
+        if cube.get('version') != CUBE_VERSION:
+            raise ValueError(f"Version de cube non prise en charge: {cube.get('version')}")
+        self.cube = cube
+        self.timezone = cube.get('timezone')
+        self.time_attribution = cube.get('time_attribution')
+        self.hours = cube['hours']
+        self.dimensions = cube['dimensions']
+        self.groups = [tuple(group) for group in cube['groups']]
+        # Les heures sont déjà locales : le calendrier ne dépend pas du fuseau
+        self.bucketer = get_bucketer()
+
+        # Par groupe : ses heures (croissantes, les cellules étant triées par heure) et
+        # prefix[i], les sommes de ses mesures sur ses i premières heures
+        self.group_hours = [[] for _ in self.groups]
+        self.group_prefix = [[(0, 0.0, 0, 0)] for _ in self.groups]
+        for hour_index, group_index, *measures in cube['cells']:
+            self.group_hours[group_index].append(self.hours[hour_index])
+            prefix = self.group_prefix[group_index]
+            prefix.append(tuple(total + value for total, value in zip(prefix[-1], measures)))
+
+    def hour_bounds(self, start=None, end=None):
+        """Identifiants d'heure [first, last[ de la plage [start, end[."""
+        first = local_hour(start) if start is not None else (self.hours[0] if self.hours else 0)
+        last = local_hour(end) if end is not None else (self.hours[-1] + 1 if self.hours else 0)
+        return first, max(first, last)
+
+    def group_sums(self, first, last):
+        """Mesures de chaque groupe sur les heures [first, last[ : [[tokens, coût, messages, images], ...]."""
+        sums = []
+        for hours, prefix in zip(self.group_hours, self.group_prefix):
+            after, before = prefix[bisect_left(hours, last)], prefix[bisect_left(hours, first)]
+            sums.append([total - previous for total, previous in zip(after, before)])
+        return sums
+
+    def group_value(self, group, dimension):
+        return self.dimensions[dimension][group[CUBE_DIMENSIONS.index(dimension)]]
+
+    def aggregate(self, first, last, by=None):
+        """Mesures des heures [first, last[ : totales, ou par valeur de la dimension `by`."""
+        if by is not None and by not in CUBE_DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {by} (attendu: {', '.join(CUBE_DIMENSIONS)})")
+        results = {}
+        for group, measures in zip(self.groups, self.group_sums(first, last)):
+            if not measures[2]:
+                continue
+            key = self.group_value(group, by) if by else None
+            totals = results.setdefault(key, [0, 0.0, 0, 0])
+            for offset, value in enumerate(measures):
+                totals[offset] += value
+        named = {key: dict(zip(CUBE_MEASURES, totals)) for key, totals in results.items()}
+        if by is None:
+            return named.get(None, dict(zip(CUBE_MEASURES, (0, 0.0, 0, 0))))
+        return named
+
+    def query(self, start=None, end=None, by=None):
+        """
+        Mesures de la plage [start, end[ ({'tokens', 'cost', 'messages', 'images'}), ou par
+        valeur de la dimension `by` ('model', 'role', 'content_type') pour les valeurs présentes.
+        """
+        return self.aggregate(*self.hour_bounds(start, end), by=by)
+
+    def series(self, period, start=None, end=None, by=None):
+        """Mesures de la plage [start, end[ découpée par `period` (voir periods.PERIODS), dans l'ordre chronologique."""
+        if period not in PERIODS:
+            raise ValueError("Invalid period.")
+        first, last = self.hour_bounds(start, end)
+        results = {}
+        segment_start, segment_bucket = None, None
+        for hour in self.hours[bisect_left(self.hours, first):bisect_left(self.hours, last)]:
+            bucket = self.bucketer.local_bucket_ids(hour * 3600, (period,))[period]
+            if bucket != segment_bucket:
+                if segment_bucket is not None:
+                    results[self.bucketer.format_key(period, segment_bucket)] = self.aggregate(segment_start, hour, by)
+                segment_start, segment_bucket = hour, bucket
+        if segment_bucket is not None:
+            results[self.bucketer.format_key(period, segment_bucket)] = self.aggregate(segment_start, last, by)
+        return results
+
+    def costs_by_model(self, start=None, end=None):
+        """Coûts et tokens par modèle sur la plage [start, end[, comme 'costs_by_model' de cost_stats_combined_over_time."""
+        costs = {}
+        for group, (tokens, cost, messages, _) in zip(self.groups, self.group_sums(*self.hour_bounds(start, end))):
+            if not messages:
+                continue
+            role = self.group_value(group, 'role')
+            model_costs = costs.setdefault(self.group_value(group, 'model'), {
+                "input_cost": 0.0,
+                "output_cost": 0.0,
+                "total_cost": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "total_tokens": 0
+            })
+            # Les coûts d'images des messages non user (système compris) sont des coûts de sortie
+            if role == 'user':
+                model_costs["input_cost"] += cost
+                model_costs["input_tokens"] += tokens
+            else:
+                model_costs["output_cost"] += cost
+                if role in ('assistant', 'tool'):
+                    model_costs["output_tokens"] += tokens
+            model_costs["total_cost"] += cost
+            model_costs["total_tokens"] += tokens
+        return costs
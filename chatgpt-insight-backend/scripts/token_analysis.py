@@ -1,12 +1,14 @@
-import tiktoken
+from config import TOKENIZER_THREADS
+from token_cache import TokenCountCache, text_digest
 from collections import defaultdict
 import re
 
-ENCODINGS = {
-    'o200k_base': tiktoken.get_encoding('o200k_base'),
-    'p50k_base': tiktoken.get_encoding('p50k_base'),
-    'cl100k_base': tiktoken.get_encoding('cl100k_base')
-}
+ENCODING_NAMES = ('o200k_base', 'p50k_base', 'cl100k_base')
+DEFAULT_ENCODING = 'cl100k_base'
+
+# Encodages tiktoken chargés à la première utilisation : un export qui n'utilise que gpt-4o
+# ne paie que le chargement de la table BPE o200k_base
+_encodings = {}
 
 MODEL_ENCODINGS = {
     'gpt-4-browsing': 'o200k_base',
@@ -24,17 +26,61 @@ MODEL_ENCODINGS = {
     'gpt-4': 'cl100k_base'
 }
 
+_token_cache = None
+
+def get_token_cache():
+    """Cache des comptes de tokens partagé par tout le processus (créé au premier usage)."""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCountCache()
+    return _token_cache
+
+def load_encoding(encoding_name):
+    """Retourne l'encodage tiktoken demandé, chargé (avec tiktoken lui-même) au premier appel."""
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        import tiktoken
+        encoding = _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return encoding
+
 def get_encoding(model_slug):
-    return ENCODINGS.get(MODEL_ENCODINGS.get(model_slug, 'cl100k_base'), ENCODINGS['cl100k_base'])
+    encoding_name = MODEL_ENCODINGS.get(model_slug, DEFAULT_ENCODING)
+    return load_encoding(encoding_name if encoding_name in ENCODING_NAMES else DEFAULT_ENCODING)
 
 def count_tokens(text, model_slug):
-    encoding = get_encoding(model_slug)
-    return len(encoding.encode(text, disallowed_special=()))
+    return count_tokens_batch([text], [model_slug])[0]
+
+def count_tokens_batch(texts, model_slugs, num_threads=TOKENIZER_THREADS):
+    """
+    Compte les tokens d'une liste de textes (model_slugs[i] est le modèle de texts[i]).
+    Les textes déjà vus sont lus dans le cache (voir token_cache) ; les autres sont regroupés
+    par encodage et encodés par lots sur plusieurs threads.
+    """
+    indexes_by_encoding = defaultdict(list)
+    for index, model_slug in enumerate(model_slugs):
+        indexes_by_encoding[get_encoding(model_slug)].append(index)
+
+    cache = get_token_cache()
+    counts = [0] * len(texts)
+    for encoding, indexes in indexes_by_encoding.items():
+        digests = [text_digest(texts[index]) for index in indexes]
+        cached = cache.get_many(encoding.name, digests)
+        missing = [position for position, count in enumerate(cached) if count is None]
+
+        # encode_ordinary équivaut à encode(..., disallowed_special=()) : les tokens spéciaux restent du texte
+        encoded = encoding.encode_ordinary_batch([texts[indexes[position]] for position in missing], num_threads=num_threads)
+        for position, tokens in zip(missing, encoded):
+            cached[position] = len(tokens)
+        cache.put_many(encoding.name, [(digests[position], cached[position]) for position in missing])
+
+        for index, count in zip(indexes, cached):
+            counts[index] = count
+    return counts
 
-def analyze_text(content, model_slug):
+def analyze_text(content, model_slug, token_count=None):
     stats = defaultdict(int)
     stats['character_count'] = len(content)
     stats['word_count'] = len(content.split())
     stats['sentence_count'] = len(re.findall(r'[.!?]+', content))
-    stats['token_count'] = count_tokens(content, model_slug)
+    stats['token_count'] = count_tokens(content, model_slug) if token_count is None else token_count
     return stats
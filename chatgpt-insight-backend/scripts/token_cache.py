@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from config import TOKEN_CACHE_PATH, TOKEN_CACHE_MEMORY_ENTRIES, TOKEN_CACHE_MAX_ENTRIES
+
+# Nombre maximal de paramètres par requête SQLite (limite par défaut : 999)
+_SQL_CHUNK = 500
+# Délai d'attente quand un autre processus écrit dans la base
+_BUSY_TIMEOUT = 10.0
+
+
+def text_digest(text):
+    """Empreinte d'un texte utilisée comme clé du cache (blake2b, 16 octets)."""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class TokenCountCache:
+    """
+    Cache des comptes de tokens, indexé par (nom de l'encodage, empreinte du texte).
+
+    Deux niveaux : un LRU en mémoire de `memory_entries` entrées, puis, si `path` est
+    renseigné (désactivé par défaut, voir config.TOKEN_CACHE_PATH), une base SQLite locale
+    (mode WAL) partagée par tous les processus d'analyse, limitée à `max_entries` entrées
+    (les moins récemment utilisées sont supprimées par evict()). Les compteurs hits/misses sont exposés via stats().
+    """
+    def __init__(self, path=TOKEN_CACHE_PATH, memory_entries=TOKEN_CACHE_MEMORY_ENTRIES,
+                 max_entries=TOKEN_CACHE_MAX_ENTRIES, logger=None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.logger = logger
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._connection = None
+        self._connection_pid = None
+
+    def _connect(self):
+        """Ouvre (une fois par processus) la base SQLite, ou retourne None si elle est indisponible."""
+        if not self.path:
+            return None
+        if self._connection is not None and self._connection_pid == os.getpid():
+            return self._connection
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts ("
+                " encoding TEXT NOT NULL, digest BLOB NOT NULL, token_count INTEGER NOT NULL,"
+                " last_used INTEGER NOT NULL, PRIMARY KEY (encoding, digest))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS token_counts_last_used ON token_counts (last_used)")
+            connection.commit()
+        except (OSError, sqlite3.Error) as e:
+            self._disable(e)
+            return None
+        self._connection = connection
+        self._connection_pid = os.getpid()
+        return connection
+
+    def _disable(self, error):
+        # Le cache persistant est une optimisation : en cas d'erreur on continue sans lui
+        if self.logger:
+            self.logger.warning("Cache de tokens persistant désactivé (%s): %s", self.path, error)
+        self.path = None
+        self._connection = None
+
+    def get_many(self, encoding_name, digests):
+        """Retourne la liste des comptes connus pour ces empreintes (None si absent)."""
+        counts = [None] * len(digests)
+        missing = []
+        for index, digest in enumerate(digests):
+            key = (encoding_name, digest)
+            count = self.memory.get(key)
+            if count is None:
+                missing.append(index)
+            else:
+                self.memory.move_to_end(key)
+                counts[index] = count
+                self.memory_hits += 1
+
+        connection = self._connect() if missing else None
+        if connection is not None:
+            found = {}
+            try:
+                for start in range(0, len(missing), _SQL_CHUNK):
+                    chunk = [digests[index] for index in missing[start:start + _SQL_CHUNK]]
+                    rows = connection.execute(
+                        "SELECT digest, token_count FROM token_counts WHERE encoding = ? AND digest IN (%s)"
+                        % ','.join('?' * len(chunk)),
+                        [encoding_name, *chunk]
+                    )
+                    found.update(rows)
+            except sqlite3.Error as e:
+                self._disable(e)
+            if found:
+                self._touch(encoding_name, list(found))
+            for index in missing:
+                count = found.get(digests[index])
+                if count is not None:
+                    counts[index] = count
+                    self._remember(encoding_name, digests[index], count)
+                    self.disk_hits += 1
+
+        self.misses += sum(1 for count in counts if count is None)
+        return counts
+
+    def put_many(self, encoding_name, items):
+        """Enregistre des paires (empreinte, compte) dans les deux niveaux du cache."""
+        for digest, count in items:
+            self._remember(encoding_name, digest, count)
+        connection = self._connect()
+        if connection is None or not items:
+            return
+        now = int(time.time())
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO token_counts (encoding, digest, token_count, last_used) VALUES (?, ?, ?, ?)",
+                    [(encoding_name, digest, count, now) for digest, count in items]
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def evict(self):
+        """Supprime les entrées persistantes les moins récemment utilisées au-delà de max_entries."""
+        connection = self._connect()
+        if connection is None:
+            return 0
+        try:
+            with connection:
+                (total,) = connection.execute("SELECT COUNT(*) FROM token_counts").fetchone()
+                excess = total - self.max_entries
+                if excess <= 0:
+                    return 0
+                connection.execute(
+                    "DELETE FROM token_counts WHERE rowid IN"
+                    " (SELECT rowid FROM token_counts ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                return excess
+        except sqlite3.Error as e:
+            self._disable(e)
+            return 0
+
+    def stats(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses
+        }
+
+    def _remember(self, encoding_name, digest, count):
+        key = (encoding_name, digest)
+        self.memory[key] = count
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _touch(self, encoding_name, digests):
+        connection = self._connect()
+        if connection is None:
+            return
+        now = int(time.time())
+        try:
+            with connection:
+                connection.executemany(
+                    "UPDATE token_counts SET last_used = ? WHERE encoding = ? AND digest = ?",
+                    [(now, encoding_name, digest) for digest in digests]
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
@@ -1,7 +1,6 @@
 import math
 import re
 from datetime import datetime
-from dateutil import parser as dtparser
 
 def is_audio_message(message):
     """
@@ -19,6 +18,8 @@ def parse_period_key(key, period):
     """
     Fonction d'aide pour parser les clés de période pour le tri.
     """
+    # Import différé : dateutil n'est pas nécessaire au démarrage du script
+    from dateutil import parser as dtparser
     try:
         if ' ' in key and ':' in key:
             return dtparser.parse(key)
@@ -26,6 +27,16 @@ def parse_period_key(key, period):
     except Exception:
         return key
 
+def parse_date(value):
+    """
+    Convertit une date saisie (ex. --start_date, "YYYY-MM-DD") en datetime, ou None si elle est absente.
+    """
+    if not value:
+        return None
+    # Import différé : dateutil n'est pas nécessaire sans filtre de dates
+    from dateutil import parser as dtparser
+    return dtparser.parse(value)
+
 def sort_period(period_key, period):
     """
     Fonction pour trier les périodes.
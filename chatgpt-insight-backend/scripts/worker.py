@@ -0,0 +1,104 @@
+"""
+Mode worker de run_script.py (`python run_script.py --worker`).
+
+Un processus persistant traite les analyses l'une après l'autre : le démarrage de
+l'interpréteur, les imports, les encodages tiktoken et le cache de tokens en mémoire
+ne sont payés qu'une fois. La concurrence est assurée par un pool de workers côté Node
+(services/analysisWorkerPool.js).
+
+Protocole, une ligne JSON par message :
+- stdin : une tâche par ligne, {"id": "...", "argv": [...]} où argv contient les mêmes
+  arguments que la ligne de commande de run_script.py ;
+- stdout : {"event": "ready"} une fois le worker prêt, puis pour chaque tâche
+  {"id": ..., "event": "log", "message": "..."} pour chaque message du logger (dont les
+  lignes [PROGRESS]) et enfin {"id": ..., "event": "done", "ok": true|false, "error": ...}.
+
+Tout ce qui est écrit directement sur la sortie standard (print...) est redirigé vers
+stderr pour ne pas corrompre le protocole.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import traceback
+
+
+class JobChannel:
+    """Écrit les messages du protocole sur la sortie, une ligne JSON par message."""
+    def __init__(self, stream):
+        self.stream = stream
+        # Le fichier structuré est écrit dans un thread qui peut aussi journaliser
+        self.lock = threading.Lock()
+
+    def send(self, event, job_id=None, **fields):
+        message = {'event': event, **fields} if job_id is None else {'id': job_id, 'event': event, **fields}
+        line = json.dumps(message, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class JobLogHandler(logging.Handler):
+    """Handler de logging qui transmet les messages d'une tâche via le JobChannel."""
+    def __init__(self, channel, job_id):
+        super().__init__()
+        self.channel = channel
+        self.job_id = job_id
+
+    def emit(self, record):
+        try:
+            self.channel.send('log', self.job_id, message=self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def read_job(line):
+    """Décode une ligne de tâche et retourne (id, argv) ; lève ValueError si elle est invalide."""
+    job = json.loads(line)
+    if not isinstance(job, dict) or 'id' not in job:
+        raise ValueError("champ 'id' manquant")
+    argv = job.get('argv')
+    if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+        raise ValueError("'argv' doit être une liste de chaînes")
+    return job['id'], argv
+
+
+def serve(run_job, warm_up=None, stdin=None):
+    """
+    Boucle du worker : lit les tâches sur stdin jusqu'à sa fermeture.
+
+    run_job(argv, handler) exécute une tâche en envoyant ses logs à `handler` et
+    retourne False en cas d'échec ; warm_up() est appelé une fois avant la première tâche.
+    """
+    # Le protocole garde la sortie standard d'origine ; le descripteur 1 pointe désormais sur stderr
+    protocol = open(os.dup(sys.stdout.fileno()), mode='w', encoding='utf-8', buffering=1)
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    channel = JobChannel(protocol)
+
+    if warm_up:
+        warm_up()
+    channel.send('ready', pid=os.getpid())
+
+    for line in stdin or sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            job_id, argv = read_job(line)
+        except ValueError as e:
+            channel.send('done', ok=False, error=f"Tâche invalide: {e}")
+            continue
+
+        handler = JobLogHandler(channel, job_id)
+        try:
+            ok = run_job(argv, handler)
+            error = None if ok else "L'analyse n'a pas abouti"
+        except SystemExit as e:
+            # docopt signale des arguments invalides par SystemExit (DocoptExit)
+            ok, error = False, f"Arguments invalides: {e}"
+        except Exception as e:
+            traceback.print_exc()
+            ok, error = False, f"{type(e).__name__}: {e}"
+        channel.send('done', job_id, ok=ok, error=error)
@@ -0,0 +1,186 @@
+/********************************************************/
+/* FICHIER : services/analysisStore.js                  */
+/********************************************************/
+const path = require('path');
+const fs = require('fs');
+const crypto = require('crypto');
+
+// Conservation temporaire des analyses sur le serveur : le fichier structuré et son index
+// (scripts/structured_io.py, option --index_file) sont gardés ANALYSIS_RETENTION_HOURS heures
+// (1 par défaut). La réponse de l'upload ne contient que les résumés des conversations ; les
+// messages d'une conversation sont lus à la demande, à sa position dans le fichier. Le fichier
+// complet n'est téléchargé que si l'utilisateur enregistre l'analyse dans son navigateur
+// (IndexedDB), après quoi l'analyse est supprimée du serveur (DELETE). Le nombre d'analyses
+// conservées (ANALYSIS_MAX_COUNT) et leur taille totale (ANALYSIS_MAX_MB) sont limités : les plus
+// anciennes sont supprimées en premier.
+//
+// ANALYSIS_RETENTION_HOURS=0 désactive la conservation : la réponse de l'upload contient alors
+// toutes les conversations et les fichiers sont supprimés aussitôt.
+const ANALYSES_DIR = path.join(__dirname, '..', 'uploads', 'analyses');
+const RETENTION_HOURS = process.env.ANALYSIS_RETENTION_HOURS !== undefined
+  ? parseFloat(process.env.ANALYSIS_RETENTION_HOURS) || 0
+  : 1;
+const RETENTION_MS = RETENTION_HOURS * 3600 * 1000;
+const MAX_ANALYSES = parseInt(process.env.ANALYSIS_MAX_COUNT, 10) || 20;
+const MAX_BYTES = (parseFloat(process.env.ANALYSIS_MAX_MB) || 1024) * 1000 * 1000;
+// Fichier de l'analyse qui garde sa date de création (reprise après un redémarrage)
+const META_FILE = 'analysis.json';
+
+// Résumé d'une entrée de l'index (sans sa position dans le fichier structuré)
+const entrySummary = ({ offset: _offset, length: _length, ...summary }) => summary;
+
+class AnalysisStore {
+  constructor() {
+    this.analyses = new Map();
+    this.enabled = RETENTION_MS > 0;
+    if (this.enabled) {
+      this.restore();
+    } else {
+      // Analyses conservées lors d'un démarrage précédent, avec la conservation activée
+      fs.rmSync(ANALYSES_DIR, { recursive: true, force: true });
+    }
+  }
+
+  // Déplace le fichier structuré et son index dans le dossier de l'analyse.
+  // Retourne { analysisId, expiresAt, summaries } (l'identifiant est aléatoire : il sert aussi de droit
+  // d'accès aux conversations), ou null si la conservation est désactivée ou si l'analyse
+  // dépasse à elle seule ANALYSIS_MAX_MB (les fichiers sont alors laissés en place).
+  add(structuredFilePath, indexFilePath) {
+    if (!this.enabled || fs.statSync(structuredFilePath).size + fs.statSync(indexFilePath).size > MAX_BYTES) {
+      return null;
+    }
+    const index = JSON.parse(fs.readFileSync(indexFilePath, 'utf-8'));
+    const analysisId = crypto.randomUUID();
+    const analysisDir = path.join(ANALYSES_DIR, analysisId);
+    fs.mkdirSync(analysisDir, { recursive: true });
+    fs.renameSync(structuredFilePath, path.join(analysisDir, index.structured_file));
+    fs.renameSync(indexFilePath, path.join(analysisDir, path.basename(indexFilePath)));
+    const createdAt = Date.now();
+    fs.writeFileSync(
+      path.join(analysisDir, META_FILE),
+      JSON.stringify({ createdAt, indexFile: path.basename(indexFilePath) })
+    );
+
+    this.register(analysisId, analysisDir, index, path.basename(indexFilePath), createdAt);
+    this.enforceLimits();
+    return {
+      analysisId,
+      expiresAt: new Date(createdAt + RETENTION_MS).toISOString(),
+      summaries: index.conversations.map(entrySummary)
+    };
+  }
+
+  // Seules les positions des conversations restent en mémoire ; les résumés sont relus dans l'index
+  register(analysisId, analysisDir, index, indexFile, createdAt) {
+    const structuredPath = path.join(analysisDir, index.structured_file);
+    const positions = new Map(index.conversations.map((entry) => [entry.id, [entry.offset, entry.length]]));
+    const bytes = fs.statSync(structuredPath).size + fs.statSync(path.join(analysisDir, indexFile)).size;
+    const timer = setTimeout(() => this.remove(analysisId), Math.max(createdAt + RETENTION_MS - Date.now(), 0));
+    timer.unref();
+    this.analyses.set(analysisId, {
+      dir: analysisDir,
+      structuredPath,
+      indexPath: path.join(analysisDir, indexFile),
+      format: index.format,
+      positions,
+      bytes,
+      timer,
+    });
+  }
+
+  // Analyses laissées par un précédent démarrage du serveur, reprises jusqu'à leur expiration
+  restore() {
+    if (!fs.existsSync(ANALYSES_DIR)) {
+      return;
+    }
+    const restored = [];
+    for (const analysisId of fs.readdirSync(ANALYSES_DIR)) {
+      const analysisDir = path.join(ANALYSES_DIR, analysisId);
+      try {
+        const meta = JSON.parse(fs.readFileSync(path.join(analysisDir, META_FILE), 'utf-8'));
+        if (meta.createdAt + RETENTION_MS <= Date.now()) {
+          throw new Error('analyse expirée');
+        }
+        const index = JSON.parse(fs.readFileSync(path.join(analysisDir, meta.indexFile), 'utf-8'));
+        restored.push({ analysisId, analysisDir, index, indexFile: meta.indexFile, createdAt: meta.createdAt });
+      } catch (err) {
+        fs.rmSync(analysisDir, { recursive: true, force: true });
+      }
+    }
+    restored
+      .sort((a, b) => a.createdAt - b.createdAt)
+      .forEach(({ analysisId, analysisDir, index, indexFile, createdAt }) => {
+        this.register(analysisId, analysisDir, index, indexFile, createdAt);
+      });
+    this.enforceLimits();
+  }
+
+  // Supprime les analyses les plus anciennes au-delà de MAX_ANALYSES ou de MAX_BYTES
+  enforceLimits() {
+    let totalBytes = 0;
+    for (const analysis of this.analyses.values()) {
+      totalBytes += analysis.bytes;
+    }
+    for (const [analysisId, analysis] of this.analyses) {
+      if (this.analyses.size <= MAX_ANALYSES && totalBytes <= MAX_BYTES) {
+        break;
+      }
+      totalBytes -= analysis.bytes;
+      this.remove(analysisId);
+    }
+  }
+
+  get(analysisId) {
+    return this.analyses.get(analysisId) || null;
+  }
+
+  // Résumés des conversations [offset, offset + limit[
+  async summaries(analysisId, offset = 0, limit = undefined) {
+    const analysis = this.get(analysisId);
+    if (!analysis) {
+      return null;
+    }
+    const index = JSON.parse(await fs.promises.readFile(analysis.indexPath, 'utf-8'));
+    const end = limit === undefined ? undefined : offset + limit;
+    return index.conversations.slice(offset, end).map(entrySummary);
+  }
+
+  // Conversation complète (messages compris), lue à sa position dans le fichier structuré
+  async conversation(analysisId, conversationId) {
+    const analysis = this.get(analysisId);
+    if (!analysis || !analysis.positions.has(conversationId)) {
+      return null;
+    }
+    if (analysis.format !== 'json' && analysis.format !== 'jsonl') {
+      throw new Error(`Format structuré non lisible par le serveur : ${analysis.format}`);
+    }
+    const [offset, length] = analysis.positions.get(conversationId);
+    const handle = await fs.promises.open(analysis.structuredPath, 'r');
+    try {
+      const buffer = Buffer.alloc(length);
+      await handle.read(buffer, 0, length, offset);
+      return JSON.parse(buffer.toString('utf-8'));
+    } finally {
+      await handle.close();
+    }
+  }
+
+  // Chemin du fichier structuré complet (tableau JSON), téléchargé par le client
+  structuredFile(analysisId) {
+    const analysis = this.get(analysisId);
+    return analysis && analysis.format === 'json' ? analysis.structuredPath : null;
+  }
+
+  remove(analysisId) {
+    const analysis = this.analyses.get(analysisId);
+    if (!analysis) {
+      return false;
+    }
+    this.analyses.delete(analysisId);
+    clearTimeout(analysis.timer);
+    fs.rmSync(analysis.dir, { recursive: true, force: true });
+    return true;
+  }
+}
+
+module.exports = new AnalysisStore();
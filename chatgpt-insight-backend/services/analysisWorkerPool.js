@@ -0,0 +1,154 @@
+/********************************************************/
+/* FICHIER : services/analysisWorkerPool.js             */
+/********************************************************/
+const path = require('path');
+const os = require('os');
+const readline = require('readline');
+const { spawn } = require('child_process');
+
+// Pool de processus Python persistants (run_script.py --worker, voir scripts/worker.py).
+// Chaque worker garde ses imports, ses encodages tiktoken et son cache de tokens en
+// mémoire : un upload ne paie plus le démarrage à froid de Python.
+const SCRIPTS_DIR = path.join(__dirname, '..', 'scripts');
+const PYTHON_BIN = process.env.PYTHON_BIN || 'python';
+const POOL_SIZE = parseInt(process.env.ANALYSIS_WORKERS, 10) || Math.min(2, os.cpus().length);
+
+class AnalysisWorker {
+  constructor(pool) {
+    this.pool = pool;
+    this.job = null;
+    this.ready = false;
+    this.exited = false;
+    this.process = spawn(PYTHON_BIN, [path.join(SCRIPTS_DIR, 'run_script.py'), '--worker'], {
+      cwd: SCRIPTS_DIR,
+    });
+
+    readline.createInterface({ input: this.process.stdout }).on('line', (line) => this.handleLine(line));
+
+    this.process.stderr.on('data', (data) => {
+      console.error(`[Python worker ${this.process.pid} STDERR]: ${data.toString()}`);
+    });
+
+    this.process.on('error', (err) => this.handleExit(err));
+    this.process.on('exit', (code, signal) => {
+      this.handleExit(new Error(`Worker Python arrêté (code ${code}, signal ${signal})`));
+    });
+  }
+
+  handleLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (err) {
+      console.log(`[Python worker ${this.process.pid}]: ${line}`);
+      return;
+    }
+
+    if (message.event === 'ready') {
+      this.ready = true;
+      this.pool.dispatch();
+      return;
+    }
+
+    const job = this.job;
+    if (!job || message.id !== job.id) {
+      return;
+    }
+    if (message.event === 'log') {
+      job.onOutput(message.message);
+    } else if (message.event === 'done') {
+      this.job = null;
+      if (message.ok) {
+        job.resolve();
+      } else {
+        job.reject(new Error(message.error || 'L\'analyse a échoué.'));
+      }
+      this.pool.dispatch();
+    }
+  }
+
+  handleExit(err) {
+    if (this.exited) {
+      return;
+    }
+    this.exited = true;
+    const job = this.job;
+    this.job = null;
+    if (job) {
+      job.reject(err);
+    }
+    this.pool.replace(this, err);
+  }
+
+  isIdle() {
+    return this.ready && !this.exited && this.job === null;
+  }
+
+  run(job) {
+    this.job = job;
+    this.process.stdin.write(JSON.stringify({ id: job.id, argv: job.args }) + '\n');
+  }
+}
+
+class AnalysisWorkerPool {
+  constructor(size = POOL_SIZE) {
+    this.size = size;
+    this.workers = [];
+    this.queue = [];
+    this.nextJobId = 1;
+    this.closed = false;
+  }
+
+  start() {
+    while (this.workers.length < this.size) {
+      this.workers.push(new AnalysisWorker(this));
+    }
+  }
+
+  // Lance une analyse avec les mêmes arguments que la ligne de commande de run_script.py.
+  // onOutput reçoit chaque ligne de log (dont les lignes [PROGRESS]) de l'analyse.
+  runAnalysis(args, onOutput = () => {}) {
+    this.closed = false;
+    this.start();
+    return new Promise((resolve, reject) => {
+      this.queue.push({ id: String(this.nextJobId++), args, onOutput, resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    for (const worker of this.workers) {
+      if (this.queue.length === 0) {
+        return;
+      }
+      if (worker.isIdle()) {
+        worker.run(this.queue.shift());
+      }
+    }
+  }
+
+  replace(worker, err) {
+    this.workers = this.workers.filter((w) => w !== worker);
+    if (this.closed) {
+      return;
+    }
+    console.error('Worker d\'analyse perdu :', err.message);
+    // Un worker qui s'arrête avant d'être prêt (python introuvable, import en échec...)
+    // n'est pas relancé en boucle : les tâches en attente échouent
+    if (!worker.ready) {
+      if (this.workers.length === 0) {
+        this.queue.splice(0).forEach((job) => job.reject(err));
+      }
+      return;
+    }
+    this.workers.push(new AnalysisWorker(this));
+  }
+
+  // Arrête les workers une fois leur tâche en cours terminée (fin de stdin)
+  close() {
+    this.closed = true;
+    this.workers.forEach((worker) => worker.process.stdin.end());
+  }
+}
+
+module.exports = new AnalysisWorkerPool();
@@ -1,7 +1,7 @@
 // src/components/DetailsDisplay/DetailsDisplay.js
 
 import React, { useState, useMemo, useRef, useEffect } from 'react';
-import { Typography, Pagination, Collapse, Space, List, Tooltip } from 'antd';
+import { Typography, Pagination, Collapse, Space, List, Tooltip, Spin } from 'antd';
 import Highlighter from 'react-highlight-words';
 import { EyeOutlined } from '@ant-design/icons';
 import { motion } from 'framer-motion';
@@ -13,6 +13,7 @@ import ModalDisplay from './ModalDisplay';
 import MessageList from './MessageList';
 import styled from 'styled-components';
 import { useTranslation } from 'react-i18next';
+import { fetchConversation } from '../../utils/conversationDetails';
 
 const { Title, Text } = Typography;
 const { Panel } = Collapse;
@@ -69,7 +70,18 @@ const ModelTag = styled.span`
   font-weight: 600;
 `;
 
-function DetailsDisplay({ details }) {
+// Les conversations d'une analyse conservée sur le serveur (analysisId) sont des résumés tant
+// que l'utilisateur ne l'a pas enregistrée (voir AnalysisPage) : leurs messages sont alors
+// chargés à la demande. La recherche globale porte sur les messages déjà chargés.
+const messageCount = (conversation) => conversation.message_count ?? conversation.messages?.length ?? 0;
+
+const tokenCount = (conversation) => (
+  conversation.messages
+    ? conversation.messages.reduce((sum, msg) => sum + (msg.additional_info?.token_count || 0), 0)
+    : (conversation.input_tokens || 0) + (conversation.output_tokens || 0)
+);
+
+function DetailsDisplay({ details, analysisId }) {
   const [searchText, setSearchText] = useState('');
   const [searchMode, setSearchMode] = useState('title');
   const [filterType, setFilterType] = useState(null);
@@ -79,6 +91,8 @@ function DetailsDisplay({ details }) {
   const [selectedConversation, setSelectedConversation] = useState(null);
   const [suggestions, setSuggestions] = useState([]);
   const [selectedModels, setSelectedModels] = useState([]);
+  const [loadedMessages, setLoadedMessages] = useState({});
+  const [loadErrors, setLoadErrors] = useState({});
   const pageSize = 5; // Nombre d'éléments par page
 
   // Extraire tous les modèles uniques des conversations
@@ -97,7 +111,9 @@ function DetailsDisplay({ details }) {
     
     // Calculer le coût total pour chaque conversation
     filtered = filtered.map(conversation => {
-      const totalCost = conversation.messages?.reduce((sum, msg) => sum + (msg.cost || 0), 0) || 0;
+      const totalCost = conversation.messages
+        ? conversation.messages.reduce((sum, msg) => sum + (msg.cost || 0), 0)
+        : conversation.totalCost ?? 0;
       return {
         ...conversation,
         calculatedTotalCost: totalCost
@@ -112,7 +128,7 @@ function DetailsDisplay({ details }) {
         } else {
           return (
             conversation.title.toLowerCase().includes(searchText.toLowerCase()) ||
-            conversation.messages.some(msg => {
+            (conversation.messages || []).some(msg => {
               const messageText = msg.content || msg.additional_info?.text;
               return messageText?.toLowerCase().includes(searchText.toLowerCase());
             })
@@ -135,12 +151,12 @@ function DetailsDisplay({ details }) {
         let valueA, valueB;
         switch (filterType) {
           case 'exchanges':
-            valueA = a.messages.length;
-            valueB = b.messages.length;
+            valueA = messageCount(a);
+            valueB = messageCount(b);
             break;
           case 'tokens':
-            valueA = a.messages?.reduce((sum, msg) => sum + (msg.additional_info?.token_count || 0), 0) || 0;
-            valueB = b.messages?.reduce((sum, msg) => sum + (msg.additional_info?.token_count || 0), 0) || 0;
+            valueA = tokenCount(a);
+            valueB = tokenCount(b);
             break;
           case 'cost':
             valueA = a.calculatedTotalCost;
@@ -163,7 +179,7 @@ function DetailsDisplay({ details }) {
   const totalConversations = isValidDetails ? filteredDetails.length : 0;
   const totalMessages = useMemo(() => {
     if (!isValidDetails) return 0;
-    return filteredDetails.reduce((sum, conv) => sum + conv.messages.length, 0);
+    return filteredDetails.reduce((sum, conv) => sum + messageCount(conv), 0);
   }, [filteredDetails, isValidDetails]);
 
   const paginatedConversations = useMemo(() => {
@@ -175,6 +191,27 @@ function DetailsDisplay({ details }) {
     setCurrentPage(page);
   };
 
+  // Messages d'une conversation, une fois chargés
+  const getMessages = (conversation) => conversation.messages || loadedMessages[conversation.id];
+
+  const loadMessages = async (conversation) => {
+    if (!conversation || !analysisId || getMessages(conversation) || loadErrors[conversation.id]) {
+      return;
+    }
+    try {
+      const { messages } = await fetchConversation(analysisId, conversation.id);
+      setLoadedMessages(previous => ({ ...previous, [conversation.id]: messages || [] }));
+    } catch (err) {
+      console.error('Erreur lors du chargement de la conversation:', err);
+      setLoadErrors(previous => ({ ...previous, [conversation.id]: true }));
+    }
+  };
+
+  const handleCollapseChange = (activeKey) => {
+    const key = Array.isArray(activeKey) ? activeKey[0] : activeKey;
+    loadMessages(paginatedConversations.find(conversation => conversation.id === key));
+  };
+
   const debounceTimeout = useRef(null);
   const handleSearchChange = (value) => {
     if (debounceTimeout.current) {
@@ -194,7 +231,7 @@ function DetailsDisplay({ details }) {
           setIsLoading(true);
           const matches = details
             .map(conversation => {
-              const matchingMessages = conversation.messages
+              const matchingMessages = (conversation.messages || [])
                 .filter(msg => {
                   const messageText = msg.content || msg.additional_info?.text;
                   return messageText?.toLowerCase().includes(value.toLowerCase());
@@ -234,6 +271,7 @@ function DetailsDisplay({ details }) {
   const showModal = (conversation) => {
     setSelectedConversation(conversation);
     setIsModalVisible(true);
+    loadMessages(conversation);
   };
 
   const handleModalClose = () => {
@@ -343,7 +381,7 @@ function DetailsDisplay({ details }) {
 
       {isValidDetails ? (
         <>
-          <Collapse accordion>
+          <Collapse accordion onChange={handleCollapseChange}>
             {paginatedConversations.map(conversation => (
               <Panel
                 key={conversation.id}
@@ -358,7 +396,7 @@ function DetailsDisplay({ details }) {
                       </Text>
                       <br />
                       <Text type="secondary">
-                        {t('details.conversations.exchangeCount', { count: conversation.messages.length })}
+                        {t('details.conversations.exchangeCount', { count: messageCount(conversation) })}
                       </Text>
                       <br />
                       <Text type="secondary">
@@ -383,12 +421,18 @@ function DetailsDisplay({ details }) {
                   </div>
                 }
               >
-                <MessageList
-                  messages={conversation.messages}
-                  searchTerm={searchText}
-                  searchMode={searchMode}
-                  isModal={false}
-                />
+                {getMessages(conversation) ? (
+                  <MessageList
+                    messages={getMessages(conversation)}
+                    searchTerm={searchText}
+                    searchMode={searchMode}
+                    isModal={false}
+                  />
+                ) : loadErrors[conversation.id] ? (
+                  <Text type="danger">{t('details.conversations.loadError')}</Text>
+                ) : (
+                  <Spin tip={t('common.loading')} />
+                )}
               </Panel>
             ))}
           </Collapse>
@@ -416,6 +460,8 @@ function DetailsDisplay({ details }) {
         isModalVisible={isModalVisible}
         handleModalClose={handleModalClose}
         selectedConversation={selectedConversation}
+        messages={selectedConversation && getMessages(selectedConversation)}
+        loadError={Boolean(selectedConversation && loadErrors[selectedConversation.id])}
         searchTerm={searchText}
         searchMode={searchMode}
       />
@@ -1,8 +1,11 @@
 import React from 'react';
 import styled from 'styled-components';
-import { Modal } from 'antd';
+import { Modal, Spin, Typography } from 'antd';
+import { useTranslation } from 'react-i18next';
 import MessageList from './MessageList';
 
+const { Text } = Typography;
+
 const ModalContainer = styled(Modal)`
   /* Styles spécifiques si nécessaire */
 `;
@@ -11,9 +14,13 @@ function ModalDisplay({
   isModalVisible,
   handleModalClose,
   selectedConversation,
+  messages,
+  loadError,
   searchTerm,
   searchMode,
 }) {
+  const { t } = useTranslation();
+
   return (
     <ModalContainer
       title={selectedConversation ? selectedConversation.title : ''}
@@ -28,14 +35,18 @@ function ModalDisplay({
       maskClosable
       closable
     >
-      {selectedConversation && (
+      {selectedConversation && (messages ? (
         <MessageList
-          messages={selectedConversation.messages}
+          messages={messages}
           searchTerm={searchTerm}
           searchMode={searchMode}
           isModal
         />
-      )}
+      ) : loadError ? (
+        <Text type="danger">{t('details.conversations.loadError')}</Text>
+      ) : (
+        <Spin tip={t('common.loading')} />
+      ))}
     </ModalContainer>
   );
 }
@@ -1,5 +1,5 @@
-import React from 'react';
-import { Card, Typography, Tabs } from 'antd';
+import React, { useMemo, useState } from 'react';
+import { Card, Typography, Tabs, DatePicker } from 'antd';
 import { AnimatePresence, motion } from 'framer-motion';
 import { useTranslation } from 'react-i18next';
 import BarCostChart from './charts/BarCostChart';
@@ -8,9 +8,11 @@ import LineTokenChart from './charts/LineTokenChart';
 import BubbleChartComponent from './charts/BubbleChartComponent';
 import PriceComparisonChart from './charts/PriceComparisonChart';
 import { formatModelName } from '../utils/formatModelName';
+import { createCubeIndex, cubeCostsByModel, localHourId } from '../utils/timeSeriesCube';
 
 const { Title } = Typography;
 const { TabPane } = Tabs;
+const { RangePicker } = DatePicker;
 
 // Petit composant qui gère tout le contenu des onglets
 function GraphTabs({
@@ -19,9 +21,14 @@ function GraphTabs({
   lineData,
   bubbleChartData,
   costThreshold,
-  tabVariants
+  tabVariants,
+  rangeFiltered
 }) {
   const { t } = useTranslation();
+  // Rappel affiché sur les graphiques que la plage de dates ne filtre pas
+  const unfilteredNote = rangeFiltered && (
+    <Typography.Text type="secondary">{t('graphs.dateRange.unfiltered')}</Typography.Text>
+  );
   
   return (
     <Tabs defaultActiveKey="1" style={{ marginTop: '20px' }} animated={false}>
@@ -77,6 +84,7 @@ function GraphTabs({
             exit="exit"
             transition={{ duration: 0.5 }}
           >
+            {unfilteredNote}
             <BubbleChartComponent data={bubbleChartData} />
           </motion.div>
         </AnimatePresence>
@@ -91,6 +99,7 @@ function GraphTabs({
             exit="exit"
             transition={{ duration: 0.5 }}
           >
+            {unfilteredNote}
             <PriceComparisonChart />
           </motion.div>
         </AnimatePresence>
@@ -99,15 +108,34 @@ function GraphTabs({
   );
 }
 
-function GraphsDisplay({ graphsData, messageStatsOverTime }) {
+function GraphsDisplay({ graphsData, messageStatsOverTime, timeSeriesCube }) {
   const { t } = useTranslation();
+  const [dateRange, setDateRange] = useState(null);
+  // Index du cube horaire : les coûts d'une plage de dates sont recalculés localement
+  const cubeIndex = useMemo(
+    () => (timeSeriesCube ? createCubeIndex(timeSeriesCube) : null),
+    [timeSeriesCube]
+  );
 
   if (!graphsData || !messageStatsOverTime) {
     console.warn('GraphsDisplay - graphsData ou messageStatsOverTime est manquant.');
     return <Title level={4}>{t('graphs.noData')}</Title>;
   }
 
-  const { costs_by_model, models, costs, tokens } = graphsData;
+  let { costs_by_model, models, costs, tokens } = graphsData;
+  // La plage ne filtre que les graphiques de coûts (barres, camembert, lignes). Les deux jours
+  // choisis sont inclus en entier : la fin est exclue au lendemain 00:00. À l'inverse,
+  // --end_date (stats combinées du script) est une borne incluse à 00:00 du jour donné.
+  const rangeFiltered = Boolean(cubeIndex && dateRange && dateRange[0] && dateRange[1]);
+  if (rangeFiltered) {
+    const [start, end] = dateRange;
+    costs_by_model = cubeCostsByModel(
+      cubeIndex,
+      localHourId(start.year(), start.month(), start.date()),
+      localHourId(end.year(), end.month(), end.date() + 1)
+    );
+    models = Object.keys(costs_by_model);
+  }
   if (!costs_by_model || !models || !costs || !tokens) {
     console.warn('GraphsDisplay - données manquantes dans graphsData:', { costs_by_model, models, costs, tokens });
     return (
@@ -169,6 +197,19 @@ function GraphsDisplay({ graphsData, messageStatsOverTime }) {
       <Title level={3} style={{ textAlign: 'center', marginTop: '50px' }}>
         {t('graphs.title')}
       </Title>
+      {cubeIndex && (
+        <div style={{ textAlign: 'center' }}>
+          <RangePicker
+            value={dateRange}
+            onChange={setDateRange}
+            placeholder={[t('graphs.dateRange.start'), t('graphs.dateRange.end')]}
+            allowClear
+          />
+          <div>
+            <Typography.Text type="secondary">{t('graphs.dateRange.scope')}</Typography.Text>
+          </div>
+        </div>
+      )}
       <GraphTabs
         barData={barData}
         pieData={filteredPieDataForLabels}
@@ -176,6 +217,7 @@ function GraphsDisplay({ graphsData, messageStatsOverTime }) {
         bubbleChartData={bubbleChartData}
         costThreshold={COST_THRESHOLD}
         tabVariants={tabVariants}
+        rangeFiltered={rangeFiltered}
       />
     </motion.div>
   );
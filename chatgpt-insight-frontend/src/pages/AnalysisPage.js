@@ -1,11 +1,12 @@
 import React, { useState, useEffect } from 'react';
-import { Button, Card, Typography } from 'antd';
+import { Alert, Button, Card, Typography, message } from 'antd';
 import { useNavigate } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 import StatsDisplay from '../components/StatsDisplay';
 import GraphsDisplay from '../components/GraphsDisplay';
 import DetailsDisplay from '../components/DetailsDisplay/DetailsDisplay';
-import { getFromIndexedDB } from '../components/ZipFileUploader/indexedDB';
+import { getFromIndexedDB, saveToIndexedDB } from '../components/ZipFileUploader/indexedDB';
+import { fetchAnalysisDetails, deleteAnalysis } from '../utils/conversationDetails';
 
 const { Text } = Typography;
 
@@ -14,6 +15,7 @@ function AnalysisPage() {
   const navigate = useNavigate();
   const [data, setData] = useState(null);
   const [error, setError] = useState(null);
+  const [saving, setSaving] = useState(false);
 
   useEffect(() => {
     const loadData = async () => {
@@ -34,6 +36,26 @@ function AnalysisPage() {
     loadData();
   }, [navigate]);
 
+  // Analyse conservée sur le serveur (résumés des conversations) : à la demande de l'utilisateur,
+  // les conversations complètes sont téléchargées et enregistrées dans IndexedDB, puis l'analyse
+  // est supprimée du serveur
+  const handleSaveAnalysis = async () => {
+    setSaving(true);
+    try {
+      const details = await fetchAnalysisDetails(data.analysisId);
+      const { analysisId, analysisExpiresAt, ...completeData } = { ...data, details };
+      await saveToIndexedDB(completeData);
+      setData(completeData);
+      message.success(t('analysis.save.success'));
+      await deleteAnalysis(analysisId);
+    } catch (err) {
+      console.error('Erreur lors de l\'enregistrement des conversations:', err);
+      message.error(t('analysis.save.error'));
+    } finally {
+      setSaving(false);
+    }
+  };
+
   const handleNewUpload = () => {
     navigate('/');
   };
@@ -56,8 +78,24 @@ function AnalysisPage() {
       <GraphsDisplay
         graphsData={data.graphsData}
         messageStatsOverTime={data.messageStatsOverTime}
+        timeSeriesCube={data.timeSeriesCube}
       />
-      <DetailsDisplay details={data.details} />
+      {data.analysisId && (
+        <Alert
+          style={{ margin: '20px' }}
+          type="info"
+          showIcon
+          message={t('analysis.save.notice', {
+            date: new Date(data.analysisExpiresAt).toLocaleString()
+          })}
+          action={(
+            <Button type="primary" loading={saving} onClick={handleSaveAnalysis}>
+              {t('analysis.save.button')}
+            </Button>
+          )}
+        />
+      )}
+      <DetailsDisplay details={data.details} analysisId={data.analysisId} />
       <div style={{ textAlign: 'center', marginTop: '30px' }}>
         <Button type="primary" onClick={handleNewUpload}>
           {t('common.upload')}
@@ -0,0 +1,31 @@
+// src/utils/conversationDetails.js
+// Analyses conservées temporairement sur le serveur (ANALYSIS_RETENTION_HOURS, voir
+// services/analysisStore.js du backend) : la réponse de l'upload ne contient que les résumés des
+// conversations. Les messages d'une conversation sont chargés à la demande ; toutes les
+// conversations ne sont téléchargées que si l'utilisateur enregistre l'analyse (AnalysisPage).
+
+const analysisUrl = (analysisId) =>
+  `http://localhost:5000/api/upload/analyses/${encodeURIComponent(analysisId)}`;
+
+const getJson = async (url) => {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`Erreur ${response.status} lors de la requête ${url}`);
+  }
+  return response.json();
+};
+
+// Conversation complète (messages compris)
+export const fetchConversation = (analysisId, conversationId) =>
+  getJson(`${analysisUrl(analysisId)}/conversations/${encodeURIComponent(conversationId)}`);
+
+// Toutes les conversations de l'analyse, messages compris
+export const fetchAnalysisDetails = (analysisId) => getJson(`${analysisUrl(analysisId)}/structured`);
+
+// Suppression de l'analyse sur le serveur, une fois ses conversations enregistrées
+export const deleteAnalysis = async (analysisId) => {
+  const response = await fetch(analysisUrl(analysisId), { method: 'DELETE' });
+  if (!response.ok && response.status !== 404) {
+    throw new Error(`Erreur ${response.status} lors de la suppression de l'analyse ${analysisId}`);
+  }
+};
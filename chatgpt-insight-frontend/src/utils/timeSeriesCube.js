@@ -0,0 +1,81 @@
+// src/utils/timeSeriesCube.js
+// Requêtes par plage de dates sur le cube horaire de l'analyse (scripts/timeseries_cube.py) :
+// les coûts d'une plage sont calculés dans le navigateur, sans relancer l'analyse.
+
+const MEASURE_COUNT = 4; // tokens, coût, messages, images
+
+// Identifiant d'heure locale du cube (heures écoulées depuis l'epoch, en heure locale)
+// d'une date choisie dans un sélecteur : seuls année, mois, jour et heure comptent
+export const localHourId = (year, month, day, hour = 0) => Date.UTC(year, month, day, hour) / 3600000;
+
+// Premier indice de `values` (croissantes) supérieur ou égal à `target`
+const lowerBound = (values, target) => {
+  let low = 0;
+  let high = values.length;
+  while (low < high) {
+    const middle = (low + high) >> 1;
+    if (values[middle] < target) {
+      low = middle + 1;
+    } else {
+      high = middle;
+    }
+  }
+  return low;
+};
+
+// Sommes préfixes de chaque groupe (modèle, rôle, type de contenu) le long de ses heures,
+// calculées une fois par cube : une plage coûte ensuite deux recherches par groupe
+export const createCubeIndex = (cube) => {
+  const groupHours = cube.groups.map(() => []);
+  const groupPrefix = cube.groups.map(() => [[0, 0, 0, 0]]);
+  cube.cells.forEach(([hourIndex, groupIndex, ...measures]) => {
+    groupHours[groupIndex].push(cube.hours[hourIndex]);
+    const prefix = groupPrefix[groupIndex];
+    const previous = prefix[prefix.length - 1];
+    prefix.push(measures.slice(0, MEASURE_COUNT).map((value, index) => previous[index] + value));
+  });
+  return { cube, groupHours, groupPrefix };
+};
+
+// Coûts et tokens par modèle des heures [firstHour, lastHour[, au format costs_by_model des stats
+export const cubeCostsByModel = (index, firstHour, lastHour) => {
+  const { cube, groupHours, groupPrefix } = index;
+  const { model: models, role: roles } = cube.dimensions;
+  const costsByModel = {};
+  cube.groups.forEach(([modelIndex, roleIndex], groupIndex) => {
+    const hours = groupHours[groupIndex];
+    const prefix = groupPrefix[groupIndex];
+    const after = prefix[lowerBound(hours, lastHour)];
+    const before = prefix[lowerBound(hours, firstHour)];
+    const [tokens, cost, messages] = after.map((value, measure) => value - before[measure]);
+    if (!messages) {
+      return;
+    }
+    const model = String(models[modelIndex]);
+    const role = roles[roleIndex];
+    if (!costsByModel[model]) {
+      costsByModel[model] = {
+        input_cost: 0,
+        output_cost: 0,
+        total_cost: 0,
+        input_tokens: 0,
+        output_tokens: 0,
+        total_tokens: 0,
+      };
+    }
+    const modelCosts = costsByModel[model];
+    // Comme cost_stats_combined_over_time : les coûts d'images hors user sont des coûts de sortie
+    if (role === 'user') {
+      modelCosts.input_cost += cost;
+      modelCosts.input_tokens += tokens;
+    } else {
+      modelCosts.output_cost += cost;
+      if (role === 'assistant' || role === 'tool') {
+        modelCosts.output_tokens += tokens;
+      }
+    }
+    modelCosts.total_cost += cost;
+    modelCosts.total_tokens += tokens;
+  });
+  return costsByModel;
+};